@@ -28,7 +28,8 @@ __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
 
 
 def run_asup_mode_xml(asup_xml_info_file, asup_xml_data_files, asup_xml_header_file, result_dir,
-                      csv_dir, sort_columns_by_name, compact_file):
+                      csv_dir, sort_columns_by_name, compact_file, digits=None, binary=False,
+                      write_tables=True, gzip_html=False, resume=False):
     """
     The asup mode's main routine for processing xml files. Calls all functions to read xml data,
     writes CSVs and finally creates an HTML.
@@ -44,6 +45,15 @@ def run_asup_mode_xml(asup_xml_info_file, asup_xml_data_files, asup_xml_header_f
     name or by value.
     :param compact: Boolean, which says whether command line option 'compact' is set or not. If so,
     dygraphs code and csv content will be included into the charts html.
+    :param digits: The number of significant digits for non-integral values in the csv tables, or
+    None for full precision.
+    :param binary: Boolean, which says whether command line option 'binary' is set or not. If so,
+    chart data will be included into the charts html as binary payloads.
+    :param write_tables: Boolean, whether the csv tables should be written. This is False, if
+    command line option 'notables' is set.
+    :param gzip_html: Boolean, which says whether command line option 'gzip' is set or not.
+    :param resume: Boolean, which says whether command line option 'resume' is set or not. If so,
+    a checkpoint is kept in result_dir and the data files are added to the ones of earlier runs.
     :return: None
     """
 
@@ -63,14 +73,18 @@ def run_asup_mode_xml(asup_xml_info_file, asup_xml_data_files, asup_xml_header_f
 
     # collect data from file
     tables, label_dict = xml_data_collector.read_xmls(
-        asup_xml_data_files, asup_xml_info_file, timezone, sort_columns_by_name)
+        asup_xml_data_files, asup_xml_info_file, timezone, sort_columns_by_name,
+        result_dir if resume else None, cluster, node)
     logging.debug('all labels: %s', label_dict)
 
     create_output.create_output(
-        result_dir, csv_dir, html_title, cluster + node + '_', tables, label_dict, compact_file)
+        result_dir, csv_dir, html_title, cluster + node + '_', tables, label_dict, compact_file,
+        digits, binary, write_tables, gzip_html)
 
 
-def run_asup_mode_json(asup_json_files, result_dir, csv_dir, sort_columns_by_name, compact_file):
+def run_asup_mode_json(asup_json_files, result_dir, csv_dir, sort_columns_by_name, compact_file,
+                       digits=None, binary=False, write_tables=True, gzip_html=False,
+                       resume=False):
     """
     The asup mode's main routine for processing JSON files. Calls all functions to read JSON data,
     writes CSVs and finally creates an HTML.
@@ -82,19 +96,30 @@ def run_asup_mode_json(asup_json_files, result_dir, csv_dir, sort_columns_by_nam
     name or by value.
     :param compact: Boolean, which says whether command line option 'compact' is set or not. If so,
     dygraphs code and csv content will be included into the charts html.
+    :param digits: The number of significant digits for non-integral values in the csv tables, or
+    None for full precision.
+    :param binary: Boolean, which says whether command line option 'binary' is set or not. If so,
+    chart data will be included into the charts html as binary payloads.
+    :param write_tables: Boolean, whether the csv tables should be written. This is False, if
+    command line option 'notables' is set.
+    :param gzip_html: Boolean, which says whether command line option 'gzip' is set or not.
+    :param resume: Boolean, which says whether command line option 'resume' is set or not. If so,
+    a checkpoint is kept in result_dir and the json files are added to the ones of earlier runs.
     :return: None
     """
     tables, label_dict, (cluster, node) = json_data_collector.read_json(
-        asup_json_files, sort_columns_by_name)
+        asup_json_files, sort_columns_by_name, result_dir if resume else None)
     logging.debug('all labels: %s', label_dict)
 
     html_title = 'Cluster: ' + cluster + '&ensp; &ensp; Node: ' + node
 
     create_output.create_output(
-        result_dir, csv_dir, html_title, cluster + node + '_', tables, label_dict, compact_file)
+        result_dir, csv_dir, html_title, cluster + node + '_', tables, label_dict, compact_file,
+        digits, binary, write_tables, gzip_html)
 
 
-def run_asup_mode_hdf5(asup_hdf5_file, result_dir, csv_dir, sort_columns_by_name, compact_file):
+def run_asup_mode_hdf5(asup_hdf5_file, result_dir, csv_dir, sort_columns_by_name, compact_file,
+                       digits=None, binary=False, write_tables=True, gzip_html=False):
     """
     The asup mode's main routine for processing hdf5 files. Calls all functions to read hdf5 data,
     writes CSVs and finally creates an HTML.
@@ -106,6 +131,13 @@ def run_asup_mode_hdf5(asup_hdf5_file, result_dir, csv_dir, sort_columns_by_name
     name or by value.
     :param compact: Boolean, which says whether command line option 'compact' is set or not. If so,
     dygraphs code and csv content will be included into the charts html.
+    :param digits: The number of significant digits for non-integral values in the csv tables, or
+    None for full precision.
+    :param binary: Boolean, which says whether command line option 'binary' is set or not. If so,
+    chart data will be included into the charts html as binary payloads.
+    :param write_tables: Boolean, whether the csv tables should be written. This is False, if
+    command line option 'notables' is set.
+    :param gzip_html: Boolean, which says whether command line option 'gzip' is set or not.
     :return: None
     """
     tables, label_dict = hdf5_data_collector.read_hdf5(asup_hdf5_file, sort_columns_by_name)
@@ -114,4 +146,5 @@ def run_asup_mode_hdf5(asup_hdf5_file, result_dir, csv_dir, sort_columns_by_name
     html_title = os.path.abspath(os.path.dirname(asup_hdf5_file))
 
     create_output.create_output(
-        result_dir, csv_dir, html_title, '', tables, label_dict, compact_file)
+        result_dir, csv_dir, html_title, '', tables, label_dict, compact_file, digits, binary,
+        write_tables, gzip_html)
@@ -0,0 +1,357 @@
+"""
+Contains the watch mode for ASUPs, PicDat starts with the command line option 'watch'. ASUPs
+arrive hourly for each node, so the input directory keeps growing. Instead of reading all ASUPs
+in it again each time, the AsupWatcher polls the directory for newly arrived .tgz archives and
+.json files. It keeps one container per cluster and node in memory, reads only the new ASUPs into
+the container of their node and regenerates that node's charts. This way, the cost of reading a
+new ASUP doesn't grow with the node's history. Regenerating the charts still does: each time, all
+of the node's tables are copied and all of its csv tables and its html file are written again,
+because new rows change column sorting and unit conversions of the whole tables. The containers
+are checkpointed into the output directory, so that a restarted watcher goes on where it stopped.
+"""
+import copy
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import picdat_util
+from asup_mode import checkpoint
+from asup_mode import util
+from asup_mode import xml_data_collector
+from asup_mode import json_data_collector
+from asup_mode.xml_container import XmlContainer
+from asup_mode.json_container import JsonContainer
+from general import create_output
+
+__author__ = 'Marie Lohbeck'
+__copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
+
+# license notice:
+#
+# This file is part of PicDat.
+# PicDat is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public (at your option) any later version.
+#
+# PicDat is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with PicDat. If not,
+# see <http://www.gnu.org/licenses/>.
+
+# number of seconds between two looks into the input directory:
+POLL_INTERVAL = 30
+
+# the data types of ASUPs, the watcher reads:
+WATCHED_DATA_TYPES = ['tgz', 'json']
+
+
+class WatchedNode:
+    """
+    This class holds everything the watcher collected about one node so far.
+    """
+
+    def __init__(self, data_type, cluster, node, container):
+        """
+        Constructor for WatchedNode.
+        :param data_type: The data type of the node's ASUPs, 'tgz' or 'json'.
+        :param cluster: The name of the node's cluster. Might be None.
+        :param node: The node's name. Might be None.
+        :param container: An XmlContainer or JsonContainer, which collects the node's data.
+        """
+        self.data_type = data_type
+        self.cluster = cluster
+        self.node = node
+        self.container = container
+
+        # fingerprints of the ASUPs read into the container:
+        self.fingerprints = set()
+
+    def get_html_title(self, input_dir):
+        """
+        Names the node's charts.
+        :param input_dir: The watched directory. It's used as title, if the node is unknown.
+        :return: The title as String.
+        """
+        if self.cluster and self.node:
+            return 'Cluster: ' + self.cluster + '&ensp; &ensp; Node: ' + self.node
+        return os.path.abspath(input_dir)
+
+    def get_output_label(self):
+        """
+        Gives the prefix for the names of the node's result files, so that the results of several
+        nodes can share the same output directory.
+        :return: The prefix as String.
+        """
+        return (self.cluster or '') + (self.node or '') + '_'
+
+
+class AsupWatcher:
+    """
+    This class watches a directory for newly arrived ASUPs and visualises them together with the
+    earlier ASUPs of the same node.
+    """
+
+    def __init__(self, input_dir, result_dir, csv_dir, sort_columns_by_name, compact_file,
+                 digits=None, binary=False, write_tables=True, gzip_html=False):
+        """
+        Constructor for AsupWatcher. The parameters following result_dir are the same as for the
+        main routines in asup_mode.
+        :param input_dir: The directory to watch.
+        :param result_dir: path to an existing directory. The watcher stores its results in here.
+        :param csv_dir: path to an existing directory inside result_dir. The watcher stores its
+        csv tables in here.
+        """
+        self.input_dir = input_dir
+        self.result_dir = result_dir
+        self.csv_dir = csv_dir
+        self.sort_columns_by_name = sort_columns_by_name
+        self.compact_file = compact_file
+        self.digits = digits
+        self.binary = binary
+        self.write_tables = write_tables
+        self.gzip_html = gzip_html
+
+        # WatchedNode objects by cluster and node name:
+        self.nodes = {}
+        self.load_checkpoints()
+
+        # names of the files, which were read already (or couldn't be read):
+        self.processed_files = set()
+
+        # sizes and modification times of new files at the last poll. A file is read not until
+        # they didn't change since then, because it might still be copied into the directory
+        # otherwise:
+        self.arriving_files = {}
+
+    def load_checkpoints(self):
+        """
+        Restores the nodes of earlier runs from their checkpoints in the output directory.
+        :return: None
+        """
+        for filename in sorted(os.listdir(self.result_dir)):
+            if not filename.endswith(checkpoint.CHECKPOINT_ENDING):
+                continue
+            saved_checkpoint = checkpoint.load(os.path.join(self.result_dir, filename))
+            if saved_checkpoint is None:
+                continue
+
+            if saved_checkpoint['container_type'] == XmlContainer.__name__:
+                data_type, container = 'tgz', XmlContainer(None)
+            else:
+                data_type, container = 'json', JsonContainer(None)
+            container.restore_checkpoint(saved_checkpoint['container'])
+
+            watched_node = WatchedNode(data_type, saved_checkpoint['cluster'],
+                                       saved_checkpoint['node'], container)
+            watched_node.fingerprints = saved_checkpoint['fingerprints']
+            self.nodes[watched_node.cluster, watched_node.node] = watched_node
+
+    def is_read(self, fingerprint):
+        """
+        Checks, whether an ASUP has been read already, in this run or an earlier one.
+        :param fingerprint: The ASUP's fingerprint.
+        :return: True, if it has been read.
+        """
+        return any(fingerprint in watched_node.fingerprints
+                   for watched_node in self.nodes.values())
+
+    def poll(self, initial=False):
+        """
+        Looks for new ASUPs inside the watched directory.
+        :param initial: Boolean, whether this is the first poll. Files, which are already there
+        when the watcher starts, are taken without waiting whether they change.
+        :return: A list of the paths to all new ASUPs, which are complete, in alphabetical order.
+        """
+        arrived_files = []
+        arriving_files = {}
+        with os.scandir(self.input_dir) as entries:
+            for entry in entries:
+                if entry.name in self.processed_files or not entry.is_file() \
+                        or picdat_util.data_type(entry.name) not in WATCHED_DATA_TYPES:
+                    continue
+                status = entry.stat()
+                file_state = (status.st_size, status.st_mtime_ns)
+                if initial or self.arriving_files.get(entry.name) == file_state:
+                    arrived_files.append(entry.name)
+                else:
+                    arriving_files[entry.name] = file_state
+
+        self.arriving_files = arriving_files
+        return [os.path.join(self.input_dir, filename) for filename in sorted(arrived_files)]
+
+    def get_node(self, data_type, cluster, node, create_container):
+        """
+        Looks up the node an ASUP belongs to. Nodes, which haven't been seen before, get created.
+        :param data_type: The data type of the ASUP, 'tgz' or 'json'.
+        :param cluster: The name of the ASUP's cluster.
+        :param node: The name of the ASUP's node.
+        :param create_container: A function without parameters, which creates a container for a
+        new node.
+        :return: The WatchedNode object.
+        :raises TypeError: If earlier ASUPs of the node were of another data type.
+        """
+        watched_node = self.nodes.get((cluster, node))
+        if watched_node is None:
+            logging.info('Found new node. Cluster: %s, node: %s', cluster, node)
+            watched_node = WatchedNode(data_type, cluster, node, create_container())
+            self.nodes[cluster, node] = watched_node
+        elif watched_node.data_type != data_type:
+            raise TypeError('Earlier ASUPs of node %s were of type %s' % (node,
+                                                                          watched_node.data_type))
+        return watched_node
+
+    def read_tgz(self, tgz_file):
+        """
+        Reads an xml ASUP into the container of its node.
+        :param tgz_file: The path to a .tgz archive.
+        :return: The WatchedNode object, the ASUP belongs to, or None, if the ASUP has been read
+        already.
+        """
+        temp_path = tempfile.mkdtemp()
+        try:
+            info_file, data_file, header_file = picdat_util.extract_tgz(temp_path, tgz_file)
+            fingerprint = checkpoint.get_fingerprint(data_file)
+            if self.is_read(fingerprint):
+                logging.info('ASUP %s has been read already.', tgz_file)
+                return None
+
+            node, cluster, timezone = xml_data_collector.read_header_file(header_file)
+            if not timezone:
+                timezone = util.get_local_timezone()
+
+            watched_node = self.get_node('tgz', cluster, node, lambda: XmlContainer(timezone))
+            if not watched_node.fingerprints:
+                xml_data_collector.read_info_file(watched_node.container, info_file)
+
+            xml_data_collector.read_data_file(watched_node.container, data_file)
+            # base elements which appeared before the elements they are the base to are usually
+            # inside the same ASUP, so the heap can be processed right away:
+            watched_node.container.process_base_heap()
+            watched_node.fingerprints.add(fingerprint)
+            return watched_node
+        finally:
+            shutil.rmtree(temp_path)
+
+    def read_json(self, json_file):
+        """
+        Reads a json ASUP into the container of its node.
+        :param json_file: The path to a .json file.
+        :return: The WatchedNode object, the ASUP belongs to, or None, if the file is empty or has
+        been read already.
+        """
+        fingerprint = checkpoint.get_fingerprint(json_file)
+        if self.is_read(fingerprint):
+            logging.info('ASUP %s has been read already.', json_file)
+            return None
+
+        cluster_and_node = json_data_collector.read_cluster_and_node(json_file)
+        if cluster_and_node is None:
+            logging.error('File %s does not contain any valid json content. It will be ignored.',
+                          json_file)
+            return None
+
+        watched_node = self.get_node('json', *cluster_and_node,
+                                     lambda: JsonContainer(util.get_local_timezone()))
+        json_data_collector.read_json_file(watched_node.container, json_file)
+        watched_node.fingerprints.add(fingerprint)
+        return watched_node
+
+    def process(self, asup_files):
+        """
+        Reads new ASUPs, checkpoints the containers of all nodes they belong to and regenerates
+        the nodes' charts. ASUPs, which can't be read, are skipped.
+        :param asup_files: A list of paths to new ASUPs.
+        :return: None
+        """
+        updated_nodes = []
+        for asup_file in asup_files:
+            self.processed_files.add(os.path.basename(asup_file))
+            logging.info('Read new ASUP %s', asup_file)
+            try:
+                if picdat_util.data_type(asup_file) == 'tgz':
+                    watched_node = self.read_tgz(asup_file)
+                else:
+                    watched_node = self.read_json(asup_file)
+            except SystemExit:
+                # extract_tgz quits, if an archive doesn't contain the expected files
+                logging.warning('Skipped %s.', asup_file)
+                continue
+            except Exception:
+                logging.exception('Could not read %s. It is skipped.', asup_file)
+                continue
+
+            if watched_node is not None and watched_node not in updated_nodes:
+                updated_nodes.append(watched_node)
+
+        for watched_node in updated_nodes:
+            checkpoint.save(checkpoint.get_checkpoint_file(self.result_dir,
+                                                           watched_node.get_output_label()),
+                            watched_node.container, watched_node.cluster, watched_node.node,
+                            watched_node.fingerprints)
+            self.create_output(watched_node)
+
+    def create_output(self, watched_node):
+        """
+        Writes the charts of a node. The final calculations on the collected data, like unit
+        conversions, are done on a copy of the node's tables, so that the container can go on
+        collecting the following ASUPs. Copying the tables and writing them takes time in
+        proportion to the node's whole history, not only to the new ASUPs.
+        :param watched_node: The WatchedNode object.
+        :return: None
+        """
+        snapshot = copy.copy(watched_node.container)
+        snapshot.tables = {key: table.copy() for key, table in snapshot.tables.items()}
+        snapshot.units = dict(snapshot.units)
+        snapshot.calculate_further_charts()
+        snapshot.do_unit_conversions()
+
+        tables = util.get_flat_tables(snapshot, self.sort_columns_by_name)
+        label_dict = util.build_label_dict(snapshot)
+        create_output.create_output(
+            self.result_dir, self.csv_dir, watched_node.get_html_title(self.input_dir),
+            watched_node.get_output_label(), tables, label_dict, self.compact_file, self.digits,
+            self.binary, self.write_tables, self.gzip_html)
+        logging.info('Updated charts of node %s (%s ASUPs)', watched_node.node,
+                     len(watched_node.fingerprints))
+
+    def run(self):
+        """
+        Watches the directory until the user terminates the program by hitting ctrl+C. As the
+        checkpoints are replaced atomically, this is safe at any time.
+        :return: None
+        """
+        try:
+            self.process(self.poll(initial=True))
+            logging.info('Watching %s for new ASUPs. Hit ctrl+C to stop.',
+                         os.path.abspath(self.input_dir))
+            while True:
+                time.sleep(POLL_INTERVAL)
+                self.process(self.poll())
+        except KeyboardInterrupt:
+            logging.info('Stopped watching %s.', os.path.abspath(self.input_dir))
+
+
+def run_watch_mode(input_dir, result_dir, csv_dir, sort_columns_by_name, compact_file,
+                   digits=None, binary=False, write_tables=True, gzip_html=False):
+    """
+    The watch mode's main routine. Visualises all ASUPs inside a directory and updates the charts
+    whenever new ASUPs arrive, until the user terminates the program.
+    :param input_dir: The directory to watch.
+    :param result_dir: path to an existing directory. Function stores its results in here.
+    :param csv_dir: path to an existing directory inside result_dir. Function stores its csv
+    tables in here.
+    :param sort_columns_by_name: boolean, which says whether user wants to sort chart legends by
+    name or by value.
+    :param compact_file: Boolean, which says whether command line option 'compact' is set or not.
+    :param digits: The number of significant digits for non-integral values in the csv tables, or
+    None for full precision.
+    :param binary: Boolean, which says whether command line option 'binary' is set or not.
+    :param write_tables: Boolean, whether the csv tables should be written.
+    :param gzip_html: Boolean, which says whether command line option 'gzip' is set or not.
+    :return: None
+    """
+    AsupWatcher(input_dir, result_dir, csv_dir, sort_columns_by_name, compact_file, digits,
+                binary, write_tables, gzip_html).run()
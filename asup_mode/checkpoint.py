@@ -0,0 +1,187 @@
+"""
+Is responsible for checkpoints of ASUP containers. A checkpoint holds the state of an XmlContainer
+or JsonContainer after reading some ASUPs: the collected tables as well as the buffers, which are
+needed to calculate values from the counters of the following ASUP. Further, it records which
+ASUPs went into it. The checkpoint is saved into the output directory. A later PicDat run on the
+same output directory restores the container from it and reads only ASUPs, which aren't in the
+checkpoint yet, instead of reading the older ASUPs again.
+Checkpoints are pickled. As unpickling a file can run arbitrary code, each checkpoint is signed
+with an HMAC, keyed by a secret only the user running PicDat can read. Checkpoints without a valid
+signature, for example ones someone else put into the output directory, are never unpickled.
+"""
+import hashlib
+import hmac
+import logging
+import os
+import pickle
+import secrets
+
+from general import result_cache
+
+__author__ = 'Marie Lohbeck'
+__copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
+
+# license notice:
+#
+# This file is part of PicDat.
+# PicDat is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public (at your option) any later version.
+#
+# PicDat is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with PicDat. If not,
+# see <http://www.gnu.org/licenses/>.
+
+# Version of the checkpoint format. Checkpoints of other versions get ignored:
+CHECKPOINT_VERSION = 2
+
+# Checkpoint files are named like the result files of their node, with this ending:
+CHECKPOINT_ENDING = 'checkpoint.pickle'
+
+# File holding the secret key, checkpoints are signed with. It's created on first use and only
+# readable for its owner:
+CHECKPOINT_KEY_FILE = os.path.join(os.path.expanduser('~'), '.config', 'picdat', 'checkpoint.key')
+
+# Number of random bytes of the secret key:
+CHECKPOINT_KEY_SIZE = 32
+
+# Hash function of the signature. Its digest is written in front of the pickled checkpoint:
+SIGNATURE_HASH = hashlib.sha256
+SIGNATURE_SIZE = SIGNATURE_HASH().digest_size
+
+
+def get_checkpoint_file(result_dir, output_label):
+    """
+    Names the checkpoint file of a node.
+    :param result_dir: The output directory.
+    :param output_label: The prefix of the node's result files, made of cluster and node name.
+    :return: The path to the checkpoint file.
+    """
+    return os.path.join(result_dir, output_label + CHECKPOINT_ENDING)
+
+
+def get_key():
+    """
+    Reads the secret key, checkpoints are signed with. Creates it, if there is none yet.
+    :return: The key as bytes.
+    :raises OSError: If the key file can neither be read nor created.
+    """
+    try:
+        with open(CHECKPOINT_KEY_FILE, 'rb') as key_file:
+            key = key_file.read()
+        if len(key) == CHECKPOINT_KEY_SIZE:
+            return key
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(CHECKPOINT_KEY_FILE), mode=0o700, exist_ok=True)
+    key = secrets.token_bytes(CHECKPOINT_KEY_SIZE)
+    # write the key under a temporary name first, so that parallel runs never read a partial key:
+    temp_file = CHECKPOINT_KEY_FILE + '.' + str(os.getpid())
+    with open(os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as key_file:
+        key_file.write(key)
+    try:
+        # keep a key, which a parallel run created in the meantime:
+        os.link(temp_file, CHECKPOINT_KEY_FILE)
+    except FileExistsError:
+        with open(CHECKPOINT_KEY_FILE, 'rb') as key_file:
+            key = key_file.read()
+    finally:
+        os.remove(temp_file)
+    return key
+
+
+def sign(content):
+    """
+    Computes the signature of a checkpoint.
+    :param content: The pickled checkpoint as bytes.
+    :return: The signature as bytes of length SIGNATURE_SIZE.
+    :raises OSError: If the key file can neither be read nor created.
+    """
+    return hmac.new(get_key(), content, SIGNATURE_HASH).digest()
+
+
+def get_fingerprint(asup_file):
+    """
+    Identifies an ASUP by its content, so that it's recognized, even if it has been renamed or
+    extracted into another place.
+    :param asup_file: The path to a 'CM-STATS-HOURLY-DATA.XML' file or a json file.
+    :return: A sha1 hash over the file's content as hex String.
+    """
+    fingerprint = hashlib.sha1()
+    result_cache.hash_file(fingerprint, asup_file)
+    return fingerprint.hexdigest()
+
+
+def save(checkpoint_file, container, cluster, node, fingerprints):
+    """
+    Saves a checkpoint of a container. An existing checkpoint gets replaced.
+    :param checkpoint_file: The path to save the checkpoint to.
+    :param container: An XmlContainer or JsonContainer. Its charts must not have been completed
+    yet.
+    :param cluster: The name of the cluster, the container's data belongs to.
+    :param node: The name of the node, the container's data belongs to.
+    :param fingerprints: A set of the fingerprints of all ASUPs read into the container.
+    :return: None
+    """
+    checkpoint = {'version': CHECKPOINT_VERSION, 'container_type': type(container).__name__,
+                  'cluster': cluster, 'node': node, 'fingerprints': fingerprints,
+                  'container': container.get_checkpoint()}
+
+    # write the checkpoint under a temporary name first, so that an interruption never leaves
+    # a broken checkpoint behind:
+    temp_file = checkpoint_file + '.' + str(os.getpid())
+    content = pickle.dumps(checkpoint, pickle.HIGHEST_PROTOCOL)
+    try:
+        signature = sign(content)
+        with open(temp_file, 'wb') as file:
+            file.write(signature)
+            file.write(content)
+        os.replace(temp_file, checkpoint_file)
+    except OSError as error:
+        logging.warning('Could not save checkpoint %s: %s', checkpoint_file, error)
+        return
+    logging.debug('Saved checkpoint of %s ASUPs into %s', len(fingerprints), checkpoint_file)
+
+
+def load(checkpoint_file, container_type=None):
+    """
+    Loads a checkpoint, if there is a valid one. The checkpoint is only unpickled, if its
+    signature proves that PicDat wrote it under the current user.
+    :param checkpoint_file: The path to the checkpoint file.
+    :param container_type: The name of the container class, the checkpoint should be of, or None
+    to accept any.
+    :return: The checkpoint as dict with the keys 'container_type', 'cluster', 'node',
+    'fingerprints' and 'container', which holds the container's state for its
+    restore_checkpoint method. None, if there is no valid checkpoint.
+    """
+    if not os.path.isfile(checkpoint_file):
+        return None
+
+    try:
+        with open(checkpoint_file, 'rb') as file:
+            signature = file.read(SIGNATURE_SIZE)
+            content = file.read()
+        if not hmac.compare_digest(signature, sign(content)):
+            logging.warning('Checkpoint %s has not been written by PicDat under this user, it is '
+                            'ignored.', checkpoint_file)
+            return None
+        checkpoint = pickle.loads(content)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as error:
+        logging.warning('Could not load checkpoint %s, it is ignored: %s', checkpoint_file, error)
+        return None
+
+    if not isinstance(checkpoint, dict) or checkpoint.get('version') != CHECKPOINT_VERSION:
+        logging.info('Checkpoint %s is of another PicDat version, it is ignored.',
+                     checkpoint_file)
+        return None
+    if container_type is not None and checkpoint['container_type'] != container_type:
+        logging.info('Checkpoint %s belongs to another kind of ASUPs, it is ignored.',
+                     checkpoint_file)
+        return None
+
+    logging.info('Resume from checkpoint %s, which contains %s ASUPs', checkpoint_file,
+                 len(checkpoint['fingerprints']))
+    return checkpoint
@@ -6,7 +6,7 @@ import logging
 import math
 import datetime
 from collections import defaultdict
-from general.table import Table
+from general.table import NumericTable
 
 __author__ = 'Marie Lohbeck'
 __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
@@ -89,12 +89,12 @@ class Hdf5Container:
         """
         self.timezone = None
 
-        # A dict of Table objects. Each key from the three key lists has exactly one Table
+        # A dict of NumericTable objects. Each key from the three key lists has exactly one Table
         # storing all the matching data found in hdf5 data file.
-        self.tables = {searchkey: Table()
+        self.tables = {searchkey: NumericTable()
                        for searchkey in INSTANCES_OVER_TIME_KEYS + INSTANCES_OVER_BUCKET_KEYS}
         for key_id, _, _ in COUNTERS_OVER_TIME_KEYS:
-            self.tables[key_id] = Table()
+            self.tables[key_id] = NumericTable()
 
         # A dict for relating units to each search key from the three key lists.
         # Units are provided by the hdf5 info file.
@@ -133,8 +133,8 @@ class Hdf5Container:
         converting the values and storing them to self.tables. This method does this actions for
         a given buffer.
         :param buffer: A dict, storing all relevant data from one hdf5 table. Its keys are the
-        columns of the general.Table() objects from self.tables, the values belong to (Can either
-        be instance names or counter names, respective to the KEYS, the buffer belong to). The
+        columns of the general.NumericTable() objects from self.tables, the values belong to (Can
+        either be instance names or counter names, respective to the KEYS, the buffer belong to). The
         values of the buffer dict are lists of tuples of a unixtimestamp and the value. So, the
         structure is like this: buffer = {column_name: [(row_name, value), (row_name, value)...}
         """
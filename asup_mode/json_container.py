@@ -5,8 +5,9 @@ processing all data collected from json files.
 import logging
 import datetime
 import math
-import operator
-from general.table import Table, do_table_operation
+from general.table import NumericTable
+from general import table_algebra
+from general.table_algebra import DerivedChart
 
 __author__ = 'Marie Lohbeck'
 __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
@@ -84,12 +85,18 @@ COUNTERS_OVER_TIME_KEYS = [
 # list, not containing actual keys, but elements which are very similar to the keys. Each element
 # is a tuple of two strings. From the tuples, PicDat generates for example the chart names.
 #
-# If you want to include an additional, calculated chart, only appending to the FURTHER_CHARTS list
-# won't do the job. In parallel, you need to append to the JsonContainer method
-# 'calculate_further_charts'. In there, the new chart can be calculated with accessing already
-# collected values.
+# To include an additional, calculated chart, append it to the DERIVED_CHARTS list. Each element
+# is a general.table_algebra.DerivedChart, which declares, how to calculate the chart from already
+# collected values. FURTHER_CHARTS is generated from it.
 # For simplicity, 'further charts' cannot be histograms (cannot be displayed as bar charts).
-FURTHER_CHARTS = [('aggregate', 'free_space_fragmentation')]
+DERIVED_CHARTS = [
+    # free_space_fragmentation = user_writes / cp_reads. A division by zero results in 0.
+    DerivedChart(name=('aggregate', 'free_space_fragmentation'),
+                 expression='ratio(aggregate.user_writes, aggregate.cp_reads)', unit='',
+                 dropped_operands=[('aggregate', 'user_writes'), ('aggregate', 'cp_reads')],
+                 reference=1)
+]
+FURTHER_CHARTS = [chart.name for chart in DERIVED_CHARTS]
 
 
 class JsonContainer:
@@ -107,14 +114,14 @@ class JsonContainer:
 
         self.timezone = timezone
 
-        # A dict of Table objects. Each key from the three key lists has exactly one Table
+        # A dict of NumericTable objects. Each key from the three key lists has exactly one Table
         # storing all the matching data found in json data file.
-        self.tables = {searchkey: Table() for searchkey in
+        self.tables = {searchkey: NumericTable() for searchkey in
                        INSTANCES_OVER_TIME_KEYS + INSTANCES_OVER_BUCKET_KEYS}
         for key_id, _, _ in COUNTERS_OVER_TIME_KEYS:
-            self.tables[key_id] = Table()
+            self.tables[key_id] = NumericTable()
         for name in FURTHER_CHARTS:
-            self.tables[name] = Table()
+            self.tables[name] = NumericTable()
 
         # A dict for relating units to each search key from the three key lists. None values will
         # be replaced while reading the data
@@ -123,7 +130,7 @@ class JsonContainer:
         for key_id, _, _ in COUNTERS_OVER_TIME_KEYS:
             self.units[key_id] = None
         for name in FURTHER_CHARTS:
-            self.units[name] = Table()
+            self.units[name] = None
 
         # To get a nice title for the last system chart, the program reads the node name from one
         # of the json objects. This node name will substitute the word 'system' in chart labels.
@@ -202,89 +209,37 @@ class JsonContainer:
             logging.warning('Found JSON object which doesn\'t hold expected contents. Object will '
                             'be ignored. It looks like: %s', json_item)
 
+    def get_checkpoint(self):
+        """
+        Collects the container's state, so that a later PicDat run can go on reading further json
+        files, as if it had read all of them at once. Don't call it after the charts have been
+        completed with calculate_further_charts or do_unit_conversions!
+        :return: A dict, which can be pickled.
+        """
+        return {'timezone': self.timezone, 'tables': self.tables, 'units': self.units,
+                'node_name': self.node_name}
+
+    def restore_checkpoint(self, checkpoint):
+        """
+        Takes over the state of a container from an earlier PicDat run.
+        :param checkpoint: A dict, as returned by get_checkpoint.
+        :return: None
+        """
+        self.timezone = checkpoint['timezone']
+        self.tables = checkpoint['tables']
+        self.units = checkpoint['units']
+        self.node_name = checkpoint['node_name']
+
     def calculate_further_charts(self):
         """
         PicDat aims to collect and visualise performance data given in ASUPs. But it also intends
         to show further charts, for which the data is not directly given in the ASUP, but can get
-        calculated with it. This approach is a bit contradictory to the program's remaining logic,
-        so its implementation is less smooth. It is handled in this method.
-
-        For each additional, calculated chart, this method explicitly creates a new value Table
-        by calculating the values from other tables. Further, it adds a unit to the container's
-        self.units list and clears the tables, which have been the operands for the calculation
-        (optional).
-
-        In parallel, each additional chart has to be referenced in the module constant list
-        FURTHER_CHARTS. Otherwise, the new chart won't be considered when calling the functions
-        util.get_flat_tables() and util.build_label_dict. This means, PicDat won't create the new
-        chart at all. The chart's entry in FURTHER_CHARTS must be the same as the dict key, which
-        is used to store the charts data in self.tables and self.units. Further, it must be a
-        tuple of two strings.
+        calculated with it. This method calculates all charts declared in the module constant
+        list DERIVED_CHARTS from the collected tables. Further, it adds their units to the
+        container's self.units and clears the tables, which have been the operands for the
+        calculation (optional).
         """
-
-        # Following commented code is an example about how a new calculated chart can be created.
-        # You can copy, uncomment and adapt it to your needs.
-#===============================================================================
-#         # select different dict keys from them used for self.tables and self.units
-#         # tuple 'new_chart_name' has to be copied to FURTHER_CHARTS
-#         # Which dict keys are used to store the tables you want to use as operands, can be
-#         # obtained from other object methods. If the operand is a table belonging to
-#         # INSTANCES_OVER_TIME_KEYS, it is always ('object', 'counter')
-#         new_chart_name = ('some_object_name', 'description_of_kind_of_values')
-#         operand1_name = ('some_object_name', 'some_counter_with_collected_values')
-#         operand2_name = ('some_object_name', 'some_other_counter_with_collected_values')
-#
-#         # add new unit
-#         self.units[new_chart_name] = 'chose right unit'
-#
-#         # following will calculate : new_table = operand1_table + operand2_table
-#         self.tables[new_chart_name] = do_table_operation(
-#             operator.add, self.tables[operand1_name], self.tables[operand2_name])
-#
-#         # if you want to through away your operands after you did the calculation, replace the
-#         # operands with empty tables. Otherwise, PicDat will generate charts for each operand too
-#         self.tables[operand1_name] = Table()
-#         self.tables[operand2_name] = Table()
-#
-#         # finally, you can apply some more magic to your calculated table. Following code adds a
-#         # constant line to your chart.
-#         if not self.tables[new_chart_name].is_empty():
-#             self.tables[new_chart_name].add_constant_column('reference', 1)
-#===============================================================================
-
-        # Following code is for creating the new chart with name
-        # ('aggregate', 'free_space_fragmentation')
-
-        # Following name must be inside FURTHER_CHARTS list
-        new_chart_name = ('aggregate', 'free_space_fragmentation')
-
-        # The tables with following keys contain the yet collected values, from which the new table
-        # gets calculated
-        operand1_name = ('aggregate', 'user_writes')
-        operand2_name = ('aggregate', 'cp_reads')
-
-        if self.units[operand1_name] != self.units[operand2_name]:
-            logging.warning('table %s and table %s should have the same unit, but they don\'t.'
-                            'Hence, table %s is probably calculated wrong!', operand1_name,
-                            operand2_name, new_chart_name)
-
-        # Decide, which unit the new chart's values have
-        self.units[new_chart_name] = ''
-
-        # calculate new table
-        self.tables[new_chart_name] = do_table_operation(
-            operator.truediv, self.tables[operand1_name], self.tables[operand2_name])
-
-        # delete contents of operand tables by replacing them through empty tables, so that tables
-        # will be ignored in the future
-        self.tables[operand1_name] = Table()
-        self.tables[operand2_name] = Table()
-
-        logging.debug(self.tables[new_chart_name])
-
-        # add a constant data series to the chart
-        if not self.tables[new_chart_name].is_empty():
-            self.tables[new_chart_name].add_constant_column('reference', 1)
+        table_algebra.calculate_derived_charts(DERIVED_CHARTS, self.tables, self.units)
 
     def do_unit_conversions(self):
         """
@@ -14,6 +14,7 @@ except ImportError:
           'or asup xml files, everything is fine.')
 
 from asup_mode.json_container import JsonContainer, FURTHER_CHARTS
+from asup_mode import checkpoint
 from asup_mode import util
 
 __author__ = 'Marie Lohbeck'
@@ -33,7 +34,49 @@ __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
 # You should have received a copy of the GNU General Public License along with PicDat. If not,
 # see <http://www.gnu.org/licenses/>.
 
-def read_json(asup_json_files, sort_columns_by_name):
+def read_cluster_and_node(asup_json_file):
+    """
+    Reads cluster and node name from the first json object of a file, without reading the rest
+    of the file.
+    :param asup_json_file: Filename of a file containing ASUP data in JSON format.
+    :return: A tuple of two strings which are cluster name and node name, or '???' for both, if
+    the first object seems malformed. None, if the file doesn't contain any json objects.
+    """
+    with open(asup_json_file, 'r') as json_file:
+        try:
+            first_item = next(ijson.items(json_file, 'item'))
+        except StopIteration:
+            return None
+
+    try:
+        return first_item['cluster_name'], first_item['node_name']
+    except KeyError:
+        logging.warning('Tried to read cluster and node name from first object of file: %s, but '
+                        'it seems malformed. So, can\'t check those information. JSON object is: '
+                        '%s', asup_json_file, first_item)
+        return '???', '???'
+
+
+def read_json_file(container, asup_json_file):
+    """
+    Reads all json objects of a file into a JsonContainer.
+    :param container: A JsonContainer object which holds all collected json data.
+    :param asup_json_file: Filename of a file containing ASUP data in JSON format.
+    :return: None
+    """
+    with open(asup_json_file, 'r') as json_file:
+        logging.info("Read file %s", asup_json_file)
+        item_count = 0
+        for item in ijson.items(json_file, 'item'):
+            container.add_data(item)
+            item_count += 1
+
+    if item_count == 0:
+        logging.error('File %s does not contain any valid json content. It will be ignored.',
+                      asup_json_file)
+
+
+def read_json(asup_json_files, sort_columns_by_name, checkpoint_dir=None):
     """
     Reads json files and collects all data from it. Opens all files from list
     asup_json_files one after another and parses them with the ijson library. Ijson translates
@@ -44,6 +87,9 @@ def read_json(asup_json_files, sort_columns_by_name):
     :param sort_columns_by_name: A boolean, which determines whether the results should be sorted
     by name or by value instead. This will effect some of the returned tables (for some tables,
     sort by value doesn't make sense).
+    :param checkpoint_dir: A directory, in which a checkpoint of the container should be kept, or
+    None. If there is a checkpoint of an earlier run in it, the container is restored from it and
+    only json files, which aren't in the checkpoint yet, are read.
     :return: all chart data in tablelist format; ready to be written into csv tables. Additionally
     a label dict, which contains all required meta data about charts, labels or file names. At
     third, it returns a tuple of two strings which are cluster name and node name.
@@ -58,37 +104,37 @@ def read_json(asup_json_files, sort_columns_by_name):
     cluster_and_node = None
 
     for file in asup_json_files:
-        with open (file, 'r') as json_file:
-            logging.info("Read file %s", file)
-            iterjson = ijson.items(json_file, 'item')
-
-            # get cluster and node name from the first element of each file
-            try:
-                first_item = next(iterjson)
-                try:
-                    if not cluster_and_node:
-                        cluster_and_node = first_item['cluster_name'], first_item['node_name']
-                    else:
-                        if cluster_and_node != (
-                            first_item['cluster_name'], first_item['node_name']):
-                            logging.error(
-                                'inhomogeneous data: Different files in your input belong to '
-                                'different clusters/nodes. PicDat output will probably not make '
-                                'much sense.')
-                except KeyError:
-                    logging.warning('Tried to read cluster and node name from first object of '
-                                    'file: %s, but it seems malformed. So, can\'t check those '
-                                    'information. JSON object is: %s', file, first_item)
-                    if not cluster_and_node:
-                        cluster_and_node = '???', '???'
-
-                # read data (first item and all others)
-                container.add_data(first_item)
-                for item in iterjson:
-                    container.add_data(item)
-            except StopIteration:
-                logging.error(
-                    'File %s does not contain any valid json content. It will be ignored.', file)
+        # get cluster and node name from the first element of each file
+        file_cluster_and_node = read_cluster_and_node(file)
+        if not cluster_and_node:
+            cluster_and_node = file_cluster_and_node
+        elif file_cluster_and_node not in (None, ('???', '???'), cluster_and_node):
+            logging.error(
+                'inhomogeneous data: Different files in your input belong to '
+                'different clusters/nodes. PicDat output will probably not make '
+                'much sense.')
+
+    checkpoint_file = None
+    fingerprints = set()
+    if checkpoint_dir is not None and cluster_and_node:
+        checkpoint_file = checkpoint.get_checkpoint_file(checkpoint_dir,
+                                                         ''.join(cluster_and_node) + '_')
+        saved_checkpoint = checkpoint.load(checkpoint_file, type(container).__name__)
+        if saved_checkpoint is not None:
+            container.restore_checkpoint(saved_checkpoint['container'])
+            fingerprints = saved_checkpoint['fingerprints']
+
+    for file in asup_json_files:
+        if checkpoint_file is not None:
+            fingerprint = checkpoint.get_fingerprint(file)
+            if fingerprint in fingerprints:
+                logging.info('File %s is in checkpoint already.', file)
+                continue
+            fingerprints.add(fingerprint)
+        read_json_file(container, file)
+
+    if checkpoint_file is not None:
+        checkpoint.save(checkpoint_file, container, *cluster_and_node, fingerprints)
 
     # print information if charts are empty:
     for table_name, table in container.tables.items():
@@ -86,7 +86,7 @@ def get_abs_val(this_val, unixtimestamp, val_buffer, buffer_key, timezone=None):
 
 def get_flat_tables(asup_container, sort_columns_by_name):
     """
-    Calls the flatten method for each table from asup_container.tables, which is not empty.
+    Calls the iterate_rows method for each table from asup_container.tables, which is not empty.
     :param asup_container: xml_container, json_container, or hdf5_container object. Those container
     object does have a similar structure, so their tables can be flattened in the same way by this
     function.
@@ -94,7 +94,8 @@ def get_flat_tables(asup_container, sort_columns_by_name):
     by names. If False, they will be sorted by value. Tables for
     COUNTERS_OVER_TIME_KEYS will always be sorted by names, because this is considered
     to be a clearer arrangement.
-    :return: all not-empty flattened tables in a list.
+    :return: A list with a row generator for each not-empty table. The rows are flattened not
+    until the tables get written.
     """
 
     # get the three key list INSTANCES_OVER_TIME_KEYS, INSTANCES_OVER_BUCKET_KEYS, and
@@ -108,19 +109,22 @@ def get_flat_tables(asup_container, sort_columns_by_name):
     # initialise table list
     flat_tables = []
 
-    flat_tables = flat_tables + [asup_container.tables[key].flatten('time', sort_columns_by_name)
+    flat_tables = flat_tables + [asup_container.tables[key].iterate_rows('time',
+                                                                         sort_columns_by_name)
                                  for key in instances_over_time_keys
                                  if not asup_container.tables[key].is_empty()]
 
-    flat_tables = flat_tables + [asup_container.tables[key].flatten('bucket', sort_columns_by_name)
+    flat_tables = flat_tables + [asup_container.tables[key].iterate_rows('bucket',
+                                                                         sort_columns_by_name)
                                  for key in instances_over_bucket_keys
                                  if not asup_container.tables[key].is_empty()]
 
-    flat_tables = flat_tables + [asup_container.tables[key_id].flatten('time', True)
+    flat_tables = flat_tables + [asup_container.tables[key_id].iterate_rows('time', True)
                                  for (key_id, _, _) in counters_over_time_keys
                                  if not asup_container.tables[key_id].is_empty()]
 
-    flat_tables = flat_tables + [asup_container.tables[name].flatten('time', sort_columns_by_name)
+    flat_tables = flat_tables + [asup_container.tables[name].iterate_rows('time',
+                                                                          sort_columns_by_name)
                                  for name in further_charts
                                  if not asup_container.tables[name].is_empty()]
     return flat_tables
@@ -7,6 +7,7 @@ import logging
 import xml.etree.ElementTree as ET
 import picdat_util
 from asup_mode.xml_container import XmlContainer
+from asup_mode import checkpoint
 from asup_mode import util
 
 __author__ = 'Marie Lohbeck'
@@ -106,7 +107,8 @@ def read_data_file(container, data_file):
     logging.debug('remaining base elements: %s', str(container.base_heap))
 
 
-def read_xmls(asup_xml_data_files, asup_xml_info_file, timezone, sort_columns_by_name):
+def read_xmls(asup_xml_data_files, asup_xml_info_file, timezone, sort_columns_by_name,
+              checkpoint_dir=None, cluster=None, node=None):
     """
     This function analyzes both, the 'CM-STATS-HOURLY-DATA.XML' and the 'CM-STATS-HOURLY-INFO.XML'
     file. It holds a XmlContainer object to store collected information.
@@ -116,19 +118,44 @@ def read_xmls(asup_xml_data_files, asup_xml_info_file, timezone, sort_columns_by
     :param sort_columns_by_name: A boolean, which determines whether the results should be sorted
     by name or by value instead. This will effect some of the returned tables (for some tables,
     sort by value doesn't make sense).
+    :param checkpoint_dir: A directory, in which a checkpoint of the container should be kept, or
+    None. If there is a checkpoint of an earlier run in it, the container is restored from it and
+    only data files, which aren't in the checkpoint yet, are read.
+    :param cluster: The cluster name from the HEADER file. It names the checkpoint.
+    :param node: The node name from the HEADER file. It names the checkpoint.
     :return: all chart data in tablelist format; ready to be written into csv tables. Additionally
     an label dict, which contains all required meta data about charts, labels or file names.
     """
     container = XmlContainer(timezone)
 
-    logging.info('Read info file...')
-    read_info_file(container, asup_xml_info_file)
+    checkpoint_file = None
+    fingerprints = set()
+    if checkpoint_dir is not None:
+        checkpoint_file = checkpoint.get_checkpoint_file(checkpoint_dir,
+                                                         (cluster or '') + (node or '') + '_')
+        saved_checkpoint = checkpoint.load(checkpoint_file, type(container).__name__)
+        if saved_checkpoint is not None:
+            container.restore_checkpoint(saved_checkpoint['container'])
+            fingerprints = saved_checkpoint['fingerprints']
+
+    if not fingerprints:
+        logging.info('Read info file...')
+        read_info_file(container, asup_xml_info_file)
     logging.info('Read data file(s)...')
     for data_file in asup_xml_data_files:
+        if checkpoint_file is not None:
+            fingerprint = checkpoint.get_fingerprint(data_file)
+            if fingerprint in fingerprints:
+                logging.info('Data file %s is in checkpoint already.', data_file)
+                continue
+            fingerprints.add(fingerprint)
         logging.debug('read file %s', data_file)
         read_data_file(container, data_file)
 
     container.process_base_heap()
+    if checkpoint_file is not None:
+        checkpoint.save(checkpoint_file, container, cluster, node, fingerprints)
+
     container.calculate_further_charts()
     container.do_unit_conversions()
 
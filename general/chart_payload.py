@@ -0,0 +1,282 @@
+"""
+Is responsible for encoding chart data as compact binary payloads. A payload holds the chart's
+x values as Int32 column (seconds since the beginning of unix time, or bucket numbers) and each
+graph's values as Float32 column, all base64 encoded. The html templates decode them into the
+native data format of dygraphs, which is much faster to load than csv text.
+Payloads are built from the float columns of the tables directly, so they hold the values with full
+precision, regardless of how they are formatted in the csv tables. Only tables, which don't provide
+their values like this, are read from their csv content.
+Payloads of charts with more values than POINT_BUDGET additionally hold downsampled levels: Each
+level combines buckets of rows of the full data into two rows, holding the minimum and the maximum
+of each graph within the bucket, so that peaks stay visible. Rows without any values, like the
+empty lines between iterations, are kept in each level, so that graph lines are interrupted there
+as in the full data. The browser shows the coarsest level first and swaps in finer levels when the
+user zooms in.
+"""
+import array
+import base64
+import bisect
+import calendar
+import datetime
+import logging
+import sys
+
+from general import table_writer
+from general.table import TableRows
+
+__author__ = 'Marie Lohbeck'
+__copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
+
+# license notice:
+#
+# This file is part of PicDat.
+# PicDat is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public (at your option) any later version.
+#
+# PicDat is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with PicDat. If not,
+# see <http://www.gnu.org/licenses/>.
+
+# separator between the entries of a csv line, as written by the table_writer:
+CSV_SEPARATOR = ', '
+
+# the maximum number of values a chart shows at once; charts with more values get downsampled:
+POINT_BUDGET = 100000
+
+# the number of rows of a level, which are combined into one bucket in the next coarser level:
+LEVEL_FACTOR = 8
+
+
+def encode_column(values, typecode):
+    """
+    Packs a column of numbers into a base64 String. The numbers are stored in little-endian byte
+    order, which is the byte order of JavaScript's typed arrays on all common platforms.
+    :param values: An iterable of numbers.
+    :param typecode: The typecode of the array type, the numbers should be stored as; 'i' for
+    Int32 or 'f' for Float32.
+    :return: The base64 encoded bytes as String.
+    """
+    column = array.array(typecode, values)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return base64.b64encode(column.tobytes()).decode('ascii')
+
+
+def parse_x_value(entry):
+    """
+    Converts the first entry of a csv line into a number.
+    :param entry: A String like '2000-01-01 00:00:00' or a bucket number.
+    :return: A tuple of the number and a boolean, whether it is a time. Times are given in
+    seconds since the beginning of unix time, read as they are written, without converting them
+    from any timezone.
+    :raises ValueError: If the entry is neither a time nor a number.
+    """
+    try:
+        return int(entry), False
+    except ValueError:
+        timestamp = datetime.datetime.fromisoformat(entry)
+        return calendar.timegm(timestamp.timetuple()), True
+
+
+def find_empty_rows(columns, rows):
+    """
+    Looks for rows without any values, like the empty lines between iterations.
+    :param columns: One float array for each graph, holding its value for each row.
+    :param rows: The number of rows.
+    :return: A sorted list of the numbers of all rows, which hold NaN in each column.
+    """
+    return [row for row in range(rows)
+            if all(column[row] != column[row] for column in columns)]
+
+
+def append_bucket(level_x_values, level_columns, x_values, columns, start, end):
+    """
+    Combines rows into two rows of a downsampled level: The first one holds the minimum of each
+    graph at the time of the first row, the second one the maximum at the time of the last row.
+    Gaps are ignored.
+    :param level_x_values: The x values of the level, the rows are appended to.
+    :param level_columns: The columns of the level, the rows are appended to.
+    :param x_values: The x values of the chart's rows.
+    :param columns: One float array for each graph, holding its value for each row.
+    :param start: The number of the first row to combine.
+    :param end: The number of the row behind the last one to combine.
+    :return: None
+    """
+    if start >= end:
+        return
+
+    level_x_values.append(x_values[start])
+    level_x_values.append(x_values[end - 1])
+    for column, level_column in zip(columns, level_columns):
+        values = [value for value in column[start:end] if value == value]
+        if values:
+            level_column.append(min(values))
+            level_column.append(max(values))
+        else:
+            level_column.extend((float('nan'), float('nan')))
+
+
+def downsample(x_values, columns, bucket_size, empty_rows=()):
+    """
+    Builds a downsampled level of a chart. Each bucket of rows becomes two rows, as described in
+    append_bucket. If a bucket contains empty rows, it is split at them and each empty row is kept
+    as row without any values, so that graph lines are interrupted at the same places as in the
+    full data.
+    :param x_values: The x values of the chart's rows.
+    :param columns: One float array for each graph, holding its value for each row.
+    :param bucket_size: The number of rows to combine.
+    :param empty_rows: A sorted list of the numbers of all rows without any values, as returned by
+    find_empty_rows.
+    :return: A tuple of the level's x values and columns, in the same format as the parameters.
+    """
+    level_x_values = array.array('l')
+    level_columns = [array.array('d') for _ in columns]
+
+    for start in range(0, len(x_values), bucket_size):
+        end = min(start + bucket_size, len(x_values))
+        segment_start = start
+        for empty_row in empty_rows[bisect.bisect_left(empty_rows, start):
+                                    bisect.bisect_left(empty_rows, end)]:
+            append_bucket(level_x_values, level_columns, x_values, columns, segment_start,
+                          empty_row)
+            level_x_values.append(x_values[empty_row])
+            for level_column in level_columns:
+                level_column.append(float('nan'))
+            segment_start = empty_row + 1
+        append_bucket(level_x_values, level_columns, x_values, columns, segment_start, end)
+
+    return level_x_values, level_columns
+
+
+def build_levels(x_values, columns):
+    """
+    Builds downsampled levels of a chart, each one LEVEL_FACTOR times coarser than the one
+    before, until a level fits into the POINT_BUDGET.
+    :param x_values: The x values of the chart's rows.
+    :param columns: One float array for each graph, holding its value for each row.
+    :return: A list of levels, from fine to coarse, each one a dict with the keys 'x' and
+    'columns'. Empty, if the chart fits into the POINT_BUDGET anyway.
+    """
+    levels = []
+    bucket_size = 1
+    rows = len(x_values)
+    empty_rows = None
+    while rows * len(columns) > POINT_BUDGET and rows > 2:
+        if empty_rows is None:
+            empty_rows = find_empty_rows(columns, len(x_values))
+        bucket_size *= LEVEL_FACTOR
+        level_x_values, level_columns = downsample(x_values, columns, bucket_size, empty_rows)
+        # the empty rows are kept in each level, so at some point, levels don't get smaller:
+        if len(level_x_values) >= rows:
+            break
+        rows = len(level_x_values)
+        levels.append({'x': encode_column(level_x_values, 'i'),
+                       'columns': [encode_column(column, 'f') for column in level_columns]})
+    return levels
+
+
+def build_payload(labels, is_time, x_values, columns):
+    """
+    Encodes a table as binary payload. Empty lines, which interrupt the graph lines between
+    iterations, are kept as lines without any values at the time of the previous line.
+    :param labels: The table's header row: The x label followed by the graphs' names.
+    :param is_time: Boolean, whether the x values are times.
+    :param x_values: The x value of each row: Seconds since the beginning of unix time or bucket
+    numbers. None marks an empty line.
+    :param columns: One float array for each graph, holding its value for each row. Gaps are NaN.
+    :return: The payload as dict with the keys 'labels', 'time', 'x', 'columns', 'levels' and
+    'budget'. Histograms are not downsampled, so their levels are always empty.
+    """
+    x_column = array.array('l')
+    for x_value in x_values:
+        x_column.append(x_column[-1] if x_value is None else x_value)
+
+    levels = build_levels(x_column, columns) if is_time else []
+    if levels:
+        logging.debug('Built %s downsampled levels for chart %s', len(levels), labels[1:])
+
+    return {'labels': labels, 'time': is_time, 'x': encode_column(x_column, 'i'),
+            'columns': [encode_column(column, 'f') for column in columns], 'levels': levels,
+            'budget': POINT_BUDGET}
+
+
+def read_payload(csv_content):
+    """
+    Reads a csv table, as the table_writer formatted it, and encodes it as binary payload. This is
+    for tables, which don't provide their values as float columns.
+    :param csv_content: The csv table as String.
+    :return: The payload as dict, as described in build_payload.
+    :raises ValueError: If the table contains anything else than numbers.
+    """
+    lines = csv_content.splitlines()
+    labels = lines[0].split(CSV_SEPARATOR)
+    x_values = []
+    columns = [array.array('d') for _ in labels[1:]]
+    is_time = False
+
+    for line in lines[1:]:
+        entries = line.split(CSV_SEPARATOR)
+        x_entry = entries[0].strip()
+        if x_entry:
+            x_value, is_time = parse_x_value(x_entry)
+        elif x_values:
+            x_value = None
+        else:
+            continue
+        x_values.append(x_value)
+
+        for column, entry in zip(columns, entries[1:] if x_entry else []):
+            entry = entry.strip()
+            column.append(float(entry) if entry else float('nan'))
+        for column in columns:
+            if len(column) < len(x_values):
+                column.append(float('nan'))
+
+    return build_payload(labels, is_time, x_values, columns)
+
+
+def get_csv_content(csv_filepath, table, digits=None):
+    """
+    Provides the csv content of a table, for charts, which are not encoded from float columns.
+    :param csv_filepath: The path to the table's csv file.
+    :param table: The table as it was given to the table_writer: a TableRows object or a nested
+    list, which are formatted again, or None, if the table has been written while collecting the
+    data, so that it's read from its file.
+    :param digits: The number of significant digits for non-integral values, or None for full
+    precision.
+    :return: The csv content as String.
+    """
+    if table is None:
+        with open(csv_filepath, 'r') as csv:
+            return csv.read()
+    return ''.join(table_writer.format_table(table, digits))
+
+
+def chart_payloads(csv_abs_filepaths, tables, digits=None):
+    """
+    Encodes several tables as binary payloads, ready to be embedded into the html file. Tables,
+    which are TableRows objects, are encoded from their float columns; all others are read from
+    their csv content. If a table can't be encoded, its chart falls back to the csv content. Csv
+    contents are only built for those charts, which need them.
+    :param csv_abs_filepaths: A list of paths to the csv files.
+    :param tables: The list of tables, as they were given to the table_writer.
+    :param digits: The number of significant digits for non-integral values in csv contents, or
+    None for full precision.
+    :return: A list with one entry for each chart: Either a payload dict, or a String holding the
+    csv content.
+    """
+    payloads = []
+    for csv_filepath, table in zip(csv_abs_filepaths, tables):
+        try:
+            if isinstance(table, TableRows):
+                payloads.append(build_payload(*table.get_chart_values()))
+            else:
+                payloads.append(read_payload(get_csv_content(csv_filepath, table, digits)))
+        except (ValueError, OverflowError):
+            logging.info('Could not encode %s as binary payload. Its chart is embedded as csv '
+                         'instead.', csv_filepath)
+            payloads.append(get_csv_content(csv_filepath, table, digits))
+    return payloads
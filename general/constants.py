@@ -3,7 +3,7 @@ Constants for different modules.
 """
 
 import logging
-from os import sep
+from os import path, sep
 
 __author__ = 'Marie Lohbeck'
 __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
@@ -26,10 +26,10 @@ __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
 HELP = '''
 PicDat is a tool for visualising performance data. It can handle PerfStat files as well as ASUP files.
 
-For visualising PerfStats, give a single .data or .out file or a .zip file as input, or a folder,
-containing unpacked PerfStat files. Within a .zip or a folder, it is possible to pass several PerfSat
-files at once, for example PerfStats for several nodes inside the same cluster. Each PerfStat file
-will have an own .html as result. 
+For visualising PerfStats, give a single .data or .out file (optionally compressed as .gz, .xz or
+.bz2) or a .zip file as input, or a folder, containing PerfStat files. Within a .zip or a folder, it
+is possible to pass several PerfSat files at once, for example PerfStats for several nodes inside
+the same cluster. Each PerfStat file will have an own .html as result. 
 
 For visualising ASUP xml files, give a .tgz archive, as you can download it from NetApp or give a
 folder, containing at least 'CM-STATS-HOURLY-INFO.XML' and 'CM-STATS-HOURLY-DATA.XML'. If you want
@@ -54,6 +54,10 @@ usage: %s [--help] [--sortbyname] [--inputfile "input"] [--outputdir "output"] [
     --input "input", -i "input": input is the path to some performance data. Should be a folder,
                                  .zip file, .data file, .out file, .tgz, or .h5 file. 
                                  (for more details look above)
+                                 .data and .out files might be compressed as .gz, .xz or .bz2.
+                                 They and .zip files are read in place, without extracting
+                                 them, but always as a whole, so --mmap, --index and the split
+                                 for --jobs don't apply to them.
                                  
     --outputdir "output", -o "output": output is the directory's path, where this program puts its
                                        results. If there is no directory existing yet under this
@@ -73,12 +77,114 @@ usage: %s [--help] [--sortbyname] [--inputfile "input"] [--outputdir "output"] [
     --webserver, -w: at the end of execution, starts a local web server in output directory to
                      serve dygraphs JavaScript from it. This is a workaround for security settings
                      of browsers like Google Chrome and Internet Explorer.
+
+    --port "number", -p "number": the port, the web server listens to. Default is 8000.
+
+    --bind "address", -q "address": the address, the web server and the ingestion service listen
+                                    on. Default is 127.0.0.1, so that they can only be reached
+                                    from this machine. Give 0.0.0.0 to listen on all network
+                                    interfaces. Note that the ingestion service has no
+                                    authentication; anyone who can reach it can upload files.
+
+    --mmap, -m: reads PerfStat files memory-mapped and searches them on byte level. Only the lines
+                PicDat is interested in get decoded, which speeds up reading large PerfStats
+                considerably.
+
+    --jobs "number", -j "number": reads and visualises several PerfStat files (for example
+                                  PerfStats from several nodes) in parallel, using up to "number"
+                                  worker processes. A single PerfStat file gets split at its
+                                  iterations instead and the parts are read in parallel (always
+                                  memory-mapped). Default is 1.
+
+    --index, -x: reads PerfStat files with help of a block index, which records where the parts
+                 PicDat is interested in are located inside the file. If there is no index for a
+                 file yet, or the file changed, PicDat creates one next to the file (or in
+                 ~/.cache/picdat/index). Following runs on the same file skip searching it.
+                 Implies --mmap.
+
+    --counters "file", -k "file": reads additional per-iteration counters to chart from PerfStat
+                                  files out of a json config file. See
+                                  documentation/example_counters.json for its format.
+
+    --stream, -t: writes sysstat values into their csv tables while reading the PerfStat files,
+                  instead of collecting them in memory first. This keeps memory usage low for long
+                  PerfStats. A single PerfStat file is not split for --jobs then.
+
+    --export, -e: additionally exports all per-iteration counters of each PerfStat file, not only
+                  the charted ones, into an SQLite database called counters.sqlite in the output
+                  directory. PerfStat files are read as a whole then, ignoring --mmap, --index
+                  and the split for --jobs.
+
+    --digits "number", -g "number": writes non-integral values into the csv tables rounded to
+                                    "number" significant digits, which makes the tables
+                                    considerably smaller. Per default, values are written with
+                                    full precision in their shortest form: integral values
+                                    without decimal places and others without trailing zeros,
+                                    so 5.470 from a PerfStat file is written as 5.47 and 11.0
+                                    as 11. Older PicDat versions copied the values as they were
+                                    written in the input, so their tables differ in this way.
+
+    --binary, -b: embeds the chart data into the charts.html files as compact binary columns
+                  instead of csv text, so that large charts get loaded much faster by the browser.
+                  Values are stored with single precision. The csv tables are written anyway.
+                  Charts with very many values are shown downsampled at first; zooming in loads
+                  finer resolutions.
+
+    --notables, -n: doesn't write the csv tables into the output directory, but includes the chart
+                    data only into the charts.html files. Implies --compact, so the result is
+                    just one self-contained file for each PerfStat or ASUP. Can't be combined
+                    with --stream.
+
+    --gzip, -z: additionally writes a gzip compressed copy of each charts.html file, called
+                charts.html.gz, for serving it precompressed.
+
+    --watch, -a: watches the input directory for ASUPs (.tgz archives or .json files) arriving
+                 over time, instead of visualising it once. ASUPs are grouped into charts per
+                 cluster and node by their HEADERS file or json content. Each new ASUP is read on
+                 its own, so reading it doesn't take longer with each ASUP; only rewriting the
+                 charts of its node does. The directory is looked into every 30 seconds. Combined
+                 with --webserver, the charts are served meanwhile. Hit ctrl+C to stop.
+
+    --resume, -y: keeps a checkpoint of the data collected from ASUP xml or json input in the
+                  output directory. Following runs with --resume on the same output directory
+                  add their ASUPs to the ones in the checkpoint, without reading the older ASUPs
+                  again. ASUPs, which are in the checkpoint already, are skipped. So you might
+                  give just a new .tgz archive or .json file as input. --watch always keeps
+                  checkpoints and resumes from them after a restart. Checkpoints are signed with
+                  a secret key in ~/.config/picdat, so that only checkpoints, which PicDat wrote
+                  under the same user, are loaded; others are ignored.
+
+    --nocache, -u: neither takes results from the result cache nor stores them in it. Per default,
+                   PicDat stores a copy of its results in ~/.cache/picdat/results, keyed by the
+                   input's path and content and all options influencing the results. Later runs
+                   on the same input with the same options just copy the cached results. The cache
+                   holds up to 2 GB; least recently used results get deleted first.
+
+    --service, -r: starts PicDat as long-running ingestion service instead of visualising one
+                   input. The service accepts uploads of PerfStat .zip, .data or .out files,
+                   ASUP .tgz archives and .json files over a local HTTP API, listening to the
+                   address and port given with --bind and --port, and processes them with up
+                   to --jobs worker processes. The results get written into subdirectories of
+                   the output directory and are served from the same port. All other options
+                   apply to each upload. Uploads may have up to 4 GB. The API is:
+                       POST /jobs?name=<file name>   upload a file as request body; answers the
+                                                     new job's status as json
+                       GET /jobs                     lists the status of all jobs as json
+                       GET /jobs/<id>                shows the status of one job as json
+                       GET /results/<id>/            the charts, tables and log of a done job
 '''
 
 
 # this log level is used, if the user didn't specify one:
 DEFAULT_LOG_LEVEL = logging.INFO
 
+# the web server listens to this port, if the user didn't specify one:
+DEFAULT_PORT = 8000
+
+# the web server and the ingestion service listen on this address, if the user didn't specify
+# one. It's only reachable from the local machine:
+DEFAULT_BIND_ADDRESS = '127.0.0.1'
+
 # name of log file:
 LOGFILE_NAME = 'picdat.log'
 
@@ -91,6 +197,12 @@ CSV_FILE_ENDING = '_chart_values.csv'
 # program names html file inside the result directory like this:
 HTML_FILENAME = 'charts'
 HTML_ENDING = '.html'
+# and the precompressed copy of the html file like this:
+GZIP_ENDING = '.gz'
+
+# program names the database with all exported per-iteration counters like this:
+COUNTER_EXPORT_FILENAME = 'counters'
+COUNTER_EXPORT_ENDING = '.sqlite'
 
 # this is the path to the text file the program uses as template to create the html head and
 # all js code in the body:
@@ -103,6 +215,10 @@ HTML_TEMPLATE_COMPACT = 'templates' + sep + 'html_template_compact.txt'
 DYGRAPHS_JS_SRC = 'templates' + sep + 'dygraph.js'
 DYGRAPHS_CSS_SRC = 'templates' + sep + 'dygraph.css'
 
+# the dygraph files are shared between all result directories by hardlinking them to this
+# content-addressed directory:
+ASSET_CACHE_DIR = path.join(path.expanduser('~'), '.cache', 'picdat', 'assets')
+
 # these are the expected names of relevant files in xml mode:
 ASUP_INFO_FILE = 'CM-STATS-HOURLY-INFO.XML'
 ASUP_DATA_FILE = 'CM-STATS-HOURLY-DATA.XML'
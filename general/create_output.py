@@ -5,8 +5,11 @@ differently. But after the input files are read, writing csv tables and visualis
 - in short: creating the output - works in the same way for each of the modes. Therefore, this
 module summarises the functionality of creating the output, so that each mode can call it.
 """
+import gzip
 import logging
 import os
+import shutil
+from general import chart_payload
 from general import constants
 from general import table_writer
 from general import visualizer
@@ -28,7 +31,8 @@ __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
 # see <http://www.gnu.org/licenses/>.
 
 
-def create_output(result_dir, csv_dir, html_title, output_label, tables, label_dict, compact):
+def create_output(result_dir, csv_dir, html_title, output_label, tables, label_dict, compact,
+                  digits=None, binary=False, write_tables=True, gzip_html=False):
     """
     Calls the table_collector and the visualizer module which create csv and html files.
     :param result_dir: path to an existing directory. Function stores its results in here.
@@ -39,26 +43,58 @@ def create_output(result_dir, csv_dir, html_title, output_label, tables, label_d
     :param output_label: Also a string describing the performance data, but in a shorter way and
     without white spaces. Will be embedded into file names for a better overview and/or distinction
     between different html files.
-    :param tables: Nested lists which contain all data, ready to be written into csv files.
+    :param tables: A list of tables, each one a nested list or a row generator, ready to be
+    written into csv files.
     :param label_dict: A dict containing meta data such as axis labels or names for the charts
     the tables)
     :param compact: Boolean, which says whether command line option 'compact' is set or not. If so,
     dygraphs code and csv content will be included into the charts html.
+    :param digits: The number of significant digits for non-integral values in the csv tables, or
+    None for full precision.
+    :param binary: Boolean, which says whether command line option 'binary' is set or not. If so,
+    chart data will be included into the charts html as binary payloads.
+    :param write_tables: Boolean, whether the csv tables should be written into csv_dir. If not,
+    their content is only included into the charts html, so compact or binary should be set.
+    :param gzip_html: Boolean, whether a gzip compressed copy of the charts html should be
+    written next to it.
     :return: None.
     """
 
     csv_abs_filepaths, csv_filelinks = csv_naming(label_dict['identifiers'], csv_dir, output_label)
 
-    # write data into csv tables
+    # write data into csv tables. If the html needs their content, it is kept in memory instead of
+    # reading the tables again. Binary payloads are built from the tables themselves:
     logging.info('Create csv tables...')
-    table_writer.create_csv(csv_abs_filepaths, tables)
+    csv_contents = table_writer.create_csv(csv_abs_filepaths, tables, digits,
+                                           compact and not binary, write_tables)
 
     # write html file
     html_filepath = os.path.join(
         result_dir, output_label + constants.HTML_FILENAME + constants.HTML_ENDING)
     logging.info('Create html file...')
-    visualizer.create_html(html_filepath, csv_strings(csv_abs_filepaths, csv_filelinks, compact),
-                           html_title, label_dict, compact)
+    if binary:
+        chart_data = chart_payload.chart_payloads(csv_abs_filepaths, tables, digits)
+    elif compact:
+        chart_data = csv_strings(csv_abs_filepaths, csv_contents)
+    else:
+        chart_data = csv_filelinks
+    visualizer.create_html(html_filepath, chart_data, html_title, label_dict, compact)
+
+    if gzip_html:
+        compress_file(html_filepath)
+
+
+def compress_file(filepath):
+    """
+    Writes a gzip compressed copy of a file next to it. Web servers can deliver such a copy
+    instead of compressing the file for each request.
+    :param filepath: The path to the file.
+    :return: None.
+    """
+    with open(filepath, 'rb') as source, \
+            gzip.open(filepath + constants.GZIP_ENDING, 'wb') as destination:
+        shutil.copyfileobj(source, destination)
+    logging.info('Wrote compressed copy of %s', filepath)
 
 
 def csv_naming(identifiers, csv_dir, output_label):
@@ -89,29 +125,21 @@ def csv_naming(identifiers, csv_dir, output_label):
     return csv_abs_filepaths, csv_filelinks
 
 
-def csv_strings(csv_abs_filepaths, csv_filelinks, compact):
+def csv_strings(csv_abs_filepaths, csv_contents):
     """
-    Creates a list of strings, one string for each chart. The strings are
-        * either the 'links' to csv files, to work as reference inside the html file (like
-          tables/processor_processor_busy, tables/aggregate_total_transfers...)
-        * or the plain contents of the corresponding csv files, if the compact command line option
-          is set
-    The strings are made for writing to the html file.
+    Creates a list of strings, one string for each chart, holding the plain contents of the
+    corresponding csv tables. They are made for being included into the html file, if the compact
+    or the binary command line option is set.
     :param csv_abs_filepaths: A list of paths to the csv files.
-    :param csv_filelinks: A list of the file 'links' to the same csv files. They are called links
-    to be distinguished from the absolute or relative paths. More specific, they actually are
-    paths, but seen relatively from the html location. Furthermore, their seperators are always /,
-    even under windows machines, because the links are used to reference inside the html.
-    :param compact: Boolean, which says whether command line option 'compact' is set or not. If
-    True, function will return the csv_filelinks, if False, function will return the csv contents.
+    :param csv_contents: A list of the csv contents, as the table_writer returned them. Tables,
+    which have been written while collecting the data, have None as content; they are read from
+    their files.
     :return: List of strings.
     """
-    if compact:
-        csv_content_list = []
-        for path in csv_abs_filepaths:
+    csv_content_list = []
+    for path, content in zip(csv_abs_filepaths, csv_contents):
+        if content is None:
             with open(path, 'r') as csv:
-                csv_content_list += [csv.read()]
-        return csv_content_list
-
-    return csv_filelinks
-
+                content = csv.read()
+        csv_content_list.append(content)
+    return csv_content_list
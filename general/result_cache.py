@@ -0,0 +1,249 @@
+"""
+Is responsible for the result cache. After PicDat visualised an input, it stores a copy of the
+results in a cache directory, keyed by a hash over the input's bytes, PicDat's own code and all
+options which influence the results. Later runs on the same input with the same options just copy
+the cached results into their output directory, instead of extracting, reading and visualising
+the input again. The cache has a size limit; if it's exceeded, the least recently used results
+are deleted.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+from general import constants
+from perfstat_mode import block_index
+
+__author__ = 'Marie Lohbeck'
+__copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
+
+# license notice:
+#
+# This file is part of PicDat.
+# PicDat is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public (at your option) any later version.
+#
+# PicDat is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with PicDat. If not,
+# see <http://www.gnu.org/licenses/>.
+
+# Version of the cache layout. Entries of other versions are never hit:
+CACHE_VERSION = 1
+
+# Directory holding one subdirectory per cached result:
+RESULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'picdat', 'results')
+
+# Maximum number of bytes, all cached results together may take:
+RESULT_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+
+# Names of the files inside a cache entry: the directory holding the results and a json file
+# with meta information. The modification time of the latter records the entry's last usage:
+ENTRY_RESULT_DIR = 'result'
+ENTRY_META_FILE = 'entry.json'
+
+# Number of bytes, which are read from a file at once while hashing it:
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# PicDat's source directories and files, which make up the code version:
+CODE_PATHS = ['picdat.py', 'picdat_util.py', 'general', 'perfstat_mode', 'asup_mode', 'templates']
+
+# hash over PicDat's code, so that it gets computed only once per process:
+CODE_VERSION = []
+
+
+def hash_file(hash_object, filepath):
+    """
+    Feeds a file's content into a hash.
+    :param hash_object: A hashlib hash object.
+    :param filepath: The path to the file.
+    :return: None
+    """
+    with open(filepath, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            hash_object.update(chunk)
+
+
+def hash_tree(hash_object, path, file_filter=None):
+    """
+    Feeds a file or all files inside a directory into a hash, together with their relative paths,
+    so that renamed or moved files change the hash as well.
+    :param hash_object: A hashlib hash object.
+    :param path: The path to a file or a directory.
+    :param file_filter: A function deciding by a file's name, whether it should be hashed, or
+    None to hash all files.
+    :return: None
+    """
+    if not os.path.isdir(path):
+        hash_file(hash_object, path)
+        return
+
+    for directory, subdirectories, files in os.walk(path):
+        subdirectories.sort()
+        for filename in sorted(files):
+            if file_filter is not None and not file_filter(filename):
+                continue
+            filepath = os.path.join(directory, filename)
+            hash_object.update(os.path.relpath(filepath, path).encode('utf-8', 'surrogateescape'))
+            hash_file(hash_object, filepath)
+
+
+def get_code_version():
+    """
+    Identifies the version of PicDat's code, including the templates, by hashing it. This way,
+    cached results get invalid as soon as anything about PicDat changes.
+    :return: The hash as hex String.
+    """
+    if not CODE_VERSION:
+        code_hash = hashlib.sha256()
+        picdat_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for code_path in CODE_PATHS:
+            hash_tree(code_hash, os.path.join(picdat_dir, code_path),
+                      lambda filename: not filename.endswith('.pyc'))
+        CODE_VERSION.append(code_hash.hexdigest())
+    return CODE_VERSION[0]
+
+
+def get_key(input_file, options, counter_config_file=None):
+    """
+    Builds the cache key of a PicDat run. Besides the input's content, the key covers the input's
+    path, because it ends up in the results, for example as html title or node name.
+    :param input_file: The path to the input, a file or a directory.
+    :param options: A tuple of all options, which influence the results, like
+    sort_columns_by_name and compact_file. Options which only influence how fast PicDat works
+    should be left out, so that runs with and without them share their results.
+    :param counter_config_file: The path to a counter config file, or None. It decides, which
+    charts are created, so its content goes into the key.
+    :return: The key as hex String.
+    """
+    key_hash = hashlib.sha256()
+    key_hash.update(repr((CACHE_VERSION, get_code_version(), input_file,
+                          os.path.abspath(input_file), options, time.timezone,
+                          time.tzname)).encode('utf-8', 'surrogateescape'))
+    if counter_config_file is not None:
+        hash_file(key_hash, counter_config_file)
+    # block indexes, which PicDat writes next to PerfStat files, don't belong to the input:
+    hash_tree(key_hash, input_file,
+              lambda filename: not filename.endswith(block_index.INDEX_SUFFIX))
+    return key_hash.hexdigest()
+
+
+def list_files(directory):
+    """
+    Takes a snapshot of the files inside a directory, so that it's possible to tell afterwards,
+    which files a PicDat run wrote.
+    :param directory: The directory's path.
+    :return: A dict mapping the relative paths of all files to their modification time and size.
+    """
+    files = {}
+    for subdirectory, _, filenames in os.walk(directory):
+        for filename in filenames:
+            filepath = os.path.join(subdirectory, filename)
+            status = os.stat(filepath)
+            files[os.path.relpath(filepath, directory)] = (status.st_mtime_ns, status.st_size)
+    return files
+
+
+def load(key, result_dir):
+    """
+    Looks up the results of a run in the cache and copies them into the output directory.
+    :param key: The run's cache key, as built by get_key.
+    :param result_dir: The directory, the results should be copied into.
+    :return: True, if there were cached results, False otherwise.
+    """
+    entry_dir = os.path.join(RESULT_CACHE_DIR, key)
+    cached_result_dir = os.path.join(entry_dir, ENTRY_RESULT_DIR)
+    if not os.path.isdir(cached_result_dir):
+        return False
+
+    try:
+        # mark the entry as recently used:
+        os.utime(os.path.join(entry_dir, ENTRY_META_FILE))
+        for relative_path in list_files(cached_result_dir):
+            destination = os.path.join(result_dir, relative_path)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.copy2(os.path.join(cached_result_dir, relative_path), destination)
+    except OSError:
+        # the entry might have been evicted by another PicDat run in the meantime
+        logging.debug('Could not copy cached results %s.', key, exc_info=True)
+        return False
+
+    logging.info('Found results of an earlier run on the same input with the same options in '
+                 'the cache. Copied them into %s', os.path.abspath(result_dir))
+    return True
+
+
+def store(key, result_dir, files_before):
+    """
+    Copies the results of a run into the cache. Only files, which the run wrote, are stored;
+    anything else inside the output directory is left out, as well as the log file. Afterwards,
+    least recently used entries are evicted, if the cache exceeds its size limit.
+    :param key: The run's cache key, as built by get_key.
+    :param result_dir: The directory, the run wrote its results into.
+    :param files_before: The snapshot of result_dir taken by list_files before the run.
+    :return: None
+    """
+    entry_dir = os.path.join(RESULT_CACHE_DIR, key)
+    if os.path.isdir(entry_dir):
+        return
+
+    # build the entry under a temporary name first, so that parallel runs never see a partial
+    # entry:
+    temp_dir = entry_dir + '.' + str(os.getpid()) + '.tmp'
+    try:
+        written_files = [relative_path for relative_path, file_state
+                         in list_files(result_dir).items()
+                         if files_before.get(relative_path) != file_state
+                         and os.path.basename(relative_path) != constants.LOGFILE_NAME]
+        size = 0
+        for relative_path in written_files:
+            destination = os.path.join(temp_dir, ENTRY_RESULT_DIR, relative_path)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.copy2(os.path.join(result_dir, relative_path), destination)
+            size += os.path.getsize(destination)
+
+        with open(os.path.join(temp_dir, ENTRY_META_FILE), 'w') as meta_file:
+            json.dump({'version': CACHE_VERSION, 'size': size, 'files': len(written_files)},
+                      meta_file)
+        os.rename(temp_dir, entry_dir)
+    except OSError as error:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        # a parallel run might have stored the same results in the meantime
+        if not os.path.isdir(entry_dir):
+            logging.warning('Could not store results in cache directory %s: %s',
+                            RESULT_CACHE_DIR, error)
+        return
+
+    logging.debug('Stored %s result files (%s bytes) in cache as %s', len(written_files), size,
+                  key)
+    evict()
+
+
+def evict():
+    """
+    Deletes the least recently used entries from the cache, until all entries together fit into
+    RESULT_CACHE_SIZE.
+    :return: None
+    """
+    entries = []
+    for key in os.listdir(RESULT_CACHE_DIR):
+        meta_file = os.path.join(RESULT_CACHE_DIR, key, ENTRY_META_FILE)
+        try:
+            with open(meta_file, 'r') as file:
+                size = json.load(file)['size']
+            entries.append((os.stat(meta_file).st_mtime, size, key))
+        except (OSError, ValueError, KeyError):
+            # temporary entries of parallel runs or broken entries
+            continue
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, key in sorted(entries):
+        if total_size <= RESULT_CACHE_SIZE:
+            break
+        logging.debug('Evict cached results %s', key)
+        shutil.rmtree(os.path.join(RESULT_CACHE_DIR, key), ignore_errors=True)
+        total_size -= size
@@ -0,0 +1,428 @@
+"""
+Contains the ingestion service, PicDat starts with the command line option 'service'. Instead of
+visualising one input per program run, the service accepts uploads of PerfStat or ASUP files over
+a local HTTP API, queues them and visualises them in a bounded pool of worker processes. As the
+workers live as long as the service, they pay interpreter startup, imports and template loading
+only once. The results are written into one subdirectory of the output directory per upload and
+are served by the same server, which works like the web server of option 'webserver' otherwise.
+"""
+import concurrent.futures
+import concurrent.futures.process
+import functools
+import http.server
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+from http import HTTPStatus
+
+import picdat_util
+from general import constants
+from general import web_server
+
+__author__ = 'Marie Lohbeck'
+__copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
+
+# license notice:
+#
+# This file is part of PicDat.
+# PicDat is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public (at your option) any later version.
+#
+# PicDat is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with PicDat. If not,
+# see <http://www.gnu.org/licenses/>.
+
+# states of a job:
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# name of the subdirectory of the output directory, which holds the results of all jobs:
+RESULTS_DIR = 'results'
+
+# data types, the service accepts as upload:
+UPLOAD_DATA_TYPES = ['data', 'out', 'zip', 'tgz', 'h5', 'json']
+
+# the maximum number of jobs waiting for a worker process. Further uploads are rejected, until the
+# workers caught up:
+MAX_QUEUED_JOBS = 100
+
+# number of bytes, which are read from an upload at once:
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# the maximum size of an upload in bytes. Larger uploads are rejected before reading them:
+MAX_UPLOAD_BYTES = 4 * 1024 * 1024 * 1024
+
+# format of the log files written for each job:
+LOG_FORMAT = '%(asctime)s %(levelname)s: %(message)s'
+
+
+class Job:
+    """
+    This class holds everything the service knows about one upload and its processing.
+    """
+
+    def __init__(self, job_id, name, upload_dir, result_dir):
+        """
+        Constructor for Job.
+        :param job_id: A String, identifying the job.
+        :param name: The file name of the upload.
+        :param upload_dir: The temporary directory, the upload is stored in until it's processed.
+        :param result_dir: The directory, PicDat writes the job's results into.
+        """
+        self.job_id = job_id
+        self.name = name
+        self.upload_dir = upload_dir
+        self.result_dir = result_dir
+
+        self.status = QUEUED
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+
+        # the concurrent.futures.Future of the job's processing:
+        self.future = None
+
+    def to_dict(self):
+        """
+        Summarizes the job's status for the API.
+        :return: A dict, ready to be serialized as json.
+        """
+        status = self.status
+        if status == QUEUED and self.future is not None and self.future.running():
+            status = RUNNING
+
+        job_dict = {'id': self.job_id, 'name': self.name, 'status': status,
+                    'submitted': format_time(self.submitted),
+                    'finished': format_time(self.finished),
+                    'results': '/%s/%s/' % (RESULTS_DIR, self.job_id)}
+        if self.error is not None:
+            job_dict['error'] = self.error
+        return job_dict
+
+
+class IngestionService:
+    """
+    This class queues the uploaded inputs and hands them to a pool of worker processes, which run
+    PicDat on them. It keeps track of all jobs since the service started.
+    """
+
+    def __init__(self, output_dir, jobs, run_function, options):
+        """
+        Constructor for IngestionService.
+        :param output_dir: The directory, the results of all jobs are written into.
+        :param jobs: The number of worker processes.
+        :param run_function: The function visualising one input. It gets called with the path to
+        the input, the result directory and options.
+        :param options: A tuple of further arguments for run_function, applying to all jobs.
+        """
+        self.results_dir = os.path.join(output_dir, RESULTS_DIR)
+        self.workers = jobs
+        self.run_function = run_function
+        self.options = options
+        self.log_level = logging.getLogger().getEffectiveLevel()
+
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+
+        # all jobs by their ids, in the order they were submitted:
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def is_full(self):
+        """
+        Checks, whether the queue has room for another job.
+        :return: True, if there are already MAX_QUEUED_JOBS waiting for a worker process.
+        """
+        with self.lock:
+            unfinished = sum(1 for job in self.jobs.values() if job.status == QUEUED)
+        return unfinished >= MAX_QUEUED_JOBS + self.workers
+
+    def submit(self, name, upload, length):
+        """
+        Stores an upload and queues it for processing.
+        :param name: The upload's file name. Its data type decides, how PicDat reads it.
+        :param upload: A file object to read the upload from.
+        :param length: The upload's size in bytes.
+        :return: The new Job object.
+        :raises EOFError: If upload ends before length bytes were read.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        upload_dir = tempfile.mkdtemp(prefix='picdat_upload_')
+        upload_file = os.path.join(upload_dir, name)
+
+        try:
+            with open(upload_file, 'wb') as file:
+                remaining = length
+                while remaining > 0:
+                    chunk = upload.read(min(remaining, UPLOAD_CHUNK_SIZE))
+                    if not chunk:
+                        raise EOFError
+                    file.write(chunk)
+                    remaining -= len(chunk)
+        except BaseException:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            raise
+
+        result_dir = os.path.join(self.results_dir, job_id)
+        os.makedirs(result_dir)
+
+        job = Job(job_id, name, upload_dir, result_dir)
+        with self.lock:
+            self.jobs[job_id] = job
+            executor = self.executor
+            try:
+                job.future = executor.submit(
+                    picdat_util.run_with_buffered_logging, self.log_level, self.run_function,
+                    upload_file, result_dir, *self.options)
+            except concurrent.futures.process.BrokenProcessPool:
+                job.status = FAILED
+                job.error = 'A worker process died, so the service restarted its worker ' \
+                            'processes. Please upload the file again.'
+                job.finished = time.time()
+
+        if job.future is None:
+            logging.warning('Could not queue job %s for %s: %s', job_id, name, job.error)
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            shutil.rmtree(result_dir, ignore_errors=True)
+            self.replace_executor(executor)
+            return job
+
+        job.future.add_done_callback(functools.partial(self.finish_job, job, executor))
+
+        logging.info('Queued job %s for %s (%s bytes)', job_id, name, length)
+        return job
+
+    def replace_executor(self, executor):
+        """
+        Replaces a broken pool of worker processes by a new one. A pool breaks, if one of its
+        worker processes dies, for example because it ran out of memory; afterwards, it doesn't
+        take any jobs anymore.
+        :param executor: The broken concurrent.futures.ProcessPoolExecutor. If it has been
+        replaced already, nothing happens.
+        :return: None
+        """
+        with self.lock:
+            if self.executor is not executor:
+                return
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+
+        logging.warning('A worker process died. Started new worker processes.')
+        executor.shutdown(wait=False)
+
+    def finish_job(self, job, executor, future):
+        """
+        Records the outcome of a job, when its worker process finished it. The log records of the
+        job are written into a log file inside its result directory. The upload gets deleted.
+        :param job: The Job object.
+        :param executor: The concurrent.futures.ProcessPoolExecutor, the job was submitted to. It
+        gets replaced, if it broke while processing the job.
+        :param future: The job's concurrent.futures.Future.
+        :return: None
+        """
+        try:
+            result, records, exception = future.result()
+        except (Exception, concurrent.futures.CancelledError) as error:
+            result, records, exception = None, [], error
+
+        if isinstance(exception, concurrent.futures.process.BrokenProcessPool):
+            self.replace_executor(executor)
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        try:
+            with open(os.path.join(job.result_dir, constants.LOGFILE_NAME), 'w') as log_file:
+                for record in records:
+                    log_file.write(formatter.format(record) + '\n')
+        except OSError:
+            logging.warning('Could not write log file of job %s', job.job_id)
+
+        shutil.rmtree(job.upload_dir, ignore_errors=True)
+
+        with self.lock:
+            job.finished = time.time()
+            if isinstance(exception, SystemExit):
+                job.status = FAILED
+                job.error = 'PicDat quit while processing the upload. See its log file.'
+            elif exception is not None:
+                job.status = FAILED
+                job.error = '%s: %s' % (type(exception).__name__, exception)
+            elif not result:
+                job.status = FAILED
+                job.error = 'The upload doesn\'t contain any files PicDat can handle.'
+            else:
+                job.status = DONE
+
+        logging.info('Job %s for %s %s', job.job_id, job.name, job.status)
+
+    def get_job(self, job_id):
+        """
+        Looks up the status of a job.
+        :param job_id: The job's id.
+        :return: The job's status as dict, or None, if there is no such job.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else job.to_dict()
+
+    def get_jobs(self):
+        """
+        Collects the status of all jobs.
+        :return: A list of the jobs' status dicts, in the order they were submitted.
+        """
+        with self.lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def shutdown(self):
+        """
+        Stops the worker processes. Jobs, which are still waiting for a worker, are cancelled.
+        :return: None
+        """
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ServiceRequestHandler(web_server.RequestHandler):
+    """
+    This class handles the requests to the ingestion service. Requests to /jobs belong to the
+    API, all others are served from the output directory as by the web server.
+    """
+
+    def __init__(self, *args, service=None, **kwargs):
+        # the handler processes its request during construction, so the service must be set
+        # before:
+        self.service = service
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        """
+        Answers the status of all jobs or of a single job, or serves a file.
+        :return: None
+        """
+        path = urllib.parse.urlsplit(self.path).path.rstrip('/')
+        if path == '/jobs':
+            self.send_json(HTTPStatus.OK, self.service.get_jobs())
+        elif path.startswith('/jobs/'):
+            job = self.service.get_job(path[len('/jobs/'):])
+            if job is None:
+                self.send_json(HTTPStatus.NOT_FOUND, {'error': 'No such job.'})
+            else:
+                self.send_json(HTTPStatus.OK, job)
+        else:
+            super().do_GET()
+
+    def do_POST(self):
+        """
+        Takes an upload and queues it as new job. The file name is given by the query parameter
+        'name', the file itself is the request body.
+        :return: None
+        """
+        url = urllib.parse.urlsplit(self.path)
+        if url.path.rstrip('/') != '/jobs':
+            self.close_connection = True
+            self.send_json(HTTPStatus.NOT_FOUND, {'error': 'Uploads go to /jobs.'})
+            return
+
+        name = os.path.basename(urllib.parse.parse_qs(url.query).get('name', [''])[0])
+        if picdat_util.data_type(name) not in UPLOAD_DATA_TYPES:
+            self.close_connection = True
+            self.send_json(HTTPStatus.BAD_REQUEST, {
+                'error': 'Query parameter name must be a file name ending with one of: '
+                         + ', '.join(UPLOAD_DATA_TYPES)})
+            return
+
+        try:
+            length = int(self.headers['Content-Length'])
+            if length < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            self.close_connection = True
+            self.send_json(HTTPStatus.LENGTH_REQUIRED, {'error': 'Content-Length is missing.'})
+            return
+
+        if length > MAX_UPLOAD_BYTES:
+            self.close_connection = True
+            self.send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {
+                'error': 'Uploads may have up to %s bytes.' % MAX_UPLOAD_BYTES})
+            return
+
+        if self.service.is_full():
+            self.close_connection = True
+            self.send_json(HTTPStatus.SERVICE_UNAVAILABLE,
+                           {'error': 'Too many jobs are queued. Try again later.'})
+            return
+
+        try:
+            job = self.service.submit(name, self.rfile, length)
+        except EOFError:
+            self.close_connection = True
+            self.send_json(HTTPStatus.BAD_REQUEST, {'error': 'The upload is incomplete.'})
+            return
+
+        if job.status == FAILED:
+            self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, job.to_dict())
+        else:
+            self.send_json(HTTPStatus.ACCEPTED, job.to_dict())
+
+    def send_json(self, status, data):
+        """
+        Sends a complete response with a json body.
+        :param status: The HTTP status code.
+        :param data: Anything json serializable.
+        :return: None
+        """
+        body = json.dumps(data, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', web_server.CACHE_CONTROL)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def format_time(timestamp):
+    """
+    Formats a point in time for the API.
+    :param timestamp: Seconds since the beginning of unix time, or None.
+    :return: The local time as String like '2000-01-01 00:00:00', or None.
+    """
+    if timestamp is None:
+        return None
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+def serve(output_dir, port, jobs, run_function, options,
+          bind_address=constants.DEFAULT_BIND_ADDRESS):
+    """
+    Starts the ingestion service and runs it until the user terminates the program.
+    :param output_dir: The directory, the results of all jobs are written into.
+    :param port: The port number, the service should listen to.
+    :param jobs: The number of worker processes.
+    :param run_function: The function visualising one input. It gets called with the path to the
+    input, the result directory and options.
+    :param options: A tuple of further arguments for run_function, applying to all jobs.
+    :param bind_address: The address, the service should listen on. Per default, it can only be
+    reached from the local machine. As the service has no authentication, anyone who can reach
+    it can upload files.
+    :return: None
+    """
+    service = IngestionService(output_dir, jobs, run_function, options)
+    handler = functools.partial(ServiceRequestHandler, directory=os.path.abspath(output_dir),
+                                service=service)
+    server = http.server.ThreadingHTTPServer((bind_address, port), handler)
+    logging.info('Ingestion service is listening on \'http://localhost:%s\' with %s worker '
+                 'processes. Upload files for example with: curl --data-binary @perfstat.zip '
+                 '\'http://localhost:%s/jobs?name=perfstat.zip\'', port, jobs, port)
+    logging.info('Hit ctrl+C to terminate the service (might be necessary several times)')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.shutdown()
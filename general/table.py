@@ -1,8 +1,11 @@
 """
-Contains the class Table.
+Contains the classes Table, NumericTable and TableRows.
 """
+import array
+import calendar
+import datetime
 import logging
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 
 __author__ = 'Marie Lohbeck'
 __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
@@ -20,6 +23,13 @@ __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
 # You should have received a copy of the GNU General Public License along with PicDat. If not,
 # see <http://www.gnu.org/licenses/>.
 
+# marks gaps in NumericTables:
+NAN = float('nan')
+
+# Statistics about the values in a NumericTable column. Gaps are not taken into account. If the
+# column has no values at all, count is 0, and min, max and mean are NaN:
+ColumnStats = namedtuple('ColumnStats', ['sum', 'count', 'min', 'max', 'mean'])
+
 
 class Table:
     """
@@ -64,6 +74,28 @@ class Table:
         """
         return self.outer_dict[row][column]
 
+    def items(self):
+        """
+        Iterates over all values in the table.
+        :return: A generator of triples of row name, column name and value.
+        """
+        for row, inner_dict in self.outer_dict.items():
+            for column, value in inner_dict.items():
+                yield row, column, value
+
+    def merge(self, other):
+        """
+        Inserts all values of another table into this one. If a table spot is filled in both
+        tables, the value of the other table wins.
+        :param other: Table, which values should be taken over.
+        :return: None.
+        """
+        for row, other_inner_dict in other.outer_dict.items():
+            if row in self.outer_dict:
+                self.outer_dict[row].update(other_inner_dict)
+            else:
+                self.outer_dict[row] = dict(other_inner_dict)
+
     def expand_values(self, factor):
         """
         Multiplies all table values with the given factor.
@@ -93,6 +125,20 @@ class Table:
         for _, col_dict in self.outer_dict.items():
             col_dict[constant_name] = str(constant_value)
 
+    def rename_columns(self, name_dict, drop_others=False):
+        """
+        Renames table columns. If several columns get the same name, the value of the last one
+        wins in each row.
+        :param name_dict: A dict mapping old column names to new ones.
+        :param drop_others: Boolean, whether columns which are not in name_dict should be removed.
+        Otherwise, they keep their names.
+        :return: None.
+        """
+        for row, inner_dict in self.outer_dict.items():
+            self.outer_dict[row] = {name_dict.get(column, column): value
+                                    for column, value in inner_dict.items()
+                                    if not drop_others or column in name_dict}
+
     def sort_columns_by_relevance(self):
         """
         Generates a list of all column names the table has. They'll be sorted by the sum of their
@@ -165,27 +211,456 @@ class Table:
         return [header_row] + value_rows
 
 
+class TableRows:
+    """
+    The rows of a flattened table, ready to be written into a csv file. Iterating over it generates
+    the rows one at a time; it can be iterated several times. Besides, it gives access to the
+    table's values as float columns, so that binary chart payloads can be built from them
+    directly, instead of parsing the csv text.
+    """
+
+    def __init__(self, generate_rows, get_chart_values):
+        """
+        Constructor for TableRows.
+        :param generate_rows: A function without parameters, which returns a generator of the
+        rows, beginning with the header row.
+        :param get_chart_values: A function without parameters, which returns a tuple of the
+        header row, a boolean, whether the x values are times, the x values and a float array for
+        each column. The x values are seconds since the beginning of unix time, read as they are
+        written without converting them from any timezone, or bucket numbers. An x value of None
+        marks an empty line between iterations. The function raises a ValueError, if the x values
+        are no numbers.
+        """
+        self.generate_rows = generate_rows
+        self.get_chart_values = get_chart_values
+
+    def __iter__(self):
+        return self.generate_rows()
+
+
+class NumericTable:
+    """
+    This is a data structure to represent table content consisting of numbers. It has the same
+    interface as Table, but it is more compact: Row and column names are mapped to indices, and
+    each column holds its values in a float array, which is indexed by the row indices. Gaps are
+    NaN. Values are formatted as Strings not until the table gets written.
+    Additionally, the table keeps statistics about each column up to date while values are
+    inserted, so that sorting columns by relevance doesn't need to look at each value.
+    """
+
+    def __init__(self):
+        # dicts, mapping row names and column names to their indices:
+        self.row_ids = {}
+        self.column_ids = {}
+
+        # one float array for each column. A column array might be shorter than the number of
+        # rows; the missing values are gaps:
+        self.columns = []
+
+        # the sum, the number, the minimum and the maximum of the values in each column, indexed
+        # by the column indices:
+        self.column_sums = []
+        self.column_counts = []
+        self.column_mins = []
+        self.column_maxima = []
+
+        # indices of columns, whose minimum or maximum might be outdated, because a value got
+        # overwritten:
+        self.stale_columns = set()
+
+    def __repr__(self):
+        return str({row: {column: value for column, value in self.get_row(row_id).items()}
+                    for row, row_id in self.row_ids.items()})
+
+    def get_row_id(self, row):
+        """
+        Looks up the index of a row. A row which doesn't exist yet gets created.
+        :param row: Name of the table row.
+        :return: The row's index as int.
+        """
+        row_id = self.row_ids.get(row)
+        if row_id is None:
+            row_id = len(self.row_ids)
+            self.row_ids[row] = row_id
+        return row_id
+
+    def get_column_id(self, column):
+        """
+        Looks up the index of a column. A column which doesn't exist yet gets created.
+        :param column: Name of the table column.
+        :return: The column's index as int.
+        """
+        column_id = self.column_ids.get(column)
+        if column_id is None:
+            column_id = len(self.columns)
+            self.column_ids[column] = column_id
+            self.columns.append(array.array('d'))
+            self.column_sums.append(0.0)
+            self.column_counts.append(0)
+            self.column_mins.append(NAN)
+            self.column_maxima.append(NAN)
+        return column_id
+
+    def set_column(self, column, values):
+        """
+        Replaces all values of a column at once. A column which doesn't exist yet gets created.
+        :param column: Name of the table column.
+        :param values: A float array, holding the values in the order of the row indices.
+        :return: None.
+        """
+        column_id = self.get_column_id(column)
+        self.columns[column_id] = values
+        self.update_column_stats(column_id)
+
+    def update_column_stats(self, column_id):
+        """
+        Calculates the statistics of a column from scratch.
+        :param column_id: The index of the column.
+        :return: None.
+        """
+        values = [value for value in self.columns[column_id] if value == value]
+        self.column_sums[column_id] = float(sum(values))
+        self.column_counts[column_id] = len(values)
+        self.column_mins[column_id] = min(values) if values else NAN
+        self.column_maxima[column_id] = max(values) if values else NAN
+        self.stale_columns.discard(column_id)
+
+    def get_row(self, row_id):
+        """
+        Collects all values of a row.
+        :param row_id: The index of the table row.
+        :return: A dict mapping the names of all columns, which have a value in the row, to the
+        values.
+        """
+        row = {}
+        for column, column_id in self.column_ids.items():
+            values = self.columns[column_id]
+            if row_id < len(values) and values[row_id] == values[row_id]:
+                row[column] = values[row_id]
+        return row
+
+    def insert(self, row, column, item):
+        """
+        Inserts an value dependably into a specific place in the Table. If this table spot is
+        already filled, the value will be overwritten.
+        :param row: Name of the table row, the value belongs to.
+        :param column: Name of the table column, the value belongs to.
+        :param item: Value you want to insert. Might be a number or a String representing a
+        number.
+        :return: None.
+        """
+        try:
+            value = float(item)
+        except (TypeError, ValueError):
+            logging.warning('Found a value which is not convertible to float: %s - %s', column,
+                            item)
+            value = NAN
+
+        row_id = self.get_row_id(row)
+        column_id = self.get_column_id(column)
+        values = self.columns[column_id]
+
+        missing = row_id - len(values)
+        if missing == 0:
+            values.append(value)
+        elif missing > 0:
+            values.extend(array.array('d', [NAN]) * missing)
+            values.append(value)
+        else:
+            old_value = values[row_id]
+            values[row_id] = value
+            if old_value == old_value:
+                self.column_sums[column_id] -= old_value
+                self.column_counts[column_id] -= 1
+                if old_value == self.column_mins[column_id] \
+                        or old_value == self.column_maxima[column_id]:
+                    self.stale_columns.add(column_id)
+
+        if value == value:
+            self.column_sums[column_id] += value
+            self.column_counts[column_id] += 1
+            # comparisons with NaN are always False, so the first value is taken as well:
+            if not value >= self.column_mins[column_id]:
+                self.column_mins[column_id] = value
+            if not value <= self.column_maxima[column_id]:
+                self.column_maxima[column_id] = value
+
+    def get_item(self, row, column):
+        """
+        Returns an item from the table.
+        :param row: The table's row, the item should be from
+        :param column: The table's column, the item should be from
+        :return: The item which is stored for row and column as float
+        :raises IndexError, KeyError: If the table hasn't any item at selected row and column, one
+        of those errors will occur
+        """
+        value = self.columns[self.column_ids[column]][self.row_ids[row]]
+        if value != value:
+            raise KeyError(column)
+        return value
+
+    def items(self):
+        """
+        Iterates over all values in the table.
+        :return: A generator of triples of row name, column name and value.
+        """
+        for column, column_id in self.column_ids.items():
+            values = self.columns[column_id]
+            for row, row_id in self.row_ids.items():
+                if row_id < len(values) and values[row_id] == values[row_id]:
+                    yield row, column, values[row_id]
+
+    def merge(self, other):
+        """
+        Inserts all values of another table into this one. If a table spot is filled in both
+        tables, the value of the other table wins.
+        :param other: NumericTable, which values should be taken over.
+        :return: None.
+        """
+        for row in other.row_ids:
+            self.get_row_id(row)
+        for row, column, value in other.items():
+            self.insert(row, column, value)
+
+    def expand_values(self, factor):
+        """
+        Multiplies all table values with the given factor.
+        :param factor: Factor for expansion.
+        :return: None
+        """
+        self.columns = [array.array('d', [value * factor for value in values])
+                        for values in self.columns]
+        self.column_sums = [column_sum * factor for column_sum in self.column_sums]
+        column_mins = [column_min * factor for column_min in self.column_mins]
+        column_maxima = [column_max * factor for column_max in self.column_maxima]
+        if factor < 0:
+            column_mins, column_maxima = column_maxima, column_mins
+        self.column_mins = column_mins
+        self.column_maxima = column_maxima
+
+    def copy(self):
+        """
+        Copies the table, so that the copy can be changed without affecting the original. As the
+        values are held in float arrays, this is considerably cheaper than filling a new table.
+        :return: A new NumericTable with the same content.
+        """
+        table_copy = NumericTable()
+        table_copy.row_ids = dict(self.row_ids)
+        table_copy.column_ids = dict(self.column_ids)
+        table_copy.columns = [array.array('d', values) for values in self.columns]
+        table_copy.column_sums = list(self.column_sums)
+        table_copy.column_counts = list(self.column_counts)
+        table_copy.column_mins = list(self.column_mins)
+        table_copy.column_maxima = list(self.column_maxima)
+        table_copy.stale_columns = set(self.stale_columns)
+        return table_copy
+
+    def is_empty(self):
+        """
+        Checks whether the table is empty.
+        :return: Boolean, whether table is empty or not.
+        """
+        return len(self.row_ids) == 0
+
+    def add_constant_column(self, constant_name, constant_value):
+        """
+        This method adds a column to the table, which has the same value for all table rows. This
+        intends to offer the possibility of showing reference lines in later charts.
+        :param constant_name: Some string, which will be used as the new column's name.
+        :param constant_value: Value, which will be inserted to each row for new column.
+        :return: None.
+        """
+        self.set_column(constant_name,
+                        array.array('d', [float(constant_value)]) * len(self.row_ids))
+
+    def rename_columns(self, name_dict, drop_others=False):
+        """
+        Renames table columns. If several columns get the same name, they are joined; the value
+        of the last one wins in each row.
+        :param name_dict: A dict mapping old column names to new ones.
+        :param drop_others: Boolean, whether columns which are not in name_dict should be removed.
+        Otherwise, they keep their names.
+        :return: None.
+        """
+        old_columns = [(name_dict.get(column, column), self.columns[column_id])
+                       for column, column_id in self.column_ids.items()
+                       if not drop_others or column in name_dict]
+        self.column_ids = {}
+        self.columns = []
+        self.column_sums = []
+        self.column_counts = []
+        self.column_mins = []
+        self.column_maxima = []
+        self.stale_columns = set()
+
+        for column, old_values in old_columns:
+            if column not in self.column_ids:
+                self.set_column(column, old_values)
+                continue
+
+            column_id = self.column_ids[column]
+            values = self.columns[column_id]
+            if len(values) < len(old_values):
+                values.extend(array.array('d', [NAN]) * (len(old_values) - len(values)))
+            for row_id, value in enumerate(old_values):
+                if value == value:
+                    values[row_id] = value
+            self.update_column_stats(column_id)
+
+    def get_column_stats(self, column):
+        """
+        Provides statistics about the values of a column. This takes no time, as they are kept up
+        to date while inserting values.
+        :param column: Name of the table column.
+        :return: A ColumnStats tuple.
+        :raises KeyError: If the table has no such column.
+        """
+        column_id = self.column_ids[column]
+        if column_id in self.stale_columns:
+            self.update_column_stats(column_id)
+
+        column_count = self.column_counts[column_id]
+        return ColumnStats(self.column_sums[column_id], column_count,
+                           self.column_mins[column_id], self.column_maxima[column_id],
+                           self.column_sums[column_id] / column_count if column_count else NAN)
+
+    def get_stats(self):
+        """
+        Provides statistics about the values of all columns.
+        :return: A dict mapping all column names to ColumnStats tuples.
+        """
+        return {column: self.get_column_stats(column) for column in self.column_ids}
+
+    def get_top_columns(self, number):
+        """
+        Selects the most relevant columns, means those with the highest values in sum.
+        :param number: The number of columns to select.
+        :return: A list of column names, sorted by relevance.
+        """
+        return self.sort_columns_by_relevance()[:number]
+
+    def sort_columns_by_relevance(self):
+        """
+        Generates a list of all column names the table has. They'll be sorted by the sum of their
+        values across all rows.
+        :return: A list of all column names.
+        """
+        value_dict = {column: self.column_sums[column_id]
+                      for column, column_id in self.column_ids.items()}
+        logging.debug('value dict: %s', value_dict)
+        return sorted(value_dict, key=value_dict.get, reverse=True)
+
+    def flatten(self, x_label, sort_columns_by_name):
+        """
+        Simplifies the data structure into a nestet list.
+        :param x_label: A String which should be in the upper left corner of the table. It's the
+        label for the first table column naming the rows.
+        :param sort_columns_by_name: If True, the columns of the flattened table will be sorted
+        alphanumerically, otherwise method sorts them by relevance.
+        :return: A nested list: Each inner list holds the values of one row in the table,
+        the outer list holds all rows
+        """
+        return list(self.iterate_rows(x_label, sort_columns_by_name))
+
+    def iterate_rows(self, x_label, sort_columns_by_name):
+        """
+        Simplifies the data structure row by row, like flatten does. But as the rows are generated
+        not until they are requested, only one row at a time exists as a list, for example while
+        it gets written into a csv file.
+        :param x_label: A String which should be in the upper left corner of the table. It's the
+        label for the first table column naming the rows.
+        :param sort_columns_by_name: If True, the columns of the flattened table will be sorted
+        alphanumerically, otherwise method sorts them by relevance.
+        :return: A TableRows object, generating lists: First the header row, then the values of
+        each table row. The values are floats; gaps are ' '. They get formatted by the
+        table_writer.
+        """
+        if sort_columns_by_name:
+            header_row = sorted(self.column_ids)
+        else:
+            header_row = self.sort_columns_by_relevance()
+        rows = sorted(self.row_ids)
+
+        return TableRows(lambda: self.generate_rows(x_label, header_row, rows),
+                         lambda: self.get_chart_values(x_label, header_row, rows))
+
+    def generate_rows(self, x_label, header_row, rows):
+        """
+        Generates the rows of the flattened table, as described in iterate_rows.
+        :param x_label: The label for the first table column.
+        :param header_row: The names of the columns in the order they should be written.
+        :param rows: The names of the rows in the order they should be written.
+        :return: A generator of lists: First the header row, then the values of each table row.
+        """
+        header_columns = [self.columns[self.column_ids[column]] for column in header_row]
+
+        yield [x_label] + header_row
+
+        for row in rows:
+            row_id = self.row_ids[row]
+            value_row = [str(row)]
+            for column, values in zip(header_row, header_columns):
+                if row_id < len(values) and values[row_id] == values[row_id]:
+                    value_row.append(values[row_id])
+                else:
+                    value_row.append(' ')
+                    logging.debug('Gap in table: Value is missing in row %s, column %s',
+                                  str(row), column)
+            yield value_row
+
+    def get_chart_values(self, x_label, header_row, rows):
+        """
+        Provides the table's values for building a binary chart payload, as described in
+        TableRows.
+        :param x_label: The label for the first table column.
+        :param header_row: The names of the columns in the order they should be charted.
+        :param rows: The names of the rows in the order they should be charted. They are either
+        datetime objects or bucket numbers.
+        :return: A tuple of the header row, a boolean, whether the x values are times, the x values
+        and a float array for each column.
+        :raises ValueError: If the rows are neither datetime objects nor numbers.
+        """
+        is_time = bool(rows) and isinstance(rows[0], datetime.datetime)
+        if is_time:
+            x_values = [calendar.timegm(row.timetuple()) for row in rows]
+        else:
+            x_values = [int(row) for row in rows]
+
+        row_ids = [self.row_ids[row] for row in rows]
+        columns = []
+        for column in header_row:
+            values = self.columns[self.column_ids[column]]
+            if len(values) < len(self.row_ids):
+                values = values + array.array('d', [NAN]) * (len(self.row_ids) - len(values))
+            columns.append(array.array('d', [values[row_id] for row_id in row_ids]))
+
+        return [x_label] + header_row, is_time, x_values, columns
+
+
 def do_table_operation(value_operator, table1, table2):
     """
-    Performs a mathematical operation (for two operands) element-wise on whole tables.
+    Performs a mathematical operation (for two operands) element-wise on whole tables. This walks
+    through the tables cell by cell; for NumericTables, the functions in general.table_algebra are
+    much faster.
     :param value_operator: callable operator for two operands from python module 'operator'; for
     example operator.add, operator.truediv etc. You can call operator.__all__ to see all possible
     operators.
-    :param table1: Table, which values are the first operand of mathematical operation.
-    :param table2: Table, which values are the second operand of mathematical operation.
-    :return: new Table object which is the result of the element-wise table operation.
+    :param table1: Table or NumericTable, which values are the first operand of mathematical
+    operation.
+    :param table2: Table or NumericTable, which values are the second operand of mathematical
+    operation.
+    :return: new object of table1's class which is the result of the element-wise table operation.
     """
-    result = Table()
-
-    for row_name, t1_col_dict in table1.outer_dict.items():
-        for col_name, t1_value in t1_col_dict.items():
-            try:
-                t2_value = table2.get_item(row_name, col_name)
-                result_value = value_operator(float(t1_value), float(t2_value))
-                result.insert(row_name, col_name, str(result_value))
-            except ZeroDivisionError:
-                result.insert(row_name, col_name, str(0))
-            except (KeyError, IndexError):
-                logging.debug('do_table_operation: Found value in table1 which is not in table2')
+    result = type(table1)()
+
+    for row_name, col_name, t1_value in table1.items():
+        try:
+            t2_value = table2.get_item(row_name, col_name)
+            result_value = value_operator(float(t1_value), float(t2_value))
+            result.insert(row_name, col_name, str(result_value))
+        except ZeroDivisionError:
+            result.insert(row_name, col_name, str(0))
+        except (KeyError, IndexError):
+            logging.debug('do_table_operation: Found value in table1 which is not in table2')
 
     return result
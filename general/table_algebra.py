@@ -0,0 +1,376 @@
+"""
+Provides arithmetic on whole NumericTables, for calculating derived charts from collected ones.
+All operations work column by column on the tables' float arrays. Binary operations align their
+operands first: The result has the rows and columns both operands have in common, and each value
+is calculated from the two values with the same row and column name.
+Derived charts can be declared as expressions, like
+ratio(aggregate.user_writes, aggregate.cp_reads)
+The names in such an expression refer to tables by their keys; a tuple key like
+('aggregate', 'user_writes') is written with a dot. Expressions may use numbers, the operators
++, -, * and / and the functions from EXPRESSION_FUNCTIONS.
+"""
+import array
+import ast
+import collections
+import logging
+import operator
+
+from general.table import NAN, NumericTable
+
+__author__ = 'Marie Lohbeck'
+__copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
+
+# license notice:
+#
+# This file is part of PicDat.
+# PicDat is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public (at your option) any later version.
+#
+# PicDat is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with PicDat. If not,
+# see <http://www.gnu.org/licenses/>.
+
+# A chart calculated from other charts: The chart's name (a tuple of two strings, like the keys of
+# collected charts), an expression describing how to calculate it, its unit, a list of the names of
+# all tables, which should not become charts themselves after the calculation, and a value for a
+# constant reference line in the chart (or None, for no reference line).
+DerivedChart = collections.namedtuple(
+    'DerivedChart', ['name', 'expression', 'unit', 'dropped_operands', 'reference'])
+
+
+def to_numeric(table):
+    """
+    Makes sure, a table is a NumericTable.
+    :param table: A NumericTable or a general.table.Table.
+    :return: The table itself, if it is a NumericTable, otherwise a NumericTable with the same
+    content.
+    """
+    if isinstance(table, NumericTable):
+        return table
+
+    numeric_table = NumericTable()
+    for row, inner_dict in table.outer_dict.items():
+        for column, value in inner_dict.items():
+            numeric_table.insert(row, column, value)
+    return numeric_table
+
+
+def get_aligned_column(table, column, row_ids):
+    """
+    Reads a column of a table in a given row order.
+    :param table: A NumericTable.
+    :param column: The name of the column.
+    :param row_ids: A list of the table's row indices, in the order the values are wanted.
+    :return: A float array with the values of the column in the requested order. Gaps are NaN.
+    """
+    values = table.columns[table.column_ids[column]]
+    if len(values) < len(table.row_ids):
+        values = values + array.array('d', [NAN]) * (len(table.row_ids) - len(values))
+    if row_ids == list(range(len(values))):
+        return values
+    return array.array('d', [values[row_id] for row_id in row_ids])
+
+
+def from_columns(rows, columns):
+    """
+    Builds a NumericTable from whole columns.
+    :param rows: A list of row names.
+    :param columns: A dict mapping column names to float arrays, which hold one value per row.
+    :return: The NumericTable.
+    """
+    table = NumericTable()
+    table.row_ids = {row: row_id for row_id, row in enumerate(rows)}
+    for column, values in columns.items():
+        table.set_column(column, values)
+    return table
+
+
+def combine(value_operator, operand1, operand2):
+    """
+    Performs a mathematical operation (for two operands) element-wise on whole tables. Each
+    operand might be a table or a number.
+    :param value_operator: callable operator for two floats, like operator.add. It is applied
+    to all pairs of aligned values at once. It must be able to handle NaN, which marks gaps.
+    :param operand1: NumericTable or number, which is the first operand.
+    :param operand2: NumericTable or number, which is the second operand.
+    :return: new NumericTable object which is the result of the element-wise operation.
+    """
+    if not isinstance(operand1, (NumericTable, int, float)):
+        operand1 = to_numeric(operand1)
+    if not isinstance(operand2, (NumericTable, int, float)):
+        operand2 = to_numeric(operand2)
+
+    if not isinstance(operand1, NumericTable):
+        if not isinstance(operand2, NumericTable):
+            raise TypeError('At least one operand must be a table.')
+        rows = list(operand2.row_ids)
+        row_ids = list(range(len(rows)))
+        return from_columns(rows, {column: array.array('d', map(
+            value_operator, [float(operand1)] * len(rows),
+            get_aligned_column(operand2, column, row_ids))) for column in operand2.column_ids})
+
+    if not isinstance(operand2, NumericTable):
+        rows = list(operand1.row_ids)
+        row_ids = list(range(len(rows)))
+        return from_columns(rows, {column: array.array('d', map(
+            value_operator, get_aligned_column(operand1, column, row_ids),
+            [float(operand2)] * len(rows))) for column in operand1.column_ids})
+
+    rows = [row for row in operand1.row_ids if row in operand2.row_ids]
+    row_ids1 = [operand1.row_ids[row] for row in rows]
+    row_ids2 = [operand2.row_ids[row] for row in rows]
+
+    columns = {}
+    for column in operand1.column_ids:
+        if column not in operand2.column_ids:
+            logging.debug('table operation: Found column %s in table1 which is not in table2',
+                          column)
+            continue
+        columns[column] = array.array('d', map(
+            value_operator, get_aligned_column(operand1, column, row_ids1),
+            get_aligned_column(operand2, column, row_ids2)))
+
+    return from_columns(rows, columns)
+
+
+def divide(value1, value2):
+    """
+    Divides two floats. Division by zero results in a gap.
+    :param value1: The dividend.
+    :param value2: The divisor.
+    :return: The quotient, or NaN if value2 is zero.
+    """
+    if value2 == 0:
+        return NAN
+    return value1 / value2
+
+
+def add(operand1, operand2):
+    """
+    Adds two tables (or a table and a number) element-wise.
+    :return: new NumericTable object.
+    """
+    return combine(operator.add, operand1, operand2)
+
+
+def sub(operand1, operand2):
+    """
+    Subtracts two tables (or a table and a number) element-wise.
+    :return: new NumericTable object.
+    """
+    return combine(operator.sub, operand1, operand2)
+
+
+def mul(operand1, operand2):
+    """
+    Multiplies two tables (or a table and a number) element-wise.
+    :return: new NumericTable object.
+    """
+    return combine(operator.mul, operand1, operand2)
+
+
+def div(operand1, operand2):
+    """
+    Divides two tables (or a table and a number) element-wise. Divisions by zero result in gaps.
+    :return: new NumericTable object.
+    """
+    return combine(divide, operand1, operand2)
+
+
+def ratio(operand1, operand2, zero_value=0):
+    """
+    Divides two tables (or a table and a number) element-wise. Divisions by zero result in
+    zero_value instead of gaps; this is how PicDat always calculated ratios for charts. A gap in
+    the dividend stays a gap, even if the divisor is zero.
+    :param operand1: NumericTable or number, which is the dividend.
+    :param operand2: NumericTable or number, which is the divisor.
+    :param zero_value: The result of divisions by zero.
+    :return: new NumericTable object.
+    """
+    zero_value = float(zero_value)
+    return combine(lambda value1, value2: value1 / value2 if value2 != 0
+                   else (zero_value if value1 == value1 else NAN), operand1, operand2)
+
+
+def get_row_distance(row1, row2):
+    """
+    Calculates the distance between two table rows.
+    :param row1: A row name, either a datetime object or a number.
+    :param row2: Another row name of the same type.
+    :return: The distance as float; in seconds, if the rows are datetime objects.
+    """
+    distance = row2 - row1
+    try:
+        return distance.total_seconds()
+    except AttributeError:
+        return float(distance)
+
+
+def rate(table):
+    """
+    Calculates, how fast the values of each column change: For each row, the difference to the
+    previous row's value gets divided by the distance between the two rows (in seconds for time
+    rows). The first row doesn't have a previous row, so it is left out.
+    :param table: A NumericTable with rows, which are datetime objects or numbers.
+    :return: new NumericTable object.
+    """
+    table = to_numeric(table)
+    rows = sorted(table.row_ids)
+    row_ids = [table.row_ids[row] for row in rows]
+    distances = [get_row_distance(row1, row2) for row1, row2 in zip(rows, rows[1:])]
+
+    columns = {}
+    for column in table.column_ids:
+        values = get_aligned_column(table, column, row_ids)
+        differences = map(operator.sub, values[1:], values[:-1])
+        columns[column] = array.array('d', map(divide, differences, distances))
+
+    return from_columns(rows[1:], columns)
+
+
+def rolling_mean(table, window):
+    """
+    Smooths the values of each column: Each value is replaced by the mean over it and the
+    previous window - 1 values. Gaps are left out; a mean over gaps only is a gap.
+    :param table: A NumericTable.
+    :param window: The number of values, each mean is taken over, as positive int.
+    :return: new NumericTable object.
+    """
+    table = to_numeric(table)
+    window = int(window)
+    if window < 1:
+        raise ValueError('The window of a rolling mean must be at least 1, but is %s.' % window)
+
+    rows = sorted(table.row_ids)
+    row_ids = [table.row_ids[row] for row in rows]
+
+    columns = {}
+    for column in table.column_ids:
+        values = get_aligned_column(table, column, row_ids)
+        means = array.array('d')
+        window_sum = 0.0
+        window_count = 0
+        for position, value in enumerate(values):
+            if value == value:
+                window_sum += value
+                window_count += 1
+            if position >= window:
+                old_value = values[position - window]
+                if old_value == old_value:
+                    window_sum -= old_value
+                    window_count -= 1
+            means.append(window_sum / window_count if window_count else NAN)
+        columns[column] = means
+
+    return from_columns(rows, columns)
+
+
+# Functions, which might be called in expressions:
+EXPRESSION_FUNCTIONS = {
+    'add': add,
+    'sub': sub,
+    'mul': mul,
+    'div': div,
+    'ratio': ratio,
+    'rate': rate,
+    'rolling_mean': rolling_mean
+}
+
+# Translates the operators in expressions into the functions doing the calculation:
+EXPRESSION_OPERATORS = {
+    ast.Add: add,
+    ast.Sub: sub,
+    ast.Mult: mul,
+    ast.Div: div
+}
+
+
+def evaluate_node(node, tables):
+    """
+    Calculates the value of a node from a parsed expression.
+    :param node: A node from the abstract syntax tree of an expression.
+    :param tables: A dict of the tables, the expression might refer to.
+    :return: A NumericTable or a number.
+    :raises ValueError: If the node is not allowed in expressions or refers to an unknown table.
+    """
+    if isinstance(node, ast.Expression):
+        return evaluate_node(node.body, tables)
+    if isinstance(node, ast.BinOp) and type(node.op) in EXPRESSION_OPERATORS:
+        return EXPRESSION_OPERATORS[type(node.op)](evaluate_node(node.left, tables),
+                                                   evaluate_node(node.right, tables))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return combine(operator.mul, evaluate_node(node.operand, tables), -1)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+            and node.func.id in EXPRESSION_FUNCTIONS and not node.keywords:
+        return EXPRESSION_FUNCTIONS[node.func.id](
+            *[evaluate_node(argument, tables) for argument in node.args])
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return node.value
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+        key = (node.value.id, node.attr)
+    elif isinstance(node, ast.Name):
+        key = node.id
+    else:
+        raise ValueError('Expressions must not contain \'%s\'.' % ast.dump(node))
+
+    if key not in tables:
+        raise ValueError('Expression refers to unknown table %s.' % str(key))
+    return to_numeric(tables[key])
+
+
+def evaluate(expression, tables):
+    """
+    Calculates a new table from an expression as described in the module's docstring.
+    :param expression: The expression as String.
+    :param tables: A dict of the tables, the expression might refer to.
+    :return: The resulting NumericTable.
+    :raises ValueError: If the expression is not valid.
+    """
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError:
+        raise ValueError('Expression \'%s\' is not valid.' % expression)
+
+    result = evaluate_node(tree, tables)
+    if not isinstance(result, NumericTable):
+        raise ValueError('Expression \'%s\' doesn\'t refer to any table.' % expression)
+    return result
+
+
+def calculate_derived_charts(derived_charts, tables, units):
+    """
+    Calculates derived charts and adds them to a container's tables.
+    :param derived_charts: A list of DerivedChart tuples.
+    :param tables: A dict of all tables, the container collected. The derived charts' tables get
+    added to it.
+    :param units: A dict relating units to the tables. The derived charts' units get added to it.
+    :return: None
+    """
+    for chart in derived_charts:
+        operand_units = {units.get(operand) for operand in chart.dropped_operands}
+        if len(operand_units) > 1:
+            logging.warning('The tables %s should have the same unit, but they don\'t. Hence, '
+                            'table %s is probably calculated wrong!', chart.dropped_operands,
+                            chart.name)
+
+        try:
+            tables[chart.name] = evaluate(chart.expression, tables)
+        except (ValueError, TypeError):
+            logging.exception('Could not calculate chart %s.', str(chart.name))
+            tables[chart.name] = NumericTable()
+            continue
+
+        units[chart.name] = chart.unit
+        logging.debug(tables[chart.name])
+
+        # delete contents of operand tables by replacing them through empty tables, so that
+        # tables will be ignored in the future
+        for operand in chart.dropped_operands:
+            tables[operand] = NumericTable()
+
+        # add a constant data series to the chart
+        if chart.reference is not None and not tables[chart.name].is_empty():
+            tables[chart.name].add_constant_column('reference', chart.reference)
@@ -1,7 +1,10 @@
 """
-Is responsible for writing given data into csv files.
+Is responsible for writing given data into csv files. Table rows are formatted in batches and
+written with few, large writes; several csv files are written concurrently by a small thread pool.
 """
+import concurrent.futures
 import logging
+import time
 
 __author__ = 'Marie Lohbeck'
 __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
@@ -20,32 +23,142 @@ __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
 # You should have received a copy of the GNU General Public License along with PicDat. If not,
 # see <http://www.gnu.org/licenses/>.
 
+# number of rows, which are formatted before they are written into a csv file at once:
+WRITE_BATCH_ROWS = 4096
 
-def create_csv(csv_filepaths, tables):
+# buffer size of each csv file in bytes:
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# number of threads writing csv files concurrently:
+WRITER_THREADS = 4
+
+# integral floats below this absolute value are exact, so they are written without decimal places:
+MAX_EXACT_INTEGER = 2 ** 53
+
+
+def format_value(value, digits=None):
     """
-    Creates CSV tables from data collected before.
-    :param csv_filepaths: the paths, the csv tables generated by this function should be saved.
-    :param tables: Nested lists which contain all table content.
-    :return: None
+    Formats a number for a csv table.
+    :param value: A float or int. NaN marks a gap in the table.
+    :param digits: The number of significant digits, non-integral values are rounded to. If None,
+    they are written with full precision.
+    :return: The value as String in its shortest form, which reads back as the same float, like
+    5.47 for a value given as 5.470 in the input. Integral values are written without decimal
+    places, as long as floats hold them exactly; larger ones are written like 1e+300. Gaps are
+    written as ' '.
     """
-    for table_index in range(len(tables)):
-        table = tables[table_index]
-        with open(csv_filepaths[table_index], 'w') as table_file:
+    if value != value:
+        return ' '
+    if digits is not None:
+        value = float('%.*g' % (digits, value))
+    if value % 1 == 0 and abs(value) < MAX_EXACT_INTEGER:
+        return str(int(value))
+    return repr(value)
 
-            for row in table:
-                logging.debug('row list: %s', row)
 
-                row_line = ''
+def format_row(row, digits=None):
+    """
+    Turns a table row into a csv line.
+    :param row: A list of Strings and numbers. Numbers get formatted by format_value.
+    :param digits: The number of significant digits for non-integral numbers, or None for full
+    precision.
+    :return: The csv line as String, including the line break.
+    """
+    return ', '.join([entry.replace(',', ' -') if entry.__class__ is str
+                      else format_value(entry, digits) for entry in row]) + '\n'
+
+
+def format_table(table, digits=None):
+    """
+    Turns a table into csv text, batch by batch. Each batch holds WRITE_BATCH_ROWS rows.
+    :param table: An iterable of rows, for example a nested list or a row generator.
+    :param digits: The number of significant digits for non-integral numbers, or None for full
+    precision.
+    :return: A generator of Strings, each one holding the csv lines of a batch of rows.
+    """
+    batch = []
+    for row in table:
+        batch.append(format_row(row, digits))
+        if len(batch) == WRITE_BATCH_ROWS:
+            yield ''.join(batch)
+            batch = []
+    yield ''.join(batch)
 
-                # write a value from each column into one line
-                for entry in row[:-1]:
-                    row_line += entry.replace(',',' -')
-                    row_line += ', '
-                row_line += row[-1].replace(',',' -')
 
-                logging.debug('row line: %s', row_line)
+def write_table(csv_filepath, table, digits=None, keep_content=False):
+    """
+    Writes one table into a csv file. The rows are formatted in batches and each batch is written
+    at once. The table is formatted only once, even if its content is needed for the html file as
+    well.
+    :param csv_filepath: The path, the csv table should be saved, or None, if the content is only
+    needed in memory.
+    :param table: An iterable of rows, for example a nested list or a row generator.
+    :param digits: The number of significant digits for non-integral numbers, or None for full
+    precision.
+    :param keep_content: Boolean, whether the csv content should be returned.
+    :return: A tuple of the content's size in bytes and the content as String, or None, if
+    keep_content is False.
+    """
+    batches = []
+    size = 0
+    table_file = None
+    if csv_filepath is not None:
+        table_file = open(csv_filepath, 'w', buffering=WRITE_BUFFER_SIZE)
+
+    try:
+        for batch in format_table(table, digits):
+            if table_file is not None:
+                table_file.write(batch)
+            if keep_content:
+                batches.append(batch)
+            size += len(batch)
+    finally:
+        if table_file is not None:
+            table_file.close()
+
+    if csv_filepath is not None:
+        logging.info('Wrote chart values into %s', csv_filepath)
+    return size, ''.join(batches) if keep_content else None
+
+
+def create_csv(csv_filepaths, tables, digits=None, keep_content=False, write_files=True):
+    """
+    Creates CSV tables from data collected before. The tables are written concurrently by
+    WRITER_THREADS threads.
+    :param csv_filepaths: the paths, the csv tables generated by this function should be saved.
+    :param tables: A list of tables. Each table is an iterable of rows, for example a nested list
+    or a row generator; generators get consumed one row at a time, so that a table never needs to
+    be held in memory as a whole. A table might be None, if it has already been written while
+    collecting the data.
+    :param digits: The number of significant digits for non-integral numbers, or None for full
+    precision.
+    :param keep_content: Boolean, whether the csv content of the tables should be returned, for
+    example to include it into the html file.
+    :param write_files: Boolean, whether the csv tables should be written into files at all.
+    :return: A list with the csv content of each table as String. Entries are None for tables,
+    which have been None, and for all tables, if keep_content is False.
+    """
+    contents = [None] * len(tables)
+    table_numbers = [table_number for table_number, table in enumerate(tables)
+                     if table is not None]
+    if not table_numbers:
+        return contents
+
+    start_time = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=WRITER_THREADS) as executor:
+        results = list(executor.map(
+            write_table,
+            [csv_filepaths[table_number] if write_files else None
+             for table_number in table_numbers],
+            [tables[table_number] for table_number in table_numbers],
+            [digits] * len(table_numbers), [keep_content] * len(table_numbers)))
+    duration = time.perf_counter() - start_time
 
-                # write out line
-                table_file.write(row_line + '\n')
+    for table_number, (_, content) in zip(table_numbers, results):
+        contents[table_number] = content
 
-        logging.info('Wrote chart values into %s', csv_filepaths[table_index])
+    megabytes = sum(size for size, _ in results) / 1000000
+    logging.info('%s %.1f MB of %s csv tables in %.2f seconds (%.1f MB/s)',
+                 'Wrote' if write_files else 'Formatted', megabytes, len(results), duration,
+                 megabytes / duration if duration else 0)
+    return contents
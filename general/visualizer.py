@@ -1,6 +1,7 @@
 """
 Is responsible to write a html file containing the required charts.
 """
+import json
 import logging
 
 from general import constants
@@ -21,6 +22,9 @@ __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
 # You should have received a copy of the GNU General Public License along with PicDat. If not,
 # see <http://www.gnu.org/licenses/>.
 
+# contents of the html templates by their paths. Each template is read only once per process:
+TEMPLATES = {}
+
 
 def create_chart_buttons(html_document, chart_id):
     """
@@ -61,7 +65,8 @@ def create_chart_buttons(html_document, chart_id):
 def write_template(html_document, compact):
     """
     Copies the content of the html template into the html document. Decides between two templates,
-    depending on the compact boolean.
+    depending on the compact boolean. The template is read only at the first call and cached for
+    all following html documents.
     :param html_document: File object, where to write the template to.
     :param compact: Boolean, which says whether command line option 'compact' is set or not. If so,
     uses the HTML_TEMPLATE_COMPACT, which already includes all the dygraphs code.
@@ -71,8 +76,10 @@ def write_template(html_document, compact):
         html_template = constants.HTML_TEMPLATE_COMPACT
     else:
         html_template = constants.HTML_TEMPLATE
-    with open(html_template, 'r') as template:
-        html_document.writelines(template.readlines())
+    if html_template not in TEMPLATES:
+        with open(html_template, 'r') as template:
+            TEMPLATES[html_template] = template.read()
+    html_document.write(TEMPLATES[html_template])
 
 
 def create_tab_button(html_document, tab_name, tab_charts):
@@ -81,13 +88,14 @@ def create_tab_button(html_document, tab_name, tab_charts):
     will be arranged in a tab bar.
     :param html_document: File object, where to write the button to.
     :param tab_name: button text, describing the kind of charts belonging to this tab.
-    :param tab_charts: chart id's of the charts belonging to this tab.
+    :param tab_charts: chart id's of the charts belonging to this tab. The charts get created
+    not until the tab is opened or they scroll into view.
     :return: None.
     """
-    tab_charts_str = str(tab_charts[0])
+    tab_charts_str = "'" + str(tab_charts[0]) + "'"
     for chart in tab_charts[1:]:
         tab_charts_str += ', '
-        tab_charts_str += str(chart)
+        tab_charts_str += "'" + str(chart) + "'"
 
     html_document.write('    <button class="tablinks" onclick="openTab(event, '
                         +"'" + tab_name + "', [" + tab_charts_str + '])">' + tab_name
@@ -98,8 +106,8 @@ def create_html(html_filepath, csv, html_title, label_dict, compact_file):
     """
     Writes an html file which visualizes the contents of csv tables in a nice way.
     :param html_filepath: The path the html file should be saved at.
-    :param csv: Either a list of strings referencing csv files, or a list of the raw csv data
-    itself.
+    :param csv: A list with an entry for each chart: Either a string referencing a csv file, the
+    raw csv data itself, or a binary payload dict from general.chart_payload.
     :param html_title: Some string describing the processed performance data, for example naming
     the cluster and the node. Will be written to the top of the html document.
     :param label_dict: A dict containing meta data such as axis labels or names for the charts
@@ -147,10 +155,15 @@ def create_html(html_filepath, csv, html_title, label_dict, compact_file):
         for tab in tabs:
             html_document.write('<div id="' + tab + '" class="tabcontent">\n')
             for chart_nr in tabs_dict[tab]:
-                # call js function to create Dygraph objects
-                html_document.write('<script> ' + chart_ids[chart_nr] + ' = makeChart("'
+                if isinstance(csv[chart_nr], dict):
+                    chart_data = json.dumps(csv[chart_nr])
+                else:
+                    chart_data = repr(csv[chart_nr])
+
+                # call js function to register Dygraph objects, which are created on demand
+                html_document.write('<script> registerChart("'
                                     +chart_ids[chart_nr] + '", "' + tab + '", '
-                                    +repr(csv[chart_nr]) + ', "'
+                                    +chart_data + ', "'
                                     +titles[chart_nr]
                                     +'", "' + x_labels[chart_nr] + '", "'
                                     +y_labels[chart_nr] + '", ' + barchart_booleans[chart_nr]
@@ -0,0 +1,318 @@
+"""
+Contains the local web server, PicDat starts with the command line option 'webserver'. It serves
+the result directory with several threads, so that the browser can load the charts html, the csv
+tables and the dygraphs files at the same time. Responses are gzip compressed (a precompressed
+.gz copy of a file is served, if there is one) and carry ETag and Last-Modified headers. Browsers
+revalidate each file before using their cached copy, which costs a 304 Not Modified response as
+long as the file didn't change. Further, the server answers HTTP Range requests.
+"""
+import email.utils
+import functools
+import gzip
+import http.server
+import io
+import logging
+import os
+import re
+import threading
+from http import HTTPStatus
+
+from general import constants
+
+__author__ = 'Marie Lohbeck'
+__copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
+
+# license notice:
+#
+# This file is part of PicDat.
+# PicDat is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public (at your option) any later version.
+#
+# PicDat is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with PicDat. If not,
+# see <http://www.gnu.org/licenses/>.
+
+# content types, which are worth to be compressed:
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+# files smaller than this number of bytes are sent uncompressed:
+MIN_COMPRESS_SIZE = 1024
+
+# cache header value for all files. The urls of the dygraphs files don't change, when a new PicDat
+# version brings new ones, so browsers need to revalidate them as well:
+CACHE_CONTROL = 'no-cache'
+
+# the maximum number of files, whose compressed content is kept in memory:
+MAX_COMPRESSED_FILES = 256
+
+# matches a Range header asking for a single range of bytes:
+RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)$')
+
+
+class RequestHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    This class handles the requests to PicDat's web server. It serves files like
+    SimpleHTTPRequestHandler does, but adds compression, caching headers and Range requests.
+    Directories are listed as by SimpleHTTPRequestHandler.
+    """
+
+    # keep connections open for following requests:
+    protocol_version = 'HTTP/1.1'
+
+    # compressed file contents, shared by all threads. They are stored by path, modification time
+    # and size of the files, so that changed files get compressed again:
+    compressed_files = {}
+    compressed_files_lock = threading.Lock()
+
+    def send_head(self):
+        """
+        Sends the status line and headers for a GET or HEAD request.
+        :return: A file object to copy the response body from, or None, if there is no body.
+        """
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path) or self.path.endswith('/'):
+            return super().send_head()
+
+        content_type = self.guess_type(path)
+        accepts_gzip = accepts_encoding(self.headers.get('Accept-Encoding'), 'gzip')
+        compressible = content_type.startswith(COMPRESSIBLE_TYPES)
+
+        # ranges refer to the uncompressed file, so they are always served uncompressed:
+        byte_range = self.headers.get('Range')
+        if byte_range is not None and self.range_is_current(path):
+            return self.send_range(path, content_type, byte_range)
+
+        precompressed_path = path + constants.GZIP_ENDING
+        if accepts_gzip and compressible and os.path.isfile(precompressed_path) \
+                and os.stat(precompressed_path).st_mtime >= os.stat(path).st_mtime:
+            return self.send_file(path, content_type, open(precompressed_path, 'rb'), 'gzip')
+
+        if accepts_gzip and compressible and os.stat(path).st_size >= MIN_COMPRESS_SIZE:
+            return self.send_file(path, content_type, io.BytesIO(self.compress(path)), 'gzip')
+
+        return self.send_file(path, content_type, open(path, 'rb'), None)
+
+    def send_file(self, path, content_type, body, encoding):
+        """
+        Sends status line and headers for a whole file. If the browser's cached copy is still up
+        to date, it sends 304 Not Modified instead.
+        :param path: The path to the requested file.
+        :param content_type: The file's content type.
+        :param body: A file object holding the response body.
+        :param encoding: The content encoding of body, 'gzip' or None.
+        :return: body, or None, if there is no body to send.
+        """
+        etag = get_etag(path, encoding)
+        if self.is_not_modified(path, etag):
+            body.close()
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_caching_headers(path, etag)
+            self.end_headers()
+            return None
+
+        body.seek(0, os.SEEK_END)
+        length = body.tell()
+        body.seek(0)
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(length))
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_caching_headers(path, etag)
+        self.end_headers()
+        return body
+
+    def send_range(self, path, content_type, byte_range):
+        """
+        Sends status line and headers for a part of a file, as requested by a Range header. Only
+        single ranges are supported; for other Range headers, the whole file is sent.
+        :param path: The path to the requested file.
+        :param content_type: The file's content type.
+        :param byte_range: The value of the Range header, like 'bytes=0-499'.
+        :return: A file object holding the requested bytes, or None, if the range is not
+        satisfiable.
+        """
+        size = os.stat(path).st_size
+        match = RANGE_PATTERN.match(byte_range.strip())
+        if match is None or match.groups() == ('', ''):
+            return self.send_file(path, content_type, open(path, 'rb'), None)
+
+        first, last = match.groups()
+        if first == '':
+            # a suffix range like 'bytes=-500' asks for the last bytes of the file:
+            first = max(size - int(last), 0)
+            last = size - 1
+        else:
+            first = int(first)
+            last = min(int(last), size - 1) if last else size - 1
+
+        if first >= size or first > last:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header('Content-Range', 'bytes */%s' % size)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+
+        with open(path, 'rb') as file:
+            file.seek(first)
+            body = io.BytesIO(file.read(last - first + 1))
+
+        self.send_response(HTTPStatus.PARTIAL_CONTENT)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Range', 'bytes %s-%s/%s' % (first, last, size))
+        self.send_header('Content-Length', str(last - first + 1))
+        self.send_caching_headers(path, get_etag(path, None))
+        self.end_headers()
+        return body
+
+    def range_is_current(self, path):
+        """
+        Checks an If-Range header, which makes a Range request conditional: The range should only
+        be sent, if the file didn't change since the browser got its first part.
+        :param path: The path to the requested file.
+        :return: True, if there is no If-Range header or if it matches the file.
+        """
+        if_range = self.headers.get('If-Range')
+        if if_range is None:
+            return True
+        return if_range.strip() in (get_etag(path, None), get_last_modified(path, self))
+
+    def is_not_modified(self, path, etag):
+        """
+        Checks the conditional request headers If-None-Match and If-Modified-Since.
+        :param path: The path to the requested file.
+        :param etag: The ETag of the response, which would be sent.
+        :return: True, if the browser's cached copy is still up to date.
+        """
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags or 'W/' + etag in tags
+
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            return int(os.stat(path).st_mtime) <= since
+        return False
+
+    def send_caching_headers(self, path, etag):
+        """
+        Sends the headers, which allow browsers to cache a file.
+        :param path: The path to the requested file.
+        :param etag: The ETag of the response.
+        :return: None
+        """
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', get_last_modified(path, self))
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Cache-Control', CACHE_CONTROL)
+
+    def compress(self, path):
+        """
+        Compresses a file with gzip. Compressed contents are kept in memory, so that each file is
+        compressed only once as long as it doesn't change.
+        :param path: The path to the file.
+        :return: The compressed content as bytes.
+        """
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self.compressed_files_lock:
+            compressed = self.compressed_files.get(key)
+        if compressed is not None:
+            return compressed
+
+        with open(path, 'rb') as file:
+            compressed = gzip.compress(file.read())
+
+        with self.compressed_files_lock:
+            if len(self.compressed_files) >= MAX_COMPRESSED_FILES:
+                self.compressed_files.clear()
+            self.compressed_files[key] = compressed
+        return compressed
+
+
+def accepts_encoding(accept_encoding, encoding):
+    """
+    Checks an Accept-Encoding header, whether the browser accepts a content encoding. Encodings
+    with a quality value of 0 are refused, like 'gzip;q=0'.
+    :param accept_encoding: The value of the Accept-Encoding header, or None, if there is none.
+    :param encoding: The content encoding, like 'gzip'.
+    :return: True, if the browser accepts the encoding.
+    """
+    if accept_encoding is None:
+        return False
+
+    accepted = None
+    for coding in accept_encoding.split(','):
+        name, _, parameters = coding.partition(';')
+        name = name.strip().lower()
+        if name not in (encoding, '*'):
+            continue
+
+        quality = 1.0
+        for parameter in parameters.split(';'):
+            key, _, value = parameter.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        # an explicit entry for the encoding overrides the wildcard:
+        if name == encoding or accepted is None:
+            accepted = quality > 0
+        if name == encoding:
+            break
+    return bool(accepted)
+
+
+def get_etag(path, encoding):
+    """
+    Builds an ETag for a file from its modification time and size.
+    :param path: The path to the file.
+    :param encoding: The content encoding of the response, 'gzip' or None. Different encodings
+    get different ETags.
+    :return: The ETag as String, including its quotes.
+    """
+    stat = os.stat(path)
+    etag = '%x-%x' % (stat.st_mtime_ns, stat.st_size)
+    if encoding is not None:
+        etag += '-' + encoding
+    return '"' + etag + '"'
+
+
+def get_last_modified(path, handler):
+    """
+    Formats the modification time of a file for a Last-Modified header.
+    :param path: The path to the file.
+    :param handler: A RequestHandler, which provides the date format.
+    :return: The modification time as String.
+    """
+    return handler.date_time_string(int(os.stat(path).st_mtime))
+
+
+def serve(directory, port, bind_address=constants.DEFAULT_BIND_ADDRESS):
+    """
+    Starts the web server and serves the files inside a directory until the user terminates
+    the program.
+    :param directory: The directory to serve.
+    :param port: The port number, the server should listen to.
+    :param bind_address: The address, the server should listen on. Per default, it can only be
+    reached from the local machine.
+    :return: None
+    """
+    handler = functools.partial(RequestHandler, directory=os.path.abspath(directory))
+    server = http.server.ThreadingHTTPServer((bind_address, port), handler)
+    logging.info('Open \'http://localhost:%s\' in your browser to view the charts.', port)
+    logging.info('Hit ctrl+C to terminate web server (might be necessary several times)')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
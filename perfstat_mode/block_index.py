@@ -0,0 +1,171 @@
+"""
+Is responsible for the block index of PerfStat files. Once PicDat has read a PerfStat file
+memory-mapped, it knows where the parts of the file are, it is interested in: the header line,
+iteration beginnings and endings, sysstat and statit blocks, LUN mappings and per-iteration
+counter lines. The block index saves the byte offsets of all these parts in a json file next to
+the PerfStat file (or in a cache directory, if this is not possible). Later runs on the same
+file jump directly to the indexed parts instead of searching the whole file again.
+"""
+import hashlib
+import json
+import logging
+import os
+
+__author__ = 'Marie Lohbeck'
+__copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
+
+# license notice:
+#
+# This file is part of PicDat.
+# PicDat is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public (at your option) any later version.
+#
+# PicDat is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with PicDat. If not,
+# see <http://www.gnu.org/licenses/>.
+
+# Version of the index file format. Index files of other versions get ignored:
+INDEX_VERSION = 1
+
+# File name suffix for index files next to their PerfStat files. It is deliberately not '.json',
+# because PicDat would take json files in an input directory for ASUP json files:
+INDEX_SUFFIX = '.picdat_index'
+
+# Directory for index files of PerfStat files, which are in read-only directories:
+INDEX_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'picdat', 'index')
+
+# Number of bytes from the beginning and the end of a PerfStat file, which go into its
+# fingerprint:
+FINGERPRINT_BYTES = 1024 * 1024
+
+
+def get_index_paths(perfstat_data_file):
+    """
+    Names the places, where the index of a PerfStat file might be.
+    :param perfstat_data_file: The path to a PerfStat output file.
+    :return: A list of two paths: The first one is next to the PerfStat file, the second one is
+    inside the cache directory.
+    """
+    absolute_path = os.path.abspath(perfstat_data_file)
+    cache_name = hashlib.sha1(absolute_path.encode('utf-8', 'surrogateescape')).hexdigest()
+    return [absolute_path + INDEX_SUFFIX, os.path.join(INDEX_CACHE_DIR, cache_name + '.json')]
+
+
+def get_file_key(perfstat_data_file):
+    """
+    Identifies the current state of a PerfStat file, so that an index can be checked for being
+    up to date. The key consists of the file's size, its modification time and a sha1 hash over
+    the file's beginning and end.
+    :param perfstat_data_file: The path to a PerfStat output file.
+    :return: A dict with the keys 'size', 'mtime' and 'fingerprint'.
+    """
+    status = os.stat(perfstat_data_file)
+    fingerprint = hashlib.sha1()
+    with open(perfstat_data_file, 'rb') as file:
+        fingerprint.update(file.read(FINGERPRINT_BYTES))
+        if status.st_size > FINGERPRINT_BYTES:
+            file.seek(max(FINGERPRINT_BYTES, status.st_size - FINGERPRINT_BYTES))
+            fingerprint.update(file.read())
+
+    return {'size': status.st_size, 'mtime': status.st_mtime_ns,
+            'fingerprint': fingerprint.hexdigest()}
+
+
+def load_index(perfstat_data_file, object_types):
+    """
+    Loads the index of a PerfStat file, if there is an up-to-date one.
+    :param perfstat_data_file: The path to a PerfStat output file.
+    :param object_types: A list of the PerfStat object types, PicDat is looking for. An index
+    built for other object types is not valid.
+    :return: A tuple of the iteration information as returned by byte_scanner.scan_iterations
+    and a list of spans, each of them a list of two offsets enclosing relevant lines. None, if
+    there is no valid index.
+    """
+    file_key = get_file_key(perfstat_data_file)
+
+    for index_path in get_index_paths(perfstat_data_file):
+        try:
+            with open(index_path, 'r') as index_file:
+                index = json.load(index_file)
+        except FileNotFoundError:
+            continue
+        except (OSError, ValueError):
+            logging.info('Could not read block index %s. Ignore it.', index_path)
+            continue
+
+        if index.get('version') != INDEX_VERSION or index.get('file') != file_key \
+                or index.get('object_types') != list(object_types):
+            logging.info('Block index %s is outdated. Ignore it.', index_path)
+            continue
+
+        logging.info('Use block index %s.', index_path)
+        iterations = (index['header_line'], index['header_end'],
+                      [tuple(marker) for marker in index['markers']])
+        return iterations, index['spans']
+
+    return None
+
+
+def save_index(perfstat_data_file, object_types, iterations, spans):
+    """
+    Writes the index of a PerfStat file. It tries to write it next to the PerfStat file first
+    and into the cache directory, if this fails.
+    :param perfstat_data_file: The path to a PerfStat output file.
+    :param object_types: A list of the PerfStat object types, PicDat was looking for.
+    :param iterations: The iteration information as returned by byte_scanner.scan_iterations.
+    :param spans: A list of spans, each of them a list of two offsets enclosing relevant lines.
+    :return: None
+    """
+    header_line, header_end, markers = iterations
+    index = {'version': INDEX_VERSION, 'file': get_file_key(perfstat_data_file),
+             'object_types': list(object_types), 'header_line': header_line,
+             'header_end': header_end, 'markers': markers, 'spans': spans}
+
+    for index_path in get_index_paths(perfstat_data_file):
+        try:
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            with open(index_path, 'w') as index_file:
+                json.dump(index, index_file, separators=(',', ':'))
+            logging.info('Wrote block index to %s.', index_path)
+            return
+        except OSError:
+            logging.debug('Could not write block index to %s.', index_path)
+
+    logging.warning('Could not write block index for %s anywhere.', perfstat_data_file)
+
+
+def clip_spans(spans, start, end):
+    """
+    Cuts the spans out of a span list, which are inside a certain part of a file.
+    :param spans: A list of spans, each of them a list of two offsets enclosing relevant lines.
+    :param start: The offset of the part. Must be the beginning of a line.
+    :param end: The offset, the part ends at, or None for the file's end. Must be the beginning
+    of a line.
+    :return: A list of spans, each of them enclosing relevant lines inside of the part.
+    """
+    clipped_spans = []
+    for span_start, span_end in spans:
+        if end is not None:
+            if span_start >= end:
+                break
+            span_end = min(span_end, end)
+        if span_end > start:
+            clipped_spans.append([max(span_start, start), span_end])
+    return clipped_spans
+
+
+def merge_spans(spans, other_spans):
+    """
+    Appends a list of spans to another one, joining adjacent spans.
+    :param spans: A list of spans, each of them a list of two offsets. It gets extended.
+    :param other_spans: A list of spans, all behind the ones in spans.
+    :return: None
+    """
+    for span in other_spans:
+        if spans and spans[-1][1] == span[0]:
+            spans[-1][1] = span[1]
+        else:
+            spans.append(list(span))
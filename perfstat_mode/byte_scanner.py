@@ -0,0 +1,258 @@
+"""
+Contains the class ByteScanner. It is an alternative way to read a PerfStat output file: Instead of
+decoding and examining every line of the file, it maps the file into memory and searches its bytes
+for the lines PicDat is interested in with precompiled byte patterns. Only the matching lines get
+decoded and handed to the data collector. Inside of sysstat and statit blocks, all lines are
+relevant, so the scanner passes them on one by one as long as the data collector reports being
+inside such a block.
+A ByteScanner remembers the spans of all lines it returned. Given those spans from an earlier run
+on the same file, it returns exactly these lines again without searching the file.
+"""
+import mmap
+
+__author__ = 'Marie Lohbeck'
+__copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
+
+# license notice:
+#
+# This file is part of PicDat.
+# PicDat is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public (at your option) any later version.
+#
+# PicDat is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with PicDat. If not,
+# see <http://www.gnu.org/licenses/>.
+
+# Byte strings which mark a line as relevant, wherever they appear inside the line. These are the
+# PerfStat header line with the number of iterations, all block markers (iteration beginnings and
+# endings as well as sysstat blocks) and the lines about LUN paths and uuids:
+MARKER_PATTERNS = [b'ITERATIONS,', b'=-=-=-=-=-=', b'---- statit ---', b'LUN ']
+
+
+def build_patterns(object_types):
+    """
+    Builds the byte patterns, which mark all relevant lines outside of sysstat and statit blocks.
+    :param object_types: A list of PerfStat object types as Strings, like 'volume' or 'lun'. Lines
+    beginning with one of these object types followed by a colon are per-iteration counter lines.
+    :return: A list of tuples, each of them containing a byte pattern and a boolean. The boolean
+    says, whether the pattern is anchored to the beginning of a line. Anchored patterns start with
+    a line break.
+    """
+    patterns = [(marker, False) for marker in MARKER_PATTERNS]
+    patterns += [(b'\n' + object_type.encode('ascii') + b':', True)
+                 for object_type in object_types]
+    return patterns
+
+
+def decode(line):
+    """
+    Decodes a line of bytes the same way as reading the file in text mode would do.
+    :param line: A line from a PerfStat file as bytes, including its line break.
+    :return: The line as String.
+    """
+    line = line.decode('ascii', errors='surrogateescape')
+    if line.endswith('\r\n'):
+        return line[:-2] + '\n'
+    return line
+
+
+class ByteScanner:
+    """
+    This class is responsible for reading a PerfStat output file memory-mapped. It is used as
+    context manager; entering it returns an iterator over all relevant lines of the file as
+    Strings, so it can replace an ordinary file object in the data collector.
+    """
+
+    def __init__(self, perfstat_data_file, object_types, inside_block, start=0, end=None,
+                 spans=None):
+        """
+        Constructor for ByteScanner.
+        :param perfstat_data_file: The path to a PerfStat output file.
+        :param object_types: A list of PerfStat object types as Strings, which the per-iteration
+        search keys are about.
+        :param inside_block: A callable without arguments, which returns True as long as the
+        reader of the lines is inside of a sysstat or statit block. As long as it does, the
+        scanner returns every line.
+        :param start: The byte offset, the scanner should start at. Must be the beginning of a line.
+        :param end: The byte offset, the scanner should stop at. If None, scanner reads until the
+        end of the file.
+        :param spans: A list of spans, each of them a list of two offsets enclosing relevant lines,
+        as recorded by an earlier ByteScanner on the same file. If given, the scanner returns the
+        lines inside the spans instead of searching the file.
+        """
+        self.perfstat_data_file = perfstat_data_file
+        self.patterns = build_patterns(object_types)
+        self.inside_block = inside_block
+        self.start = start
+        self.end = end
+        self.spans = spans
+
+        # the spans of all lines, the scanner returned so far. Adjacent lines share one span:
+        self.recorded_spans = []
+
+        self.file = None
+        self.memory_map = None
+
+    def __enter__(self):
+        self.file = open(self.perfstat_data_file, 'rb')
+        try:
+            self.memory_map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses to map empty files
+            self.memory_map = None
+        if self.spans is not None:
+            return self.replay_lines()
+        return self.lines()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.memory_map is not None:
+            self.memory_map.close()
+        self.file.close()
+
+    def find(self, pattern, anchored, position, end):
+        """
+        Searches the mapped file for the next line containing a pattern.
+        :param pattern: A byte pattern as built by build_patterns.
+        :param anchored: Boolean, whether the pattern is anchored to a line beginning.
+        :param position: The offset to search from. Must be the beginning of a line.
+        :param end: The offset to search to.
+        :return: The offset of the beginning of the line containing the next match, or end, if there
+        is none.
+        """
+        memory_map = self.memory_map
+
+        if not anchored:
+            hit = memory_map.find(pattern, position, end)
+            if hit == -1:
+                return end
+            return max(memory_map.rfind(b'\n', position, hit) + 1, position)
+
+        if position == 0:
+            if memory_map[:len(pattern) - 1] == pattern[1:]:
+                return 0
+            hit = memory_map.find(pattern, 0, end)
+        else:
+            # position is a line beginning, so the preceding byte is a line break
+            hit = memory_map.find(pattern, position - 1, end)
+        if hit == -1:
+            return end
+        return hit + 1
+
+    def lines(self):
+        """
+        Generator over all relevant lines of the mapped file. For each pattern, it remembers the
+        beginning of the next line containing it, so that each part of the file gets searched only
+        once per pattern.
+        :return: An iterator yielding the decoded lines, including their line breaks.
+        """
+        memory_map = self.memory_map
+        if memory_map is None:
+            return
+
+        recorded_spans = self.recorded_spans
+        position = self.start
+        end = len(memory_map) if self.end is None else self.end
+        patterns = self.patterns
+
+        next_hits = [self.find(pattern, anchored, position, end) for pattern, anchored in patterns]
+
+        while position < end:
+            if self.inside_block():
+                line_start = position
+            else:
+                # renew all hits the scanner already passed
+                for index, (pattern, anchored) in enumerate(patterns):
+                    if next_hits[index] < position:
+                        next_hits[index] = self.find(pattern, anchored, position, end)
+
+                line_start = min(next_hits)
+                if line_start == end:
+                    return
+
+            line_end = memory_map.find(b'\n', line_start, end)
+            if line_end == -1:
+                line_end = end
+            else:
+                line_end += 1
+
+            if recorded_spans and recorded_spans[-1][1] == line_start:
+                recorded_spans[-1][1] = line_end
+            else:
+                recorded_spans.append([line_start, line_end])
+
+            position = line_end
+            yield decode(memory_map[line_start:line_end])
+
+    def replay_lines(self):
+        """
+        Generator over all lines inside the spans given to the scanner.
+        :return: An iterator yielding the decoded lines, including their line breaks.
+        """
+        memory_map = self.memory_map
+        if memory_map is None:
+            return
+
+        for span_start, span_end in self.spans:
+            position = span_start
+            while position < span_end:
+                line_end = memory_map.find(b'\n', position, span_end)
+                if line_end == -1:
+                    line_end = span_end
+                else:
+                    line_end += 1
+                yield decode(memory_map[position:line_end])
+                position = line_end
+
+
+def line_at(memory_map, position):
+    """
+    Cuts the line, an offset points into, out of a mapped file.
+    :param memory_map: The mapped file.
+    :param position: Some offset inside the line.
+    :return: A tuple of the offset of the line's beginning and the line as bytes, without its line
+    break.
+    """
+    line_start = memory_map.rfind(b'\n', 0, position) + 1
+    line_end = memory_map.find(b'\n', position)
+    if line_end == -1:
+        line_end = len(memory_map)
+    return line_start, memory_map[line_start:line_end]
+
+
+def scan_iterations(perfstat_data_file):
+    """
+    Pre-scans a PerfStat output file for its header line and for all iteration beginning and
+    ending markers. This allows to split the file at iteration boundaries.
+    :param perfstat_data_file: The path to a PerfStat output file.
+    :return: A triple of the header line containing the number of iterations as String (None, if
+    the file doesn't contain any), the offset of the line behind the header line and a list of
+    tuples, one for each iteration marker in order of appearance. Each tuple holds the offset of
+    the marker line, the line as String and a boolean, whether it is a beginning marker.
+    """
+    with open(perfstat_data_file, 'rb') as file:
+        try:
+            memory_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses to map empty files
+            return None, 0, []
+
+        with memory_map:
+            hit = memory_map.find(b'ITERATIONS,')
+            if hit == -1:
+                return None, 0, []
+            header_start, header_line = line_at(memory_map, hit)
+            header_end = header_start + len(header_line) + 1
+
+            markers = []
+            for pattern, is_begin in [(b'BEGIN Iteration', True), (b'END Iteration', False)]:
+                hit = memory_map.find(pattern, header_end)
+                while hit != -1:
+                    line_start, line = line_at(memory_map, hit)
+                    if b'=-=-=-=-=-=' in line:
+                        markers.append((line_start, decode(line), is_begin))
+                    hit = memory_map.find(pattern, line_start + len(line))
+
+    return decode(header_line), header_end, sorted(markers)
@@ -0,0 +1,167 @@
+"""
+Contains the class CounterExport. It is responsible for exporting all per-iteration counters of a
+PerfStat file, not only those PicDat charts. Per-iteration counters appear in lines of the form
+object:instance:counter:value
+The CounterExport collects all of them while the data collector reads the file. It interns the
+object, instance and counter names, so that each name is kept only once, and holds the values in
+typed arrays. At the end, it writes everything into an SQLite database with these tables:
+    iterations(id, begin)
+    objects(id, name)
+    instances(id, object_id, name)
+    counters(id, object_id, name, unit)
+    samples(iteration_id, instance_id, counter_id, value)
+The view counter_values joins them to rows of iteration, begin, object, instance, counter, value
+and unit.
+"""
+import array
+import logging
+import os
+import re
+import sqlite3
+
+__author__ = 'Marie Lohbeck'
+__copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
+
+# license notice:
+#
+# This file is part of PicDat.
+# PicDat is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public (at your option) any later version.
+#
+# PicDat is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with PicDat. If not,
+# see <http://www.gnu.org/licenses/>.
+
+# Splits a counter value like '1234/s' or '12.5%' into its number and its unit:
+VALUE_PATTERN = re.compile(r'(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)(\S*)$')
+
+SCHEMA = '''
+    CREATE TABLE iterations (id INTEGER PRIMARY KEY, begin TEXT);
+    CREATE TABLE objects (id INTEGER PRIMARY KEY, name TEXT);
+    CREATE TABLE instances (id INTEGER PRIMARY KEY, object_id INTEGER, name TEXT);
+    CREATE TABLE counters (id INTEGER PRIMARY KEY, object_id INTEGER, name TEXT, unit TEXT);
+    CREATE TABLE samples (iteration_id INTEGER, instance_id INTEGER, counter_id INTEGER,
+                          value REAL);
+    CREATE INDEX samples_by_counter ON samples (counter_id, iteration_id);
+    CREATE VIEW counter_values AS
+        SELECT iterations.id AS iteration, iterations.begin AS begin, objects.name AS object,
+               instances.name AS instance, counters.name AS counter, samples.value AS value,
+               counters.unit AS unit
+        FROM samples
+        JOIN iterations ON iterations.id = samples.iteration_id
+        JOIN instances ON instances.id = samples.instance_id
+        JOIN counters ON counters.id = samples.counter_id
+        JOIN objects ON objects.id = counters.object_id;
+'''
+
+
+class CounterExport:
+    """
+    This class collects all per-iteration counter values of a PerfStat file in a compact,
+    columnar form and writes them into an SQLite database.
+    """
+
+    def __init__(self):
+        """
+        Constructor for CounterExport.
+        """
+        # dicts, mapping names to their ids. Instances and counters are interned per object type,
+        # so their keys are tuples of the object's id and their name:
+        self.object_ids = {}
+        self.instance_ids = {}
+        self.counter_ids = {}
+
+        # the unit of each counter, in the order of their ids:
+        self.counter_units = []
+
+        # one entry per collected value:
+        self.iterations = array.array('l')
+        self.instances = array.array('l')
+        self.counters = array.array('l')
+        self.values = array.array('d')
+
+    def intern(self, id_dict, key):
+        """
+        Looks up the id of a name. Names which haven't been seen before get a new id.
+        :param id_dict: One of the container's id dicts.
+        :param key: The name or tuple of object id and name to look up.
+        :return: The id as int.
+        """
+        name_id = id_dict.get(key)
+        if name_id is None:
+            name_id = len(id_dict)
+            id_dict[key] = name_id
+        return name_id
+
+    def process_line(self, line, iteration):
+        """
+        Collects the value from a per-iteration counter line. Lines not looking like one and lines
+        with non-numerical values are ignored.
+        :param line: A string from a PerfStat output file.
+        :param iteration: The number of the iteration, the line is from.
+        :return: None
+        """
+        line_split = line.split(':', 3)
+        if len(line_split) < 4:
+            return
+
+        object_type, instance, counter, value = line_split
+        if not object_type or not counter or ' ' in object_type or ' ' in counter:
+            return
+
+        match = VALUE_PATTERN.match(value.strip())
+        if match is None:
+            return
+
+        object_id = self.intern(self.object_ids, object_type)
+        counter_id = self.intern(self.counter_ids, (object_id, counter))
+        if counter_id == len(self.counter_units):
+            self.counter_units.append(match.group(2))
+
+        self.iterations.append(iteration)
+        self.instances.append(self.intern(self.instance_ids, (object_id, instance)))
+        self.counters.append(counter_id)
+        self.values.append(float(match.group(1)))
+
+    def write_database(self, database_file, iteration_timestamps):
+        """
+        Writes everything the container collected into an SQLite database. An existing file gets
+        replaced.
+        :param database_file: The path to write the database to.
+        :param iteration_timestamps: A list of datetime objects, marking the beginnings of all
+        iterations in the PerfStat file.
+        :return: None
+        """
+        if os.path.exists(database_file):
+            os.remove(database_file)
+
+        connection = sqlite3.connect(database_file)
+        try:
+            connection.executescript(SCHEMA)
+            connection.executemany(
+                'INSERT INTO iterations VALUES (?, ?)',
+                ((number, str(timestamp))
+                 for number, timestamp in enumerate(iteration_timestamps, 1)))
+            connection.executemany('INSERT INTO objects VALUES (?, ?)',
+                                   ((object_id, name) for name, object_id
+                                    in self.object_ids.items()))
+            connection.executemany('INSERT INTO instances VALUES (?, ?, ?)',
+                                   ((instance_id, object_id, name)
+                                    for (object_id, name), instance_id
+                                    in self.instance_ids.items()))
+            connection.executemany('INSERT INTO counters VALUES (?, ?, ?, ?)',
+                                   ((counter_id, object_id, name, self.counter_units[counter_id])
+                                    for (object_id, name), counter_id
+                                    in self.counter_ids.items()))
+            connection.executemany('INSERT INTO samples VALUES (?, ?, ?, ?)',
+                                   zip(self.iterations, self.instances, self.counters,
+                                       self.values))
+            connection.commit()
+        finally:
+            connection.close()
+
+        logging.info('Exported %s values of %s counters into %s', len(self.values),
+                     len(self.counter_ids), database_file)
@@ -0,0 +1,153 @@
+"""
+Contains the class CounterRegistry. It holds all per-iteration counters, PicDat looks for in
+PerfStat output. Per-iteration counters appear in lines of the form
+object:instance:counter:value
+and are collected once per iteration. By default, the registry contains the counters PicDat
+always charted. With a counter config file, further counters can be added without changing code.
+A counter config file is a json file like this:
+{
+    "defaults": true,
+    "counters": [
+        {"object": "volume", "counter": "repl_read_data", "unit": "b/s"},
+        {"object": "lun", "counter": "write_align_histo", "unit": "%", "histogram": true}
+    ]
+}
+If "defaults" is false, the default counters are left out. Each counter gets its own chart.
+"""
+import collections
+import json
+import logging
+import sys
+
+__author__ = 'Marie Lohbeck'
+__copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
+
+# license notice:
+#
+# This file is part of PicDat.
+# PicDat is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public (at your option) any later version.
+#
+# PicDat is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with PicDat. If not,
+# see <http://www.gnu.org/licenses/>.
+
+# A per-iteration counter: The PerfStat object type and counter name it is about, the unit, its
+# values are given in (PicDat cuts it off the values) and a boolean, whether it is a histogram.
+# Histogram counters don't have one value per instance and iteration, but one value per instance
+# and bucket; their counter names in PerfStat are suffixed with the bucket number, like
+# 'read_align_histo.3'. As the PerfStat is expected to have the same buckets in each iteration,
+# PicDat is going to show only the last collected values for histograms.
+Counter = collections.namedtuple('Counter', ['object_type', 'name', 'unit', 'is_histo'])
+
+# These counters will match (at most) once in each iteration. Data collected about one counter
+# will be shown in exactly one chart. Note that values with unit b/s get converted to MB/s.
+DEFAULT_COUNTERS = [
+    Counter('aggregate', 'total_transfers', '/s', False),
+    # values appears sometimes without unit
+    Counter('processor', 'processor_busy', '%', False),
+    Counter('volume', 'read_ops', '/s', False),
+    Counter('volume', 'write_ops', '/s', False),
+    Counter('volume', 'other_ops', '/s', False),
+    Counter('volume', 'total_ops', '/s', False),
+    Counter('volume', 'avg_latency', 'us', False),
+    Counter('volume', 'read_data', 'b/s', False),
+    Counter('volume', 'write_data', 'b/s', False),
+    Counter('lun', 'total_ops', '/s', False),
+    Counter('lun', 'avg_latency', 'ms', False),
+    Counter('lun', 'read_data', 'b/s', False),
+    Counter('lun', 'read_align_histo', '%', True),
+]
+
+
+class CounterRegistry:
+    """
+    This class holds a list of per-iteration counters and compiles them into dicts, so that
+    finding the counter a PerfStat line is about takes one lookup, regardless of how many counters
+    there are.
+    """
+
+    def __init__(self, counters):
+        """
+        Constructor for CounterRegistry.
+        :param counters: A list of Counter tuples. The order of the list is the order of the
+        resulting charts. If a counter is in the list several times, only the first one counts.
+        """
+        self.counters = []
+
+        # dicts, mapping tuples of object type and counter name to the counter's index in
+        # self.counters. One for ordinary counters and one for histograms:
+        self.counter_dict = {}
+        self.histogram_dict = {}
+
+        for counter in counters:
+            key = (counter.object_type, counter.name)
+            if key in self.counter_dict or key in self.histogram_dict:
+                logging.info('Counter %s:%s is registered several times. Ignore all but the first.',
+                             counter.object_type, counter.name)
+                continue
+            if counter.is_histo:
+                self.histogram_dict[key] = len(self.counters)
+            else:
+                self.counter_dict[key] = len(self.counters)
+            self.counters.append(counter)
+
+        # all object types, the counters are about:
+        self.object_types = list(collections.OrderedDict.fromkeys(
+            counter.object_type for counter in self.counters))
+
+        # PerfStat lines not starting with one of these prefixes can't be about any counter:
+        self.line_prefixes = tuple(object_type + ':' for object_type in self.object_types)
+
+    def lookup(self, line_split):
+        """
+        Finds the counter, a PerfStat line is about.
+        :param line_split: The parts of a per-iteration line, split at colons. Must have at least
+        three parts.
+        :return: A tuple of the counter's index in the registry and the histogram bucket as int,
+        or None for counters which are not histograms. None, if the line is about none of the
+        counters.
+        """
+        index = self.counter_dict.get((line_split[0], line_split[2]))
+        if index is not None:
+            return index, None
+
+        if self.histogram_dict:
+            counter_name, _, bucket = line_split[2].rpartition('.')
+            index = self.histogram_dict.get((line_split[0], counter_name))
+            if index is not None and bucket.isdigit():
+                return index, int(bucket)
+
+        return None
+
+
+def load_registry(counter_config_file=None):
+    """
+    Builds a CounterRegistry.
+    :param counter_config_file: Path to a counter config file as described in the module's
+    docstring, or None.
+    :return: A CounterRegistry object holding the default counters and those from the counter
+    config file, if given.
+    """
+    if counter_config_file is None:
+        return CounterRegistry(DEFAULT_COUNTERS)
+
+    try:
+        with open(counter_config_file, 'r') as config_file:
+            config = json.load(config_file)
+
+        counters = list(DEFAULT_COUNTERS) if config.get('defaults', True) else []
+        for entry in config.get('counters', []):
+            counters.append(Counter(str(entry['object']), str(entry['counter']),
+                                    str(entry.get('unit', '')),
+                                    bool(entry.get('histogram', False))))
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        logging.exception('Couldn\'t read counter config file %s.', counter_config_file)
+        sys.exit(1)
+
+    logging.info('Read %s counters from counter config file %s.', len(counters),
+                 counter_config_file)
+    return CounterRegistry(counters)
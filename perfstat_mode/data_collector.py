@@ -1,13 +1,19 @@
 """
 Is responsible for collecting all information of note from PerfStat output
 """
+import concurrent.futures
 import logging
 import sys
 
+import picdat_util
 from perfstat_mode.sysstat_container import SysstatContainer
 from perfstat_mode.statit_container import StatitContainer
 from perfstat_mode.per_iteration_container import PerIterationContainer
+from perfstat_mode.counter_export import CounterExport
+from perfstat_mode.byte_scanner import ByteScanner, scan_iterations
 from perfstat_mode import per_iteration_container as per_iteration_module
+from perfstat_mode import block_index
+from perfstat_mode import counter_registry
 from perfstat_mode import util
 
 __author__ = 'Marie Lohbeck'
@@ -44,7 +50,7 @@ def search_for_number_of_iterations(line):
     return 0
 
 
-def found_iteration_begin(line, start_times, last_end_time):
+def found_iteration_begin(line, start_times, last_end_time, localtimezone):
     """
     Searches for an iteration begin marker in a string and, if applicable,
     adds the timestamp given in this marker to start_times.
@@ -53,16 +59,18 @@ def found_iteration_begin(line, start_times, last_end_time):
     :param last_end_time: The last collected timestamp of an iteration's end. It would be
     used as recent timestamp, in case that there is no timestamp available in line on account of
     a PerfStat bug.
+    :param localtimezone: The LocalTimezone object of the PerfStat file, the line is from.
     :return: True, if the line contains an iteration begin marker, or False otherwise
     """
     if 'BEGIN Iteration' in line:
-        start_times.append(per_iteration_module.get_iteration_timestamp(line, last_end_time))
+        start_times.append(per_iteration_module.get_iteration_timestamp(line, last_end_time,
+                                                                        localtimezone))
         return True
 
     return False
 
 
-def found_iteration_end(line, end_times, last_start_time):
+def found_iteration_end(line, end_times, last_start_time, localtimezone):
     """
     Searches for an iteration end marker in a string and, if applicable,
     adds the timestamp given in this marker to end_times.
@@ -71,10 +79,12 @@ def found_iteration_end(line, end_times, last_start_time):
     :param last_start_time: The last collected timestamp of an iteration's beginning. It would be
     used as recent timestamp, in case that there is no timestamp available in line on account of
     a PerfStat bug.
+    :param localtimezone: The LocalTimezone object of the PerfStat file, the line is from.
     :return: True, if the line contains an iteration end marker, or False otherwise
     """
     if 'END Iteration' in line:
-        end_times.append(per_iteration_module.get_iteration_timestamp(line, last_start_time))
+        end_times.append(per_iteration_module.get_iteration_timestamp(line, last_start_time,
+                                                                      localtimezone))
         return True
 
     return False
@@ -101,11 +111,11 @@ def final_iteration_validation(expected_iteration_number, iteration_beginnings,
                         'won\'t be considered in the resulting charts!')
 
 
-def combine_results(per_iteration_container, sysstat_container, statit_container, end_times):
+def combine_results(per_iteration_container, sysstat_container, statit_container, end_times,
+                    localtimezone):
     """
     This function combines the contents of all three request types. This means, it sticks
-    all tables together and packs meta data about the tables. This includes the global variable
-    localtimezone.
+    all tables together and packs meta data about the tables. This includes the local timezone.
     :param per_iteration_container: PerIterationContainer object that holds all relevant
     information about per_iteration_requests.
     :param sysstat_container: SysstatContainer objet that holds all relevant information about
@@ -114,6 +124,7 @@ def combine_results(per_iteration_container, sysstat_container, statit_container
     statit blocks.
     :param end_times: The end timestamps of all iterations; they are needed to rework the statit
     data.
+    :param localtimezone: The LocalTimezone object of the PerfStat file, the data is from.
     :return: All tables in one list and an identifier dict providing meta data for all tables
     """
 
@@ -130,53 +141,157 @@ def combine_results(per_iteration_container, sysstat_container, statit_container
     combined_is_histo = p_i_is_histo + sy_is_histo + st_is_histo
 
     label_dict = {'identifiers': combined_identifiers, 'units': combined_units,
-                  'is_histo': combined_is_histo, 'timezone': str(util.localtimezone)}
+                  'is_histo': combined_is_histo, 'timezone': str(localtimezone)}
 
-    logging.debug('time zone: %s', util.localtimezone)
+    logging.debug('time zone: %s', localtimezone)
 
     return combined_tables, label_dict
 
 
-def read_data_file(perfstat_data_file, sort_columns_by_name):
+class DataChunk:
     """
-    Reads the requested information from a PerfStat output file and collects them into several lists
-    :param perfstat_data_file: file which should be read
-    :param sort_columns_by_name: Some of the charts may have a great amount of graphs. By
-    default, PicDat sorts the corresponding legend entries by relevance, means the graph with the
-    highest values in sum is displayed at the top of the legend. If you rather would sort them
-    alphabetically, this boolean should be true.
-    :return: A list of all collected values in a table format. Each table is a nested list as
-    well; the values are grouped by rows. Additionally, it returns an identifier_dict which
-    contains meta data such as axis labels or apprpriate file names for all tables.
+    This class holds everything PicDat collects while reading a PerfStat output file or a part of
+    it: Information about the iterations and the three containers for the different kinds of
+    search keys. If a PerfStat file is read in several parts, there is one DataChunk for each of
+    them; they get merged afterwards.
     """
 
-    # initialisation
-
-    # number of iterations like it is defined in the file's header:
-    number_of_iterations = 0
-
-    # number of iterations that actually has been started:
-    iteration_begin_counter = 0
-    # the relating time stamps:
-    start_times = []
-
-    # number of iterations that actually terminated:
-    iteration_end_counter = 0
-    # the relating time stamps:
-    end_times = []
-
-    # this object collects all information the program finds outside of sysstat and statit blocks
-    per_iteration_container = PerIterationContainer(sort_columns_by_name)
-
-    # this object collects all information the program finds during processing sysstat_x_1sec blocks
-    sysstat_container = SysstatContainer()
+    def __init__(self, sort_columns_by_name, localtimezone, registry, number_of_iterations=0,
+                 iteration_end_offset=0, previous_end_time=None, sysstat_stream_paths=None,
+                 counter_export=None, digits=None, sysstat_header=None):
+        """
+        Constructor for DataChunk.
+        :param sort_columns_by_name: Boolean, whether chart legends should be sorted by name or by
+        value.
+        :param localtimezone: The LocalTimezone object of the PerfStat file, the chunk is about.
+        :param registry: The CounterRegistry holding the per-iteration counters to look for.
+        :param number_of_iterations: Number of iterations like it is defined in the file's header.
+        If it is zero, the chunk expects the header line at its beginning.
+        :param iteration_end_offset: Number of iteration endings in the file in front of the chunk.
+        :param previous_end_time: The timestamp of the last iteration ending in front of the chunk.
+        It would be used as the first iteration beginning's timestamp, in case that it is not
+        readable on account of a PerfStat bug.
+        :param sysstat_stream_paths: A list of paths to the three sysstat csv tables, or None. If
+        given, sysstat values are written into them while reading.
+        :param counter_export: A CounterExport object, which collects all per-iteration counters,
+        or None.
+        :param digits: The number of significant digits for non-integral values in streamed
+        sysstat csv tables, or None for full precision.
+        :param sysstat_header: A tuple of the two sysstat header lines, a chunk in front of this one
+        found, or None. If given, the chunk reads all sysstat values with this header, as it would
+        happen if the file was read in one go.
+        """
+        self.localtimezone = localtimezone
+
+        # number of iterations like it is defined in the file's header:
+        self.number_of_iterations = number_of_iterations
+
+        # number of iterations that actually has been started:
+        self.iteration_begin_counter = 0
+        # the relating time stamps:
+        self.start_times = []
+
+        # number of iterations that actually terminated:
+        self.iteration_end_counter = 0
+        # the relating time stamps:
+        self.end_times = []
+
+        self.iteration_end_offset = iteration_end_offset
+        self.previous_end_time = previous_end_time
+
+        # the spans of all lines relevant for PicDat, if the chunk was read memory-mapped:
+        self.spans = []
+
+        # this object collects all information the program finds outside of sysstat and statit
+        # blocks
+        self.per_iteration_container = PerIterationContainer(sort_columns_by_name, registry)
+
+        # this object collects all information the program finds during processing
+        # sysstat_x_1sec blocks
+        self.sysstat_container = SysstatContainer(localtimezone, sysstat_stream_paths, digits)
+        if sysstat_header is not None:
+            self.sysstat_container.process_sysstat_header(*sysstat_header)
+
+        # this object collects all information the program finds during processing statit blocks
+        self.statit_container = StatitContainer(sort_columns_by_name, localtimezone)
+
+        # this object collects all per-iteration counters for exporting them, if requested:
+        self.counter_export = counter_export
+
+    def merge(self, other):
+        """
+        Takes over everything another DataChunk collected.
+        :param other: DataChunk object, which read the part of the PerfStat file directly behind
+        the one of this chunk.
+        :return: None
+        """
+        self.iteration_begin_counter += other.iteration_begin_counter
+        self.start_times += other.start_times
+        self.iteration_end_counter += other.iteration_end_counter
+        self.end_times += other.end_times
+        block_index.merge_spans(self.spans, other.spans)
+
+        self.per_iteration_container.merge(other.per_iteration_container)
+        self.sysstat_container.merge(other.sysstat_container)
+        self.statit_container.merge(other.statit_container)
+
+
+def open_data_file(perfstat_data_file, use_mmap, object_types, sysstat_container,
+                   statit_container, start=0, end=None, spans=None):
+    """
+    Opens a PerfStat output file for reading it line by line.
+    :param perfstat_data_file: file which should be read
+    :param use_mmap: If True, the file is read by a ByteScanner, which maps the file into memory
+    and only returns the lines relevant for PicDat. Otherwise, the file is opened as text file,
+    returning all lines. Compressed files and files inside zip archives can only be read like
+    this.
+    :param object_types: A list of the PerfStat object types of all per-iteration counters. The
+    ByteScanner returns the lines about them.
+    :param sysstat_container: SysstatContainer object, which is going to process the lines. The
+    ByteScanner needs to know, whether it is inside a sysstat block.
+    :param statit_container: StatitContainer object, which is going to process the lines. The
+    ByteScanner needs to know, whether it is inside a statit block.
+    :param start: The byte offset to start reading at. Only supported with use_mmap.
+    :param end: The byte offset to stop reading at, or None to read until the file's end. Only
+    supported with use_mmap.
+    :param spans: The spans of all relevant lines from the file's block index, or None. Only
+    supported with use_mmap.
+    :return: A context manager; entering it returns an iterator over the file's lines.
+    """
+    if use_mmap:
+        return ByteScanner(perfstat_data_file, object_types,
+                           lambda: sysstat_container.inside_sysstat_block
+                           or statit_container.inside_statit_block, start, end, spans)
 
-    # this object collects all information the program finds during processing statit blocks
-    statit_container = StatitContainer(sort_columns_by_name)
+    return picdat_util.open_input_file(perfstat_data_file)
 
-    # collecting data
 
-    with open(perfstat_data_file, 'r', encoding='ascii', errors='surrogateescape') as data:
+def collect_data(perfstat_data_file, chunk, use_mmap, start=0, end=None, spans=None):
+    """
+    Reads the requested information from a PerfStat output file or a part of it into a DataChunk.
+    :param perfstat_data_file: file which should be read
+    :param chunk: DataChunk object, which collects the information.
+    :param use_mmap: If True, the file is read memory-mapped and searched on byte level, so that
+    only the relevant lines need to be decoded and examined. Reading a part of the file requires
+    this.
+    :param start: The byte offset of the part to read. Must be the beginning of a line.
+    :param end: The byte offset, the part to read ends at, or None for the file's end.
+    :param spans: The spans of all relevant lines inside the part from the file's block index. If
+    given, only these lines are read. Requires use_mmap.
+    :return: The DataChunk object.
+    """
+    localtimezone = chunk.localtimezone
+    start_times = chunk.start_times
+    end_times = chunk.end_times
+    per_iteration_container = chunk.per_iteration_container
+    sysstat_container = chunk.sysstat_container
+    statit_container = chunk.statit_container
+    counter_export = chunk.counter_export
+
+    data_file = open_data_file(perfstat_data_file, use_mmap,
+                               per_iteration_container.registry.object_types, sysstat_container,
+                               statit_container, start, end, spans)
+    with data_file as data:
         for line in data:
             if not sysstat_container.inside_sysstat_block \
             or not sysstat_container.sysstat_header_needed:
@@ -184,8 +299,8 @@ def read_data_file(perfstat_data_file, sort_columns_by_name):
 
             # first, search for the planned number of iteration in the file's header.
             # Once set, skip this check.
-            if number_of_iterations == 0:
-                number_of_iterations = search_for_number_of_iterations(line)
+            if chunk.number_of_iterations == 0:
+                chunk.number_of_iterations = search_for_number_of_iterations(line)
                 continue
 
             if sysstat_container.inside_sysstat_block:
@@ -196,16 +311,17 @@ def read_data_file(perfstat_data_file, sort_columns_by_name):
             if '=-=-=-=-=-=' in line:
                 # filter for iteration beginnings and endings
                 if len(end_times) == 0:
-                    last_end_time = None
+                    last_end_time = chunk.previous_end_time
                 else:
                     last_end_time = end_times[-1]
-                if found_iteration_begin(line, start_times, last_end_time):
-                    iteration_begin_counter += 1
-                elif found_iteration_end(line, end_times, start_times[-1]):
-                    iteration_end_counter += 1
+                if found_iteration_begin(line, start_times, last_end_time, localtimezone):
+                    chunk.iteration_begin_counter += 1
+                elif found_iteration_end(line, end_times, start_times[-1], localtimezone):
+                    chunk.iteration_end_counter += 1
                     # write an empty line into the sysstat tables to cut line in resulting charts
                     # between different iterations (not after the last):
-                    if iteration_end_counter != number_of_iterations:
+                    if chunk.iteration_end_offset + chunk.iteration_end_counter != \
+                            chunk.number_of_iterations:
                         sysstat_container.add_empty_lines()
 
                 elif sysstat_container.found_sysstat_1sec_begin(line):
@@ -220,17 +336,259 @@ def read_data_file(perfstat_data_file, sort_columns_by_name):
             if statit_container.check_statit_begin(line):
                 continue
             if start_times:
+                if counter_export is not None:
+                    counter_export.process_line(line, chunk.iteration_begin_counter)
                 per_iteration_container.process_per_iteration_keys(line, start_times[-1])
 
-    logging.debug('processor data: %s', str(per_iteration_container.processor_tables))
+    if use_mmap:
+        chunk.spans = data_file.recorded_spans if spans is None else spans
+
+    return chunk
+
+
+def read_chunk(perfstat_data_file, sort_columns_by_name, registry, timezone, number_of_iterations,
+               iteration_end_offset, previous_end_time, start, end, spans=None,
+               sysstat_header=None):
+    """
+    Reads a part of a PerfStat output file. The part must begin with an iteration or at the file's
+    beginning, so that it can be read independently from the rest of the file. This
+    function is meant to run in a worker process.
+    :param perfstat_data_file: file which should be read
+    :param sort_columns_by_name: Boolean, whether chart legends should be sorted by name or by
+    value.
+    :param registry: The CounterRegistry holding the per-iteration counters to look for.
+    :param timezone: The file's local timezone, if already known, or None.
+    :param number_of_iterations: Number of iterations like it is defined in the file's header, or
+    zero for the part at the file's beginning, which contains the header.
+    :param iteration_end_offset: Number of iteration endings in the file in front of the part.
+    :param previous_end_time: The timestamp of the last iteration ending in front of the part.
+    :param start: The byte offset of the part.
+    :param end: The byte offset, the part ends at, or None for the file's end.
+    :param spans: The spans of all relevant lines inside the part from the file's block index, or
+    None.
+    :param sysstat_header: A tuple of the two sysstat header lines to read all sysstat values with,
+    or None to take the first header found inside the part.
+    :return: A DataChunk object holding the part's information.
+    """
+    chunk = DataChunk(sort_columns_by_name, util.LocalTimezone(timezone), registry,
+                      number_of_iterations, iteration_end_offset, previous_end_time,
+                      sysstat_header=sysstat_header)
+    return collect_data(perfstat_data_file, chunk, True, start, end, spans)
+
+
+def read_marker_timestamp(marker_line, localtimezone):
+    """
+    Reads the timestamp from an iteration beginning or ending marker line without complaining
+    about PerfStat bugs. Those get reported while reading the file anyway.
+    :param marker_line: A string like
+    =-=-=-=-=-= BEGIN Iteration 1  =-=-=-=-=-= Mon Jan 01 00:00:00 GMT 2000
+    :param localtimezone: The LocalTimezone object of the PerfStat file, the line is from.
+    :return: A datetime object, or None if the line doesn't contain a readable timestamp.
+    """
+    try:
+        return util.build_date(marker_line.split('=-=-=-=-=-=')[2], localtimezone)
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+def read_chunks_in_parallel(perfstat_data_file, sort_columns_by_name, registry, jobs, iterations,
+                            spans=None):
+    """
+    Splits a PerfStat output file at iteration boundaries and reads the parts in several worker
+    processes. Each part analyses the first sysstat header inside itself. If it differs from the
+    first header of the whole file, the part is read again with that one, because all sysstat
+    values are read with the file's first header if the file is read in one go.
+    :param perfstat_data_file: file which should be read
+    :param sort_columns_by_name: Boolean, whether chart legends should be sorted by name or by
+    value.
+    :param registry: The CounterRegistry holding the per-iteration counters to look for.
+    :param jobs: The maximum number of worker processes.
+    :param iterations: The file's iteration information as returned by
+    byte_scanner.scan_iterations.
+    :param spans: The spans of all relevant lines from the file's block index, or None.
+    :return: A DataChunk object holding the information of the whole file, or None if the file
+    can't be split.
+    """
+    header_line, _, markers = iterations
+    begin_indices = [index for index, (_, _, is_begin) in enumerate(markers) if is_begin]
+    if header_line is None or len(begin_indices) < 2:
+        return None
+
+    # the time zone is defined by the first timestamp in the file, so read it in advance to
+    # hand it to all workers:
+    localtimezone = util.LocalTimezone()
+    read_marker_timestamp(markers[begin_indices[0]][1], localtimezone)
+
+    parts = min(jobs, len(begin_indices))
+    split_indices = [begin_indices[round(part * len(begin_indices) / parts)]
+                     for part in range(1, parts)]
+    # the first part begins at the file's beginning and reads the header line by itself:
+    starts = [0] + [markers[index][0] for index in split_indices]
+    ends = starts[1:] + [None]
+
+    number_of_iterations = search_for_number_of_iterations(header_line.strip())
+
+    chunk_arguments = []
+    for chunk_number, start in enumerate(starts):
+        if chunk_number == 0:
+            iteration_end_offset = 0
+            previous_end_time = None
+        else:
+            preceding_markers = markers[:split_indices[chunk_number - 1]]
+            iteration_end_offset = sum(1 for _, _, is_begin in preceding_markers if not is_begin)
+
+            # use the latest readable timestamp in front of the chunk as fallback:
+            previous_end_time = None
+            for _, marker_line, _ in reversed(preceding_markers):
+                previous_end_time = read_marker_timestamp(marker_line, localtimezone)
+                if previous_end_time is not None:
+                    break
+
+        chunk_arguments.append((perfstat_data_file, sort_columns_by_name, registry,
+                                localtimezone.timezone,
+                                0 if chunk_number == 0 else number_of_iterations,
+                                iteration_end_offset, previous_end_time, start,
+                                ends[chunk_number],
+                                None if spans is None else block_index.clip_spans(
+                                    spans, start, ends[chunk_number])))
+
+    logging.info('Read PerfStat in %s parts with %s worker processes...', parts, parts)
+    log_level = logging.getLogger().getEffectiveLevel()
+
+    merged_chunk = None
+    with concurrent.futures.ProcessPoolExecutor(max_workers=parts) as executor:
+        futures = [executor.submit(picdat_util.run_with_buffered_logging, log_level, read_chunk,
+                                   *arguments) for arguments in chunk_arguments]
+
+        # write out the log records of each part in the order of the parts
+        for arguments, future in zip(chunk_arguments, futures):
+            chunk, records, exception = future.result()
+            if exception is None and merged_chunk is not None and \
+                    not merged_chunk.sysstat_container.fits_header(chunk.sysstat_container):
+                logging.debug('sysstat header changed within the PerfStat. Reading the part at '
+                              'byte %s again with the first header.', arguments[7])
+                chunk, records, exception = executor.submit(
+                    picdat_util.run_with_buffered_logging, log_level, read_chunk, *arguments,
+                    merged_chunk.sysstat_container.header_lines).result()
+
+            picdat_util.emit_log_records(records)
+            if exception is not None:
+                for remaining_future in futures:
+                    remaining_future.cancel()
+                raise exception
+
+            if merged_chunk is None:
+                merged_chunk = chunk
+            else:
+                merged_chunk.merge(chunk)
+
+    # let all containers refer to the same time zone again:
+    merged_chunk.localtimezone = localtimezone
+    merged_chunk.sysstat_container.localtimezone = localtimezone
+    merged_chunk.statit_container.localtimezone = localtimezone
+
+    return merged_chunk
+
+
+def read_data_file(perfstat_data_file, sort_columns_by_name, use_mmap=False, jobs=1,
+                   use_index=False, registry=None, sysstat_stream_paths=None, export_file=None,
+                   digits=None):
+    """
+    Reads the requested information from a PerfStat output file and collects them into several lists
+    :param perfstat_data_file: file which should be read. It might be compressed or inside a zip
+    archive; such files are always read as a whole, line by line.
+    :param sort_columns_by_name: Some of the charts may have a great amount of graphs. By
+    default, PicDat sorts the corresponding legend entries by relevance, means the graph with the
+    highest values in sum is displayed at the top of the legend. If you rather would sort them
+    alphabetically, this boolean should be true.
+    :param use_mmap: If True, the file is read memory-mapped and searched on byte level, so that
+    only the relevant lines need to be decoded and examined.
+    :param jobs: The number of worker processes. If it is greater than 1, the file gets split at
+    iteration boundaries and the parts are read in parallel. This always reads the file
+    memory-mapped.
+    :param use_index: If True, the file is read with help of its block index. If there is no
+    up-to-date index yet, it gets written after reading the file. This always reads the file
+    memory-mapped.
+    :param registry: The CounterRegistry holding the per-iteration counters to look for. If None,
+    PicDat looks for the default counters.
+    :param sysstat_stream_paths: A list of paths to the three sysstat csv tables, or None. If
+    given, sysstat values are written into these files while reading, instead of being collected
+    in memory. Their tables in the returned list are None then. As the rows need to be written in
+    order, this always reads the file in one piece.
+    :param export_file: A path to write an SQLite database with all per-iteration counters of the
+    file into, or None. As the export needs to see each line of the file, this always reads the
+    whole file in one piece, neither memory-mapped nor with help of the block index.
+    :param digits: The number of significant digits for non-integral values in streamed sysstat
+    csv tables, or None for full precision.
+    :return: A list of all collected values in a table format. Each table is a nested list or a
+    row generator; the values are grouped by rows. Additionally, it returns an identifier_dict which
+    contains meta data such as axis labels or apprpriate file names for all tables.
+    """
+    if registry is None:
+        registry = counter_registry.load_registry()
+    object_types = registry.object_types
+
+    if picdat_util.is_packed(perfstat_data_file) and (use_mmap or use_index or jobs > 1):
+        logging.info('PerfStat file %s is compressed or inside a zip archive, so it is read as a '
+                     'whole, line by line.', perfstat_data_file)
+        use_mmap = False
+        use_index = False
+        jobs = 1
+
+    counter_export = None
+    if export_file is not None:
+        logging.info('Export all counters, so the PerfStat file is read as a whole.')
+        counter_export = CounterExport()
+        use_mmap = False
+        use_index = False
+        jobs = 1
+    iterations = None
+    spans = None
+    index = None
+    if use_index:
+        use_mmap = True
+        index = block_index.load_index(perfstat_data_file, object_types)
+        if index is not None:
+            iterations, spans = index
+
+    chunk = None
+    if jobs > 1 and sysstat_stream_paths is not None:
+        logging.info('Sysstat values get streamed into their csv tables, so the PerfStat file is '
+                     'read in one piece.')
+    elif jobs > 1:
+        if iterations is None:
+            iterations = scan_iterations(perfstat_data_file)
+        chunk = read_chunks_in_parallel(perfstat_data_file, sort_columns_by_name, registry, jobs,
+                                        iterations, spans)
+
+    if chunk is None:
+        # the timezone, all timestamps of this file will be converted to:
+        localtimezone = util.LocalTimezone()
+        chunk = collect_data(perfstat_data_file,
+                             DataChunk(sort_columns_by_name, localtimezone, registry,
+                                       sysstat_stream_paths=sysstat_stream_paths,
+                                       counter_export=counter_export, digits=digits),
+                             use_mmap, spans=spans)
+
+    if use_index and index is None:
+        if iterations is None:
+            iterations = scan_iterations(perfstat_data_file)
+        block_index.save_index(perfstat_data_file, object_types, iterations, chunk.spans)
+
+    logging.debug('per-iteration data: %s', str(chunk.per_iteration_container.tables))
 
     # postprocessing
 
-    if number_of_iterations == 0:
+    if chunk.number_of_iterations == 0:
         logging.warning('The file you entered as PerfStat output doesn\'t even contain, how many '
                         'iterations it handles. Maybe, it isn\'t a PerfStat file at all.')
         sys.exit(1)
 
-    final_iteration_validation(number_of_iterations, iteration_begin_counter, iteration_end_counter)
+    final_iteration_validation(chunk.number_of_iterations, chunk.iteration_begin_counter,
+                               chunk.iteration_end_counter)
+
+    if counter_export is not None:
+        counter_export.write_database(export_file, chunk.start_times)
 
-    return combine_results(per_iteration_container, sysstat_container, statit_container, end_times)
+    return combine_results(chunk.per_iteration_container, chunk.sysstat_container,
+                           chunk.statit_container, chunk.end_times, chunk.localtimezone)
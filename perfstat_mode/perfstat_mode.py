@@ -1,16 +1,18 @@
 """
 This module contains the main routine for the perfstat mode
 """
+import concurrent.futures
 import logging
 import os
 import traceback
 
+import picdat_util
 from perfstat_mode import util
+from perfstat_mode import counter_registry
 from perfstat_mode import data_collector
-from general import create_output
+from perfstat_mode import sysstat_container
 from general import constants
-from general import table_writer
-from general import visualizer
+from general import create_output
 
 __author__ = 'Marie Lohbeck'
 __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
@@ -29,8 +31,95 @@ __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
 # see <http://www.gnu.org/licenses/>.
 
 
+def process_perfstat_node(perfstat_node, node_dict, single_node, result_dir, csv_dir,
+                          sort_columns_by_name, compact_file, use_mmap, use_index, registry,
+                          stream_sysstat, export_counters, digits, binary, write_tables,
+                          gzip_html, jobs=1):
+    """
+    Reads one PerfStat file and creates its output.
+    :param perfstat_node: path to a perfstat file like output.data or data.out.
+    :param node_dict: A Dict, mapping the PerfStats node addresses to tuples of their cluster and
+    node names, as read from the console.log file. Might be None.
+    :param single_node: Boolean, whether perfstat_node is the only PerfStat file to handle. If
+    not, output file names get prefixed with the node's name.
+    :param result_dir: path to an existing directory. Function stores its results in here.
+    :param csv_dir: path to an existing directory inside result_dir. Function stores its csv tables
+    in here.
+    :param sort_columns_by_name: boolean, which says whether user wants to sort chart legends by
+    name or by value.
+    :param compact_file: Boolean, which says whether command line option 'compact' is set or not.
+    :param use_mmap: Boolean, which says whether command line option 'mmap' is set or not.
+    :param use_index: Boolean, which says whether command line option 'index' is set or not.
+    :param registry: The CounterRegistry holding the per-iteration counters to look for.
+    :param stream_sysstat: Boolean, which says whether command line option 'stream' is set or not.
+    :param export_counters: Boolean, which says whether command line option 'export' is set or
+    not.
+    :param digits: The number of significant digits for non-integral values in the csv tables, or
+    None for full precision.
+    :param binary: Boolean, which says whether command line option 'binary' is set or not. If so,
+    chart data will be included into the charts html as binary payloads.
+    :param write_tables: Boolean, whether the csv tables should be written. This is False, if
+    command line option 'notables' is set.
+    :param gzip_html: Boolean, which says whether command line option 'gzip' is set or not.
+    :param jobs: The number of worker processes to read the PerfStat file with. If it is greater
+    than 1, the file gets split at iteration boundaries.
+    :return: None
+    """
+    # get nice names (if possible) for each PerfStat and the whole html file
+    perfstat_address = perfstat_node.split(os.sep)[-2]
+
+    if node_dict is None:
+        html_title = perfstat_node
+        node_identifier = perfstat_address
+    else:
+        try:
+            node_identifier = node_dict[perfstat_address][1]
+            html_title = util.get_html_title(node_dict, perfstat_address)
+            logging.debug('html title (from identifier dict): %s', str(html_title))
+        except KeyError:
+            logging.info(
+                'Did not find a node name for address \'%s\' in \'console.log\'. Will '
+                'use just \'%s\' instead.', perfstat_address, perfstat_address)
+            html_title = perfstat_node
+            node_identifier = perfstat_address
+
+        logging.info('Handle PerfStat from node "%s":', node_identifier)
+    node_identifier += '_'
+
+    if single_node:
+        node_identifier = ''
+
+    if stream_sysstat:
+        sysstat_stream_paths = create_output.csv_naming(
+            sysstat_container.SYSSTAT_IDENTIFIERS, csv_dir, node_identifier)[0]
+    else:
+        sysstat_stream_paths = None
+
+    if export_counters:
+        export_file = os.path.join(result_dir, node_identifier + constants.COUNTER_EXPORT_FILENAME
+                                   + constants.COUNTER_EXPORT_ENDING)
+    else:
+        export_file = None
+
+    # collect data from file
+    logging.info('Read data...')
+    tables, label_dict = data_collector.read_data_file(perfstat_node, sort_columns_by_name,
+                                                       use_mmap, jobs, use_index, registry,
+                                                       sysstat_stream_paths, export_file, digits)
+
+    logging.debug('tables: %s', tables)
+    logging.debug('all labels: %s', label_dict)
+
+    create_output.create_output(
+        result_dir, csv_dir, html_title, node_identifier, tables, label_dict, compact_file,
+        digits, binary, write_tables, gzip_html)
+
+
 def run_perfstat_mode(perfstat_console_file, perfstat_output_files, result_dir, csv_dir,
-                      sort_columns_by_name, compact_file):
+                      sort_columns_by_name, compact_file, use_mmap=False, jobs=1,
+                      use_index=False, counter_config_file=None, stream_sysstat=False,
+                      export_counters=False, digits=None, binary=False,
+                      write_tables=True, gzip_html=False):
     """
     The perfstat mode's main routine. Calls all functions to read perfstat data, write CSVs
     and finally create an HTML.
@@ -44,6 +133,27 @@ def run_perfstat_mode(perfstat_console_file, perfstat_output_files, result_dir,
     name or by value.
     :param compact: Boolean, which says whether command line option 'compact' is set or not. If so,
     dygraphs code and csv content will be included into the charts html.
+    :param use_mmap: Boolean, which says whether command line option 'mmap' is set or not. If so,
+    PerfStat files are read memory-mapped and searched on byte level.
+    :param jobs: The number of worker processes to handle several PerfStat files in parallel. If
+    there is only one PerfStat file, the worker processes read parts of it in parallel instead. If
+    it is 1, everything is handled in this process.
+    :param use_index: Boolean, which says whether command line option 'index' is set or not. If
+    so, PerfStat files are read with help of their block indices.
+    :param counter_config_file: Path to a counter config file, which defines additional
+    per-iteration counters, or None.
+    :param stream_sysstat: Boolean, which says whether command line option 'stream' is set or not.
+    If so, sysstat values are written into their csv tables while reading the PerfStat files.
+    :param export_counters: Boolean, which says whether command line option 'export' is set or
+    not. If so, all per-iteration counters get exported into an SQLite database for each PerfStat
+    file.
+    :param digits: The number of significant digits for non-integral values in the csv tables, or
+    None for full precision.
+    :param binary: Boolean, which says whether command line option 'binary' is set or not. If so,
+    chart data will be included into the charts html as binary payloads.
+    :param write_tables: Boolean, whether the csv tables should be written. This is False, if
+    command line option 'notables' is set.
+    :param gzip_html: Boolean, which says whether command line option 'gzip' is set or not.
     :return: None
     """
     logging.debug("Perfstat output files: %s", perfstat_output_files)
@@ -66,42 +176,40 @@ def run_perfstat_mode(perfstat_console_file, perfstat_output_files, result_dir,
 
     logging.debug('node dict: %s', str(node_dict))
 
-    for perfstat_node in perfstat_output_files:
-
-        # get nice names (if possible) for each PerfStat and the whole html file
-        perfstat_address = perfstat_node.split(os.sep)[-2]
-
-        if node_dict is None:
-            html_title = perfstat_node
-            node_identifier = perfstat_address
-        else:
-            try:
-                node_identifier = node_dict[perfstat_address][1]
-                html_title = util.get_html_title(node_dict, perfstat_address)
-                logging.debug('html title (from identifier dict): %s', str(html_title))
-            except KeyError:
-                logging.info(
-                    'Did not find a node name for address \'%s\' in \'console.log\'. Will '
-                    'use just \'%s\' instead.', perfstat_address, perfstat_address)
-                html_title = perfstat_node
-                node_identifier = perfstat_address
-
-            logging.info('Handle PerfStat from node "%s":', node_identifier)
-        node_identifier += '_'
-
-        if len(perfstat_output_files) == 1:
-            node_identifier = ''
-
-        # collect data from file
-        logging.info('Read data...')
-        tables, label_dict = data_collector.read_data_file(perfstat_node,
-                                                           sort_columns_by_name)
-
-        logging.debug('tables: %s', tables)
-        logging.debug('all labels: %s', label_dict)
-
-        create_output.create_output(
-            result_dir, csv_dir, html_title, node_identifier, tables, label_dict, compact_file)
-
-        # reset global variable 'localtimezone'
-        util.localtimezone = None
+    registry = counter_registry.load_registry(counter_config_file)
+
+    single_node = len(perfstat_output_files) == 1
+    node_arguments = [(perfstat_node, node_dict, single_node, result_dir, csv_dir,
+                       sort_columns_by_name, compact_file, use_mmap, use_index, registry,
+                       stream_sysstat, export_counters, digits, binary, write_tables,
+                       gzip_html)
+                      for perfstat_node in perfstat_output_files]
+
+    if single_node:
+        process_perfstat_node(*node_arguments[0], jobs=jobs)
+        return
+
+    if jobs == 1:
+        for arguments in node_arguments:
+            process_perfstat_node(*arguments)
+        return
+
+    workers = min(jobs, len(perfstat_output_files))
+    logging.info('Handle %s PerfStats with %s worker processes...', len(perfstat_output_files),
+                 workers)
+    log_level = logging.getLogger().getEffectiveLevel()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(picdat_util.run_with_buffered_logging, log_level,
+                                   process_perfstat_node, *arguments)
+                   for arguments in node_arguments]
+
+        # write out the log records of each node in the order of the nodes, so that they don't
+        # get mixed up
+        for future in futures:
+            _, records, exception = future.result()
+            picdat_util.emit_log_records(records)
+            if exception is not None:
+                for remaining_future in futures:
+                    remaining_future.cancel()
+                raise exception
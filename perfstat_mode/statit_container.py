@@ -12,7 +12,7 @@ import logging
 
 from perfstat_mode import constants
 from perfstat_mode import util
-from general.table import Table
+from general.table import NumericTable
 
 __author__ = 'Marie Lohbeck'
 __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
@@ -41,14 +41,17 @@ class StatitContainer:
     PerfStat file.
     """
 
-    def __init__(self, sort_columns_by_name):
+    def __init__(self, sort_columns_by_name, localtimezone):
         """
         Constructor for StatitContainer.
         :param sort_columns_by_name: Graph lines in statit charts might become pretty many.
         Per default, PicDat sorts the legend entries by relevance, means the graph with the
         highest values in sum is displayed at the top of the legend. If you rather would sort
         them alphabetically, this boolean should be true.
+        :param localtimezone: The LocalTimezone object of the PerfStat file, the container is
+        reading. It is needed to build the statit timestamps.
         """
+        self.localtimezone = localtimezone
 
         # An integer tracking the number of --- statit --- lines, PicDat read in the PerfStat.#
         # As the statit timestamp is always some lines beneath, this counter is used to check
@@ -64,8 +67,8 @@ class StatitContainer:
         # block inside the statit block):
         self.inside_disk_stats_block = False
 
-        # A variable of type 'Table', should collect all values from disk statistic blocks:
-        self.table = Table()
+        # A variable of type 'NumericTable', should collect all values from disk statistic blocks:
+        self.table = NumericTable()
 
         # This variable should save the self.table content in a flattened form:
         self.flat_table = None
@@ -142,7 +145,8 @@ class StatitContainer:
             if len(self.statit_timestamps) < self.statit_counter:
                 if 'Begin: ' in line:
                     try:
-                        self.statit_timestamps.append(util.build_date(line.split(' ', 1)[1]))
+                        self.statit_timestamps.append(
+                            util.build_date(line.split(' ', 1)[1], self.localtimezone))
                     except (KeyError, IndexError, ValueError):
 
                         if not self.statit_timestamps:
@@ -169,6 +173,18 @@ class StatitContainer:
             if line_split[0] == 'disk':
                 self.inside_disk_stats_block = True
 
+    def merge(self, other):
+        """
+        Takes over everything another StatitContainer collected. This is for PerfStat files,
+        which have been read in several parts; other must have read the part directly behind the
+        one of this container.
+        :param other: StatitContainer object, which read the subsequent part of the PerfStat.
+        :return: None
+        """
+        self.statit_counter += other.statit_counter
+        self.statit_timestamps += other.statit_timestamps
+        self.table.merge(other.table)
+
     def rework_statit_data(self, iteration_timestamps):
         """
         Simplifies statit data: Flattens the table data structure. Also inserts empty data lines
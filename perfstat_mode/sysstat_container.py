@@ -8,13 +8,20 @@ sysstat table usually refer to different units. PicDat is interested in only som
 They are specified in the sysstat-keys constants. The search keys are subdivided into three lists,
 each one belonging to a specific unit. PicDat is going to create exactly three csv tables and three
 charts about the sysstat blocks.
+As sysstat blocks have one value line per second, they make up the biggest part of PicDat's data.
+Therefore, the container keeps them in typed arrays, one for the time and one for the values of
+each chart, and builds the csv rows only at the end. Alternatively, the container can stream its
+rows into the csv files directly while reading, so that it doesn't keep any sysstat values at all.
 """
+import array
+import functools
 import re
 
 import logging
 
-from perfstat_mode import constants
 from perfstat_mode import util
+from general import table_writer
+from general.table import TableRows
 
 __author__ = 'Marie Lohbeck'
 __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
@@ -59,6 +66,14 @@ SYSSTAT_IOPS_UNIT = ' '
 
 SYSSTAT_CHART_TITLE = 'sysstat_1sec'
 
+# The identifiers of the three sysstat charts, in the order of the container's tables:
+SYSSTAT_IDENTIFIERS = [(SYSSTAT_CHART_TITLE, 'percent'), (SYSSTAT_CHART_TITLE, 'MBs'),
+                       (SYSSTAT_CHART_TITLE, 'IOPS')]
+
+# This value in the time column marks an empty line between two iterations. The value columns hold
+# NaN at those places:
+SYSSTAT_GAP = -2 ** 63
+
 
 class SysstatContainer:
     """
@@ -67,7 +82,18 @@ class SysstatContainer:
     it contains all other information necessary to read headers and values from a PerfStat file.
     """
 
-    def __init__(self):
+    def __init__(self, localtimezone, stream_paths=None, digits=None):
+        """
+        Constructor for SysstatContainer.
+        :param localtimezone: The LocalTimezone object of the PerfStat file, the container is
+        reading. It is needed to build the sysstat timestamps.
+        :param stream_paths: A list of three paths, one for each sysstat csv table in the order of
+        SYSSTAT_IDENTIFIERS, or None. If given, the container writes its rows into these files
+        while reading, instead of collecting them.
+        :param digits: The number of significant digits for non-integral values in streamed csv
+        tables, or None for full precision.
+        """
+        self.localtimezone = localtimezone
 
         # boolean, whether program is currently reading in a sysstat_x_1sec block:
         self.inside_sysstat_block = False
@@ -76,7 +102,8 @@ class SysstatContainer:
         # (Header should be equal for each block):
         self.sysstat_header_needed = True
 
-        # the recent time:
+        # the recent time in seconds since the beginning of unix time. As sysstat values come once
+        # per second, it's just counted up and gets formatted for each value line:
         self.recent_timestamp = None
 
         # lists to hold the headers for the three sysstat-charts:
@@ -89,15 +116,33 @@ class SysstatContainer:
         self.mbs_indices = []
         self.iops_indices = []
 
-        # lists to hold the values for the three sysstat-charts:
-        self.percent_values = []
-        self.mbs_values = []
-        self.iops_values = []
+        # the two lines of the sysstat header, the headers and indices were taken from:
+        self.header_lines = None
+
+        # the time of each value line in seconds since the beginning of unix time:
+        self.times = array.array('q')
+
+        # float arrays to hold the values for the three sysstat-charts. They are stored row by row,
+        # so each array holds as many values per entry in self.times as the corresponding index
+        # list has entries:
+        self.percent_values = array.array('d')
+        self.mbs_values = array.array('d')
+        self.iops_values = array.array('d')
 
         # to analyse a sysstat header, it is necessary to look at two lines at once. But because
         # the program reads line by line, this variable is for buffering the first header line:
         self.buffered_header = None
 
+        # the paths and file objects of the csv tables, if the container streams its rows:
+        self.stream_paths = stream_paths
+        self.stream_files = None
+        # number of value lines already written into the csv tables:
+        self.streamed_rows = 0
+        # number of empty lines which need to be written before the next value line:
+        self.pending_empty_lines = 0
+        # significant digits for non-integral values in the csv tables:
+        self.digits = digits
+
     def found_sysstat_1sec_begin(self, line):
         """
         Looks, whether a String marks the beginning of a sysstat_x_1sec respectively sysstat_1sec
@@ -125,21 +170,21 @@ class SysstatContainer:
         """
         try:
             # extract time stamp from cdot perfstat:
-            self.recent_timestamp = util.build_date(
-                sysstat_timestamp_line.split('[')[1].replace(']', ''))
+            timestamp = util.build_date(
+                sysstat_timestamp_line.split('[')[1].replace(']', ''), self.localtimezone)
 
         except IndexError:
             try:
                 # extract time stamp from 7-mode perfstat:
-                self.recent_timestamp = util.build_date(
-                    sysstat_timestamp_line.replace('Begin: ', ''))
+                timestamp = util.build_date(
+                    sysstat_timestamp_line.replace('Begin: ', ''), self.localtimezone)
             except (KeyError, IndexError, ValueError):
                 logging.warning(
                     'PerfStat bug in sysstat block. Could not read any timestamp from line: '
                     '\'%s\' PicDat is using the timestamp from the iteration\'s beginning '
                     'instead. This timestamp is: \'%s\' Note that this may lead to '
                     'falsifications in charts!', sysstat_timestamp_line, iteration_timestamp)
-                self.recent_timestamp = iteration_timestamp
+                timestamp = iteration_timestamp
 
         except (KeyError, ValueError):
             logging.warning(
@@ -147,32 +192,45 @@ class SysstatContainer:
                 '\'%s\' PicDat is using the timestamp from the iteration\'s beginning '
                 'instead. This timestamp is: \'%s\' Note that this may lead to '
                 'falsifications in charts!', sysstat_timestamp_line, iteration_timestamp)
-            self.recent_timestamp = iteration_timestamp
+            timestamp = iteration_timestamp
+
+        self.recent_timestamp = util.to_epoch(timestamp)
 
     def increment_time(self):
         """
-        Increases the container's datetime variable 'recent_timestamp' about one second.
+        Increases the container's variable 'recent_timestamp' about one second.
         :return: None
         """
-        self.recent_timestamp += constants.ONE_SECOND
+        self.recent_timestamp += 1
 
     def add_empty_lines(self):
         """
-        Adds an empty data line to each value list inside this container. This is for interrupting
-        the templates graph lines in resulting charts. Therefore, this function should be called
-        between iterations.
+        Adds an empty data line to the container's arrays, if they contain any values. This is for
+        interrupting the templates graph lines in resulting charts. Therefore, this function should
+        be called between iterations.
         :return: None
         """
-        for value_list in [self.percent_values, self.mbs_values, self.iops_values]:
-            empty_line = util.empty_line(value_list)
-            if empty_line is not None:
-                value_list.append(empty_line)
+        if self.stream_paths is not None:
+            # write them not until the next value line, so that there are no empty lines at the
+            # end of the tables:
+            if self.streamed_rows:
+                self.pending_empty_lines += 1
+            return
+
+        if not self.times:
+            return
+
+        self.times.append(SYSSTAT_GAP)
+        for values, indices in [(self.percent_values, self.percent_indices),
+                                (self.mbs_values, self.mbs_indices),
+                                (self.iops_values, self.iops_indices)]:
+            values.extend([util.NAN] * len(indices))
 
     def process_sysstat_keys(self, value_line):
         """
         This function collects all relevant information from a line in a sysstat_x_1sec block. In
         case, the line doesn't contain values, but a sub header, the function ignores it.
-        Otherwise, the function is going to append one sublist onto each of the own value lists.
+        Otherwise, the function is going to append one row of values onto each of the own arrays.
         Therefore, it uses the container's index lists to find the right value places inside the
         sysstat block.
         :param value_line: A String which is a line from a sysstat_x_1sec block
@@ -184,19 +242,76 @@ class SysstatContainer:
 
         # check, whether line really contains data and not just a sub header
         if str.isdigit(line_split[0].strip('%')):
-            # add values specified in percent_indices to percent_values
-            self.percent_values.append([str(self.recent_timestamp)] + [line_split[index].strip(
-                '%') for index in self.percent_indices])
-            # add values specified in mbs_indices to mbs_values and convert them to MB/s instead of
-            # kB/s. Notice, that this needs to be conform to the constant SYSSTAT_MBS_UNIT!
-            self.mbs_values.append(
-                [str(self.recent_timestamp)] +
-                [str(round(int(line_split[index]) / 1000)) for index in self.mbs_indices])
-
-            self.iops_values.append([str(self.recent_timestamp)] + [line_split[index] for index in
-                                                                    self.iops_indices])
+            try:
+                # add values specified in percent_indices to percent_values
+                percent_row = [float(line_split[index].strip('%'))
+                               for index in self.percent_indices]
+                # add values specified in mbs_indices to mbs_values and convert them to MB/s
+                # instead of kB/s. Notice, that this needs to be conform to the constant
+                # SYSSTAT_MBS_UNIT!
+                mbs_row = [round(float(line_split[index]) / 1000) for index in self.mbs_indices]
+                iops_row = [float(line_split[index]) for index in self.iops_indices]
+            except ValueError:
+                # some value is not a number; do the same again, but value by value:
+                percent_row = [util.to_float(line_split[index].strip('%'))
+                               for index in self.percent_indices]
+                mbs_row = [util.to_float(line_split[index]) / 1000 for index in self.mbs_indices]
+                mbs_row = [value if value != value else round(value) for value in mbs_row]
+                iops_row = [util.to_float(line_split[index]) for index in self.iops_indices]
+
+            if self.stream_paths is not None:
+                self.write_rows(percent_row, mbs_row, iops_row)
+                self.increment_time()
+                return
+
+            self.times.append(self.recent_timestamp)
+            self.percent_values.extend(percent_row)
+            self.mbs_values.extend(mbs_row)
+            self.iops_values.extend(iops_row)
             self.increment_time()
 
+    def write_rows(self, percent_row, mbs_row, iops_row):
+        """
+        Writes one row of values into each of the csv tables. Opens the tables first, if this is
+        the first row. Also writes pending empty lines.
+        :param percent_row: A list of floats, one for each of the container's percent_indices.
+        :param mbs_row: A list of floats, one for each of the container's mbs_indices.
+        :param iops_row: A list of floats, one for each of the container's iops_indices.
+        :return: None
+        """
+        if self.stream_files is None:
+            self.stream_files = [open(path, 'w') for path in self.stream_paths]
+            for stream_file, headers in zip(self.stream_files, [self.percent_headers,
+                                                                self.mbs_headers,
+                                                                self.iops_headers]):
+                stream_file.write(table_writer.format_row(['time'] + headers))
+
+        time_string = util.format_epoch(self.recent_timestamp)
+        for stream_file, row in zip(self.stream_files, [percent_row, mbs_row, iops_row]):
+            # empty lines used to be one column wider than value lines; keep them like this:
+            stream_file.write(table_writer.format_row([' '] * (len(row) + 2))
+                              * self.pending_empty_lines)
+            stream_file.write(table_writer.format_row([time_string] + row, self.digits))
+
+        self.pending_empty_lines = 0
+        self.streamed_rows += 1
+
+    def close_stream_files(self):
+        """
+        Closes the csv tables, the container streamed its rows into.
+        :return: A list of three times None, one for each table, as they have already been
+        written. An empty list, if the container didn't find any values.
+        """
+        if self.stream_files is None:
+            return []
+
+        for stream_file in self.stream_files:
+            stream_file.close()
+            logging.info('Wrote chart values into %s', stream_file.name)
+        self.stream_files = None
+
+        return [None] * len(self.stream_paths)
+
     def process_sysstat_header(self, first_header_line, second_header_line):
         """
         Searches the header of a sysstat_x_1sec block, which is usually split over two lines,
@@ -208,6 +323,7 @@ class SysstatContainer:
         :return: None
         """
         self.sysstat_header_needed = False
+        self.header_lines = (first_header_line, second_header_line)
 
         # Split the first line into single words and save them to header_line_split.
         # Simultaneously, memorize the line indices, at which the words end, into endpoints.
@@ -278,34 +394,120 @@ class SysstatContainer:
         else:
             self.process_sysstat_keys(line)
 
+    def merge(self, other):
+        """
+        Takes over everything another SysstatContainer collected. This is for PerfStat files,
+        which have been read in several parts; other must have read the part directly behind the
+        one of this container. The headers are taken from the first container which found one, so
+        all later containers need to have read their values with the same header, as it is done
+        by read_chunks_in_parallel.
+        :param other: SysstatContainer object, which read the subsequent part of the PerfStat.
+        :return: None
+        :raises ValueError: If other read its values with another header than this container.
+        """
+        if self.sysstat_header_needed:
+            self.sysstat_header_needed = other.sysstat_header_needed
+            self.header_lines = other.header_lines
+            self.percent_headers = other.percent_headers
+            self.mbs_headers = other.mbs_headers
+            self.iops_headers = other.iops_headers
+            self.percent_indices = other.percent_indices
+            self.mbs_indices = other.mbs_indices
+            self.iops_indices = other.iops_indices
+            # without a header, this container can't have any values yet:
+            self.times = other.times
+            self.percent_values = other.percent_values
+            self.mbs_values = other.mbs_values
+            self.iops_values = other.iops_values
+            return
+        elif not self.fits_header(other):
+            raise ValueError('Can\'t merge sysstat values, which have been read with different '
+                             'headers.')
+
+        self.times.extend(other.times)
+        self.percent_values.extend(other.percent_values)
+        self.mbs_values.extend(other.mbs_values)
+        self.iops_values.extend(other.iops_values)
+
+    def fits_header(self, other):
+        """
+        Checks, whether another SysstatContainer read its values with the same column indices as
+        this one, so that its values can be merged into this container.
+        :param other: SysstatContainer object, which read another part of the PerfStat.
+        :return: False, if both containers found a sysstat header and the headers' indices differ;
+        True otherwise.
+        """
+        return self.sysstat_header_needed or other.sysstat_header_needed or \
+            (self.percent_indices, self.mbs_indices, self.iops_indices) == \
+            (other.percent_indices, other.mbs_indices, other.iops_indices)
+
     def rework_sysstat_data(self):
         """
-        Simplifies data structures: Adds 'time' Strings to the header lists, then sticks headers
-        and values for each table together, then sticks all tables together.
-        :return: All sysstat tables in a nested list.
+        Simplifies data structures: Adds 'time' Strings to the header lists, then provides a
+        TableRows object for each table, which formats the arrays' values into rows of Strings.
+        :return: All sysstat tables' TableRows objects in a list. If the container streamed its rows
+        into the csv tables, the list contains None for each of them.
         """
-        for value_list in [self.percent_values, self.mbs_values, self.iops_values]:
-            try:
-                while value_list[-1][0] == ' ':
-                    del value_list[-1]
-            except IndexError:
-                pass
+        if self.stream_paths is not None:
+            return self.close_stream_files()
+
+        # remove empty lines at the end:
+        while self.times and self.times[-1] == SYSSTAT_GAP:
+            self.times.pop()
+            for values, indices in [(self.percent_values, self.percent_indices),
+                                    (self.mbs_values, self.mbs_indices),
+                                    (self.iops_values, self.iops_indices)]:
+                del values[len(values) - len(indices):]
 
         self.percent_headers.insert(0, 'time')
         self.mbs_headers.insert(0, 'time')
         self.iops_headers.insert(0, 'time')
 
-        tables = []
+        # check whether there are any values before returning tables
+        if not self.times:
+            return []
+
+        time_strings = [None if time == SYSSTAT_GAP else util.format_epoch(time)
+                        for time in self.times]
 
-        # check for all tables whether they are empty before returning them
-        if self.percent_values:
-            tables += [[self.percent_headers] + self.percent_values]
-        if self.mbs_values:
-            tables += [[self.mbs_headers] + self.mbs_values]
-        if self.iops_values:
-            tables += [[self.iops_headers] + self.iops_values]
+        return [TableRows(functools.partial(self.iterate_rows, headers, values, time_strings),
+                          functools.partial(self.get_chart_values, headers, values))
+                for headers, values in [(self.percent_headers, self.percent_values),
+                                        (self.mbs_headers, self.mbs_values),
+                                        (self.iops_headers, self.iops_values)]]
 
-        return tables
+    def iterate_rows(self, headers, values, time_strings):
+        """
+        Generates the rows of one sysstat table as lists of Strings, one at a time.
+        :param headers: The table's header list, beginning with 'time'.
+        :param values: The table's value array, holding the values row by row.
+        :param time_strings: The formatted timestamps of all rows. None marks an empty line.
+        :return: A generator of lists: First the header row, then the rows of values.
+        """
+        width = len(headers) - 1
+        # empty lines used to be one column wider than value lines; keep them like this:
+        empty_line = [' '] * (width + 2)
+
+        yield headers
+        for row_number, time_string in enumerate(time_strings):
+            if time_string is None:
+                yield list(empty_line)
+            else:
+                yield [time_string] + values[row_number * width:(row_number + 1) * width].tolist()
+
+    def get_chart_values(self, headers, values):
+        """
+        Provides the values of one sysstat table for building a binary chart payload, as described
+        in general.table.TableRows.
+        :param headers: The table's header list, beginning with 'time'.
+        :param values: The table's value array, holding the values row by row.
+        :return: A tuple of the header list, True, as the x values are times, the x values and a
+        float array for each column.
+        """
+        width = len(headers) - 1
+        x_values = [None if time == SYSSTAT_GAP else time for time in self.times]
+        columns = [values[column_number::width] for column_number in range(width)]
+        return headers, True, x_values, columns
 
     def get_labels(self):
         """
@@ -321,18 +523,10 @@ class SysstatContainer:
         units = []
         is_histo = []
 
-        # check for all tables whether they are empty before returning their labels
-        if self.percent_values:
-            identifiers.append((SYSSTAT_CHART_TITLE, 'percent'))
-            units.append(SYSSTAT_PERCENT_UNIT)
-            is_histo.append(False)
-        if self.mbs_values:
-            identifiers.append((SYSSTAT_CHART_TITLE, 'MBs'))
-            units.append(SYSSTAT_MBS_UNIT)
-            is_histo.append(False)
-        if self.iops_values:
-            identifiers.append((SYSSTAT_CHART_TITLE, 'IOPS'))
-            units.append(SYSSTAT_IOPS_UNIT)
-            is_histo.append(False)
+        # check whether there are any values before returning labels
+        if self.times or self.streamed_rows:
+            identifiers += SYSSTAT_IDENTIFIERS
+            units += [SYSSTAT_PERCENT_UNIT, SYSSTAT_MBS_UNIT, SYSSTAT_IOPS_UNIT]
+            is_histo += [False, False, False]
 
         return identifiers, units, is_histo
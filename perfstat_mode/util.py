@@ -3,8 +3,10 @@ Provides some functions other modules inside package perfstat_mode may use.
 """
 import logging
 import datetime
+import functools
 import sys
 import picdat_util
+from perfstat_mode import constants
 
 __author__ = 'Marie Lohbeck'
 __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
@@ -22,12 +24,26 @@ __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
 # You should have received a copy of the GNU General Public License along with PicDat. If not,
 # see <http://www.gnu.org/licenses/>.
 
-# PerfStat output might be somewhat inconsistent in dealing with timezones. Therefore,
-# PicDat wants to convert all time information into local time. As local timezone, it takes the
-# first timezone it finds in the PerfStat file. Note: this is a global var. Global vars are
-# usually not the best practise, but I wanted to avoid passing it as argument all the time. So
-# make sure to clear this value before you handling a new PerfStat file!
-localtimezone = None
+
+class LocalTimezone:
+    """
+    PerfStat output might be somewhat inconsistent in dealing with timezones. Therefore,
+    PicDat wants to convert all time information into local time. As local timezone, it takes the
+    first timezone it finds in the PerfStat file. An object of this class holds this timezone for
+    exactly one PerfStat file, so create a new one for each file you read. This way, several
+    PerfStat files can be read at the same time without interfering with each other.
+    """
+
+    def __init__(self, timezone=None):
+        """
+        Constructor for LocalTimezone.
+        :param timezone: A pytz.timezone object, if the local timezone is already known. Otherwise,
+        build_date will set it once it finds the first timezone.
+        """
+        self.timezone = timezone
+
+    def __str__(self):
+        return str(self.timezone)
 
 
 def data_type(filepath):
@@ -65,6 +81,20 @@ def get_log_level(log_level_string):
         sys.exit(1)
 
 
+# Maps the month shortcuts used in PerfStat timestamps to their numbers:
+MONTH_NUMBERS = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6, 'Jul': 7, 'Aug': 8,
+                 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
+
+# Number of timestamp Strings, parse_timestamp remembers its results for:
+TIMESTAMP_CACHE_SIZE = 4096
+
+# Marks missing values in float arrays:
+NAN = float('nan')
+
+# The beginning of unix time, to compute epoch seconds of naive datetime objects:
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
 def get_month_number(month_string):
     """
     Find the corresponding month number to a simple month string
@@ -72,35 +102,25 @@ def get_month_number(month_string):
     upper case.
     :return: The corresponding month number
     """
-    return {
-        'Jan': 1,
-        'Feb': 2,
-        'Mar': 3,
-        'Apr': 4,
-        'May': 5,
-        'Jun': 6,
-        'Jul': 7,
-        'Aug': 8,
-        'Sep': 9,
-        'Oct': 10,
-        'Nov': 11,
-        'Dec': 12
-    }[month_string]
+    return MONTH_NUMBERS[month_string]
 
 
-def build_date(timestamp_string):
+@functools.lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
+def parse_timestamp(timestamp_string, local_timezone):
     """
-    Auxiliary function for get_iteration_timestamp and get_sysstat_timestamp. Parses a String to
-    a datetime object and converts it into UTC.
+    Parses a String to a datetime object and converts it into a timezone. As PerfStat files
+    contain the same timestamps several times, results are cached.
     :param timestamp_string: a string like
     Mon Jan 01 00:00:00 GMT 2000
-    :return: a datetime object which contains the input's information converted to UTC timezone.
+    :param local_timezone: The pytz.timezone object, the timestamp should be converted to.
+    :return: A triple of a datetime object without tzinfo, the pytz.timezone object of the
+    timezone given in the String (or None) and a boolean, whether the conversion into
+    local_timezone was possible. If not, the datetime object holds the time as given in the String.
     """
-
     timestamp_list = timestamp_string.split()
 
     # collect all information needed to create a datetime object from timestamp_string
-    month = get_month_number(timestamp_list[1])
+    month = MONTH_NUMBERS[timestamp_list[1]]
     day = int(timestamp_list[2])
     time = timestamp_list[3].split(":")
     timezone = picdat_util.get_timezone(timestamp_list[4])
@@ -110,19 +130,69 @@ def build_date(timestamp_string):
     minute = int(time[1])
     second = int(time[2])
 
-    # check, whether global variable 'localtimezone' is already set
-    global localtimezone
-    if localtimezone is None:
-        localtimezone = timezone
+    date = datetime.datetime(year, month, day, hour, minute, second, 0, None)
 
-    # convert timezone to global_vars.localtimezone (as possible) and return datetime object
+    # convert timezone to local_timezone (as possible)
     try:
-        return timezone.localize(
-            datetime.datetime(year, month, day, hour, minute, second, 0, None)).astimezone(
-                localtimezone).replace(tzinfo=None)
+        return timezone.localize(date).astimezone(local_timezone).replace(tzinfo=None), timezone, \
+            True
     except (AttributeError, TypeError):
-        localtimezone = None
-        return datetime.datetime(year, month, day, hour, minute, second, 0, None)
+        return date, timezone, False
+
+
+def build_date(timestamp_string, localtimezone):
+    """
+    Auxiliary function for get_iteration_timestamp and get_sysstat_timestamp. Parses a String to
+    a datetime object and converts it into the local timezone.
+    :param timestamp_string: a string like
+    Mon Jan 01 00:00:00 GMT 2000
+    :param localtimezone: The LocalTimezone object of the PerfStat file, the timestamp is from.
+    :return: a datetime object which contains the input's information converted to the local
+    timezone.
+    """
+    date, timezone, converted = parse_timestamp(timestamp_string, localtimezone.timezone)
+
+    # check, whether the local timezone is already set
+    if localtimezone.timezone is None:
+        localtimezone.timezone = timezone
+        date, timezone, converted = parse_timestamp(timestamp_string, timezone)
+
+    if not converted:
+        localtimezone.timezone = None
+    return date
+
+
+def to_epoch(date):
+    """
+    Converts a datetime object without tzinfo into seconds since the beginning of unix time. This
+    is a fast representation for timestamps, which just need to be counted up and printed.
+    :param date: A datetime object without tzinfo.
+    :return: The number of seconds as int.
+    """
+    return (date - EPOCH) // constants.ONE_SECOND
+
+
+@functools.lru_cache(maxsize=64)
+def format_epoch_day(days):
+    """
+    Formats the date of a day given in days since the beginning of unix time.
+    :param days: The number of days as int.
+    :return: A String like 2000-01-01
+    """
+    return str((EPOCH + datetime.timedelta(days=days)).date())
+
+
+def format_epoch(seconds):
+    """
+    Formats seconds since the beginning of unix time the same way str() formats datetime objects
+    without microseconds.
+    :param seconds: The number of seconds as int.
+    :return: A String like 2000-01-01 00:00:00
+    """
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return '%s %02d:%02d:%02d' % (format_epoch_day(days), hours, minutes, seconds)
 
 
 def check_column_header(word_upper_line, endpoint_upper_word, lower_line, request_upper_string,
@@ -156,24 +226,6 @@ def check_column_header(word_upper_line, endpoint_upper_word, lower_line, reques
     return False
 
 
-def check_tablelist_content(tablelist, total_size):
-    """
-    This function checks, whether a table list contains content at each expected position. It
-    generates a further list, which holds a boolean for each table list entry. It says False for
-    each empty table and True, otherwise. If the table list isn't even fully built, means if it is
-    shorter than expected, the function will append False entries to the availability list
-    respectively.
-    :param tablelist: A list of type Table.
-    :param total_size: The total number of elements, tablelist should hold, if it would be fully
-    filled.
-    :return: An availability list of size total_size containing booleans.
-    """
-    availability_list = [not table.is_empty() for table in tablelist]
-    while len(availability_list) < total_size:
-        availability_list.append(False)
-    return availability_list
-
-
 def read_console_file(perfstat_console_file):
     """
     Reads some information from a console.log file as it is attached to PerfStat output.data files.
@@ -181,7 +233,7 @@ def read_console_file(perfstat_console_file):
     :return: A Dict, mapping the PerfStats node addresses to tuples of their
     cluster and node names.
     """
-    with open(perfstat_console_file, 'r') as log:
+    with picdat_util.open_input_file(perfstat_console_file) as log:
 
         line = ''
         while not line.startswith('Vserver'):
@@ -230,6 +282,19 @@ def get_html_title(identifier_dict, perfstat_adress):
     return 'Cluster: ' + cluster + '&ensp; &ensp; Node: ' + node
 
 
+def to_float(value_string):
+    """
+    Converts a value from a PerfStat file into a float.
+    :param value_string: The value as String.
+    :return: The value as float, or NaN, if it isn't a number.
+    """
+    try:
+        return float(value_string)
+    except ValueError:
+        logging.debug('Found a value which is not convertible to float: %s', value_string)
+        return NAN
+
+
 def empty_line(value_list):
     """
     Generates an empty data line for a value list. This is for interrupting the
@@ -1,19 +1,24 @@
 """
 From here, the tool gets started. The module handles user communication, unpacks files if necessary
-and decides, whether it has to run in perfstat or asup-xml or asup-hdf5 mode.
+and decides, whether it has to run in perfstat or asup-xml or asup-hdf5 mode. Alternatively, it
+starts the ingestion service, which runs PicDat on uploaded inputs.
 """
 import logging
 import shutil
 import os
 import sys
 import tempfile
-import http.server
+import threading
 
 sys.path.append('..')
 
 import picdat_util
 from general import constants
+from general import result_cache
+from general import service
+from general import web_server
 from asup_mode import asup_mode
+from asup_mode import asup_watcher
 from perfstat_mode import perfstat_mode
 
 __author__ = 'Marie Lohbeck'
@@ -33,17 +38,37 @@ __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
 # see <http://www.gnu.org/licenses/>.
 
 
-def start_picdat():
+def run_picdat(input_file, result_dir, sort_columns_by_name, compact_file, use_mmap, jobs,
+               use_index, counter_config_file, stream_sysstat, export_counters, digits, binary,
+               write_tables, gzip_html, use_cache=True, resume=False):
     """
-    Starts PicDat. Gets called at the bottom of this module.
+    Visualises one input: Decides, which kind of performance data it contains, unpacks it if
+    necessary and runs PicDat in the fitting mode. The parameters are the options returned by
+    picdat_util.handle_user_input.
+    :param input_file: The path to the input, a file or a directory.
+    :param result_dir: The directory, the results should be written into.
+    :param use_cache: Boolean, whether results of an earlier run on the same input with the same
+    options should be taken from the result cache, and the results of this run be stored in it.
+    :param resume: Boolean, whether ASUPs should be added to the results of earlier runs in
+    result_dir, which left a checkpoint there. The result cache is bypassed then, because the
+    results depend on the checkpoint.
+    :return: True, if the input contained anything PicDat could handle, False otherwise.
     """
-
     try:
         temp_path = None
 
-        # read command line options and take additional user input
-        input_file, result_dir, sort_columns_by_name, compact_file, webserver = \
-        picdat_util.handle_user_input(sys.argv)
+        # create directory and copy the necessary templates files into it
+        csv_dir = picdat_util.prepare_directory(result_dir, compact_file, write_tables)
+
+        # look for results of an earlier run on the same input with the same options
+        use_cache = use_cache and not resume
+        if use_cache:
+            cache_key = result_cache.get_key(
+                input_file, (sort_columns_by_name, compact_file, export_counters, digits, binary,
+                             write_tables, gzip_html), counter_config_file)
+            if result_cache.load(cache_key, result_dir):
+                return True
+            files_before = result_cache.list_files(result_dir)
 
         # initialize all accepted kinds of input files
         perfstat_output_files = None
@@ -115,61 +140,53 @@ def start_picdat():
 
         # handle zip files or single .data or .out or .h5 files as input
         else:
-            # extract zip if necessary
+            # zip files get read in place
             if picdat_util.data_type(input_file) in ['data', 'out']:
                 perfstat_output_files = [input_file]
             elif picdat_util.data_type(input_file) == 'zip':
-                logging.info('Extract zip...')
-                temp_path, perfstat_output_files, perfstat_console_file = picdat_util.extract_zip(
+                perfstat_output_files, perfstat_console_file = picdat_util.get_zipped_perfstats(
                     input_file)
             elif picdat_util.data_type(input_file) == 'h5':
                 asup_hdf5_file = input_file
             elif picdat_util.data_type(input_file) == 'json':
                 asup_json_files = [input_file]
 
-        # create directory and copy the necessary templates files into it
-        csv_dir = picdat_util.prepare_directory(result_dir, compact_file)
-
         # run
         if perfstat_output_files:
             # run in perfstat mode
             logging.info('Running PicDat in PerfStat mode')
             perfstat_mode.run_perfstat_mode(
                 perfstat_console_file, perfstat_output_files, result_dir, csv_dir,
-                sort_columns_by_name, compact_file)
+                sort_columns_by_name, compact_file, use_mmap, jobs, use_index,
+                counter_config_file, stream_sysstat, export_counters, digits, binary,
+                write_tables, gzip_html)
         elif asup_xml_data_files:
             # run in asup xml mode
             logging.info('Running PicDat in ASUP-xml mode')
             asup_mode.run_asup_mode_xml(
                 asup_xml_info_file, asup_xml_data_files, asup_xml_header_file, result_dir, csv_dir,
-                sort_columns_by_name, compact_file)
+                sort_columns_by_name, compact_file, digits, binary, write_tables, gzip_html, resume)
         elif asup_hdf5_file:
             # run in asup hdf5 mode
             logging.info('Running PicDat in ASUP-hdf5 mode')
             asup_mode.run_asup_mode_hdf5(asup_hdf5_file, result_dir, csv_dir, sort_columns_by_name,
-                                         compact_file)
+                                         compact_file, digits, binary, write_tables,
+                                         gzip_html)
         elif asup_json_files:
             # run in asup json mode
             logging.info('Running PicDat in ASUP-json mode')
             asup_mode.run_asup_mode_json(
-                asup_json_files, result_dir, csv_dir, sort_columns_by_name, compact_file)
+                asup_json_files, result_dir, csv_dir, sort_columns_by_name, compact_file, digits,
+                binary, write_tables, gzip_html, resume)
         else:
             logging.info(
                 'The input you gave (%s) doesn\'t contain any files this program can handle.',
                          input_file)
-            sys.exit(0)
-
-        # start web server if initiated with command line option
-        if webserver:
-            logging.info('Starting local web server... ')
-            logging.info('Open \'http://localhost:8000\' in your browser to view the charts.')
-            logging.info('Hit ctrl+C to terminate web server (might be necessary several times)')
+            return False
 
-            os.chdir(os.path.abspath(result_dir))
-            server = http.server.HTTPServer(('', 8000), http.server.SimpleHTTPRequestHandler)
-            server.serve_forever()
-        else:
-            logging.info('Done. You will find the charts under: %s', os.path.abspath(result_dir))
+        if use_cache:
+            result_cache.store(cache_key, result_dir, files_before)
+        return True
 
     finally:
         # delete temporarily extracted files
@@ -177,5 +194,50 @@ def start_picdat():
             shutil.rmtree(temp_path)
             logging.info('(Temporarily extracted files deleted)')
 
-# start PicDat
-start_picdat()
+
+def start_picdat():
+    """
+    Starts PicDat. Gets called at the bottom of this module.
+    """
+    # read command line options and take additional user input
+    input_file, result_dir, sort_columns_by_name, compact_file, webserver, use_mmap, jobs, \
+        use_index, counter_config_file, stream_sysstat, export_counters, digits, binary, \
+        write_tables, gzip_html, port, bind_address, run_service, use_cache, watch, resume = \
+        picdat_util.handle_user_input(sys.argv)
+
+    # start ingestion service, if initiated with command line option
+    if run_service:
+        logging.info('Starting ingestion service... ')
+        service.serve(result_dir, port, jobs, run_picdat, (
+            sort_columns_by_name, compact_file, use_mmap, 1, use_index, counter_config_file,
+            stream_sysstat, export_counters, digits, binary, write_tables, gzip_html, use_cache),
+            bind_address)
+        return
+
+    # watch input directory for new ASUPs, if initiated with command line option
+    if watch:
+        csv_dir = picdat_util.prepare_directory(result_dir, compact_file, write_tables)
+        if webserver:
+            logging.info('Starting local web server... ')
+            threading.Thread(target=web_server.serve, args=(result_dir, port, bind_address),
+                             daemon=True).start()
+        asup_watcher.run_watch_mode(input_file, result_dir, csv_dir, sort_columns_by_name,
+                                    compact_file, digits, binary, write_tables, gzip_html)
+        return
+
+    if not run_picdat(input_file, result_dir, sort_columns_by_name, compact_file, use_mmap, jobs,
+                      use_index, counter_config_file, stream_sysstat, export_counters, digits,
+                      binary, write_tables, gzip_html, use_cache, resume):
+        sys.exit(0)
+
+    # start web server if initiated with command line option
+    if webserver:
+        logging.info('Starting local web server... ')
+        web_server.serve(result_dir, port, bind_address)
+    else:
+        logging.info('Done. You will find the charts under: %s', os.path.abspath(result_dir))
+
+
+# start PicDat (but not, if this module is imported by a worker process)
+if __name__ == '__main__':
+    start_picdat()
@@ -2,12 +2,17 @@
 This modules contains several functions called by main module picdat. Therefore, they are for
 handling user communication or directory work such as unpacking archives.
 """
+import bz2
 import getopt
+import gzip
+import hashlib
+import io
 import logging
+import logging.handlers
+import lzma
 import os
 import shutil
 import sys
-import tempfile
 import tarfile
 from zipfile import ZipFile
 from general import constants
@@ -35,13 +40,83 @@ __copyright__ = 'Copyright 2018, Advanced UniByte GmbH'
 # see <http://www.gnu.org/licenses/>.
 
 
+# Functions to open compressed PerfStat files with, by their file endings:
+COMPRESSION_OPENERS = {
+    'gz': gzip.open,
+    'xz': lzma.open,
+    'bz2': bz2.open
+}
+
+# data types, PicDat accepts in compressed form:
+COMPRESSIBLE_DATA_TYPES = ['data', 'out']
+
+
 def data_type(filepath):
     """
-    Gets a file's data type.
+    Gets a file's data type. For compressed PerfStat files like output.data.gz, this is the data
+    type of the uncompressed file.
     :param filepath: The path from a file as String, you want to have the data type for.
     :return: The data type as String.
     """
-    return filepath.split('.')[-1]
+    path_split = filepath.split('.')
+    if len(path_split) > 2 and path_split[-1] in COMPRESSION_OPENERS \
+            and path_split[-2] in COMPRESSIBLE_DATA_TYPES:
+        return path_split[-2]
+    return path_split[-1]
+
+
+def split_archive_path(filepath):
+    """
+    Checks, whether a path leads to a file inside a zip archive, like
+    some/dir/perfstat.zip/node/output.data
+    :param filepath: A path as String.
+    :return: A tuple of the zip archive's path and the member's name inside the archive, or None,
+    if the path doesn't lead into a zip archive.
+    """
+    archive, separator, member = filepath.partition('.zip' + os.sep)
+    if not separator or not os.path.isfile(archive + '.zip'):
+        return None
+    return archive + '.zip', member.replace(os.sep, '/')
+
+
+def is_packed(filepath):
+    """
+    Checks, whether a file can only be read as a stream, because it is compressed or inside a zip
+    archive.
+    :param filepath: A path as String.
+    :return: True, if the file is compressed or inside a zip archive, False otherwise.
+    """
+    return filepath.split('.')[-1] in COMPRESSION_OPENERS or \
+        split_archive_path(filepath) is not None
+
+
+def open_input_file(filepath):
+    """
+    Opens a file from the user's input for reading it as text, line by line. The file might be
+    compressed with gzip, xz or bzip2 and it might be inside a zip archive; in both cases, it is
+    decompressed while reading, without writing anything to disk.
+    :param filepath: A path as String. Paths into zip archives are of the form described in
+    split_archive_path.
+    :return: A file object in text mode.
+    """
+    archive_path = split_archive_path(filepath)
+    if archive_path is None:
+        source = filepath
+    else:
+        archive, member = archive_path
+        with ZipFile(archive, 'r') as zip_file:
+            # the member stays readable after the archive got closed:
+            source = zip_file.open(member)
+
+    opener = COMPRESSION_OPENERS.get(filepath.split('.')[-1])
+    if opener is not None:
+        binary_file = opener(source, 'rb')
+    elif archive_path is None:
+        return open(filepath, 'r', encoding='ascii', errors='surrogateescape')
+    else:
+        binary_file = source
+
+    return io.TextIOWrapper(binary_file, encoding='ascii', errors='surrogateescape')
 
 
 def get_log_level(log_level_string):
@@ -88,7 +163,8 @@ def validate_input_file(input_file):
     :return: None
     :raises fileNotFoundError: raises an exception, if input_file is neither a directory nor a file.
     :raises typeError: raises an exception, if input_file is a file of the wrong data type
-    (neither .data nor .zip nor .out nor .tgz nor .h5 nor .json).
+    (neither .data nor .zip nor .out nor .tgz nor .h5 nor .json, where .data and .out files might
+    be compressed).
     """
     if os.path.isdir(input_file):
         return
@@ -110,7 +186,8 @@ def take_input_file():
     """
     while True:
         input_file = input('Please enter a path to some performance output (folder or zipfile '
-                           'or .data or .out or .json file or .tgz archive):' + os.linesep)
+                           'or .data or .out file - optionally compressed as .gz, .xz or .bz2 - '
+                           'or .json file or .tgz archive):' + os.linesep)
 
         try:
             validate_input_file(input_file)
@@ -136,21 +213,73 @@ def take_directory():
     return destination_directory
 
 
-def prepare_directory(destination_dir, compact_file):
+# content hashes of asset files, so that each file gets hashed only once per process:
+ASSET_HASHES = {}
+
+
+def get_shared_asset(source):
+    """
+    Looks up an asset file in the content-addressed asset directory. The file's name there is
+    prefixed with the hash of its content, so that different versions of it don't collide. If it
+    isn't in there yet, it gets copied into it.
+    :param source: The path to the asset file.
+    :return: The path to the shared asset file.
+    """
+    asset_hash = ASSET_HASHES.get(source)
+    if asset_hash is None:
+        with open(source, 'rb') as asset_file:
+            asset_hash = hashlib.sha256(asset_file.read()).hexdigest()
+        ASSET_HASHES[source] = asset_hash
+
+    shared_asset = os.path.join(constants.ASSET_CACHE_DIR,
+                                asset_hash[:16] + '_' + os.path.basename(source))
+    if not os.path.isfile(shared_asset):
+        os.makedirs(constants.ASSET_CACHE_DIR, exist_ok=True)
+        # copy under a temporary name first, so that parallel runs never see a partial file:
+        temp_asset = shared_asset + '.' + str(os.getpid())
+        shutil.copyfile(source, temp_asset)
+        os.replace(temp_asset, shared_asset)
+    return shared_asset
+
+
+def link_asset(source, destination):
+    """
+    Places an asset file at destination as hardlink to its shared copy in the content-addressed
+    asset directory, so that all result directories share the same file. If hardlinking isn't
+    possible, for example because destination is on another file system, the file gets copied.
+    :param source: The path to the asset file.
+    :param destination: The path, the asset should be placed at.
+    :return: None
+    """
+    try:
+        shared_asset = get_shared_asset(source)
+        if os.path.exists(destination):
+            if os.path.samefile(shared_asset, destination):
+                return
+            os.remove(destination)
+        os.link(shared_asset, destination)
+    except OSError:
+        logging.debug('Could not hardlink %s, copy it instead.', destination)
+        shutil.copyfile(source, destination)
+
+
+def prepare_directory(destination_dir, compact_file, write_tables=True):
     """
-    Copies the templates .jss and .css files into the given directory. Also creates an empty
+    Places the templates .jss and .css files into the given directory. Also creates an empty
     subdirectory for csv tables.
     :param destination_dir: The directory, the user gave in as destination.
     :param compact: Boolean, which says whether command line option 'compact' is set or not. If so,
     there is no need to copy dygraph files, because they will be included in the resulting html
     file.
+    :param write_tables: Boolean, whether csv tables will be written. If not, the subdirectory
+    for them isn't created.
     :return: The path to the csv directory inside destination_dir. In this directory, PicDat should
     write all csv tables.
     """
     logging.info('Prepare directory...')
 
     csv_dir = destination_dir + os.sep + 'tables'
-    if not os.path.isdir(csv_dir):
+    if write_tables and not os.path.isdir(csv_dir):
         os.makedirs(csv_dir)
 
     if not compact_file:
@@ -162,8 +291,8 @@ def prepare_directory(destination_dir, compact_file):
         dygraphs_js_dest = dygraphs_dir + os.sep + 'dygraph.js'
         dygraphs_css_source = constants.DYGRAPHS_CSS_SRC
         dygraphs_css_dest = dygraphs_dir + os.sep + 'dygraph.css'
-        shutil.copyfile(dygraphs_js_source, dygraphs_js_dest)
-        shutil.copyfile(dygraphs_css_source, dygraphs_css_dest)
+        link_asset(dygraphs_js_source, dygraphs_js_dest)
+        link_asset(dygraphs_css_source, dygraphs_css_dest)
 
     return csv_dir
 
@@ -174,14 +303,18 @@ def handle_user_input(argv):
     log level instead. If no input file or output directory is given, PicDat will ask the user
     about them at runtime. If a log file is desired, logging content is redirected into picdat.log.
     :param argv: Command line parameters.
-    :return: A tuple of two paths; the first one leads to the PerfStat input, the second one to
-    the output directory.
+    :return: A tuple of two paths; the first one leads to the PerfStat input (None, if the
+    ingestion service should be started), the second one to the output directory, followed by the
+    values of all other options.
     """
 
     # get all options from argv and turn them into a dict
     try:
-        opts, _ = getopt.getopt(argv[1:], 'hlscwd:i:o:',
-            ['help', 'logfile', 'sortbynames', 'compact', 'webserver', 'debug=', 'input=', 'outputdir='])
+        opts, _ = getopt.getopt(argv[1:], 'hlscwmxtebnzruayd:i:o:j:k:g:p:q:',
+            ['help', 'logfile', 'sortbynames', 'compact', 'webserver', 'mmap', 'index', 'stream',
+             'export', 'binary', 'notables', 'gzip', 'service', 'nocache', 'watch', 'resume',
+             'debug=', 'input=', 'outputdir=', 'jobs=', 'counters=', 'digits=', 'port=',
+             'bind='])
         opts = dict(opts)
     except getopt.GetoptError:
         logging.exception('Couldn\'t read command line options.')
@@ -201,8 +334,13 @@ def handle_user_input(argv):
 
     logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', level=log_level)
 
+    # the ingestion service gets its inputs uploaded, so it doesn't need an input file
+    run_service = ('-r' in opts or '--service' in opts)
+
     # extract inputfile from options if possible
-    if '-i' in opts:
+    if run_service:
+        input_file = None
+    elif '-i' in opts:
         input_file = opts['-i']
     elif '--input' in opts:
         input_file = opts['--inputfile']
@@ -210,7 +348,8 @@ def handle_user_input(argv):
         input_file = take_input_file()
 
     try:
-        validate_input_file(input_file)
+        if input_file is not None:
+            validate_input_file(input_file)
     except FileNotFoundError:
         logging.error('File %s does not exist.', input_file)
         sys.exit(1)
@@ -235,15 +374,83 @@ def handle_user_input(argv):
         logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', filename=output_dir
                             + os.sep + constants.LOGFILE_NAME, level=log_level)
 
-    logging.info('inputfile: %s, outputdir: %s', os.path.abspath(input_file), os.path.abspath(
-        output_dir))
+    if input_file is not None:
+        logging.info('inputfile: %s, outputdir: %s', os.path.abspath(input_file),
+                     os.path.abspath(output_dir))
+    else:
+        logging.info('outputdir: %s', os.path.abspath(output_dir))
 
     # Looks, whether user wants to sort legend entries alphabetically instead of by relevance
     sort_columns_by_name = ('-s' in opts or '--sortbynames' in opts)
     compact_file = ('-c' in opts or '--compact' in opts)
     webserver = ('-w' in opts or '--webserver' in opts)
+    use_mmap = ('-m' in opts or '--mmap' in opts)
+    use_index = ('-x' in opts or '--index' in opts)
+    stream_sysstat = ('-t' in opts or '--stream' in opts)
+    export_counters = ('-e' in opts or '--export' in opts)
+    binary = ('-b' in opts or '--binary' in opts)
+    write_tables = not ('-n' in opts or '--notables' in opts)
+    gzip_html = ('-z' in opts or '--gzip' in opts)
+    use_cache = not ('-u' in opts or '--nocache' in opts)
+    watch = ('-a' in opts or '--watch' in opts)
+    resume = ('-y' in opts or '--resume' in opts)
+
+    if watch and run_service:
+        logging.error('Options --watch and --service can\'t be combined; the service gets its '
+                      'inputs uploaded instead of watching a directory.')
+        sys.exit(1)
+
+    if watch and not os.path.isdir(input_file):
+        logging.error('Option --watch needs a directory as input, but %s is none.', input_file)
+        sys.exit(1)
+
+    if not write_tables:
+        compact_file = True
+        if stream_sysstat:
+            logging.info('Sysstat values can\'t be streamed into csv tables, if there are no '
+                         'csv tables. Option --stream is ignored.')
+            stream_sysstat = False
+
+    # extract number of worker processes from options if possible
+    jobs = opts.get('-j', opts.get('--jobs', '1'))
+    try:
+        jobs = int(jobs)
+        if jobs < 1:
+            raise ValueError
+    except ValueError:
+        logging.error('Number of jobs must be a positive integer, but is \'%s\'.', jobs)
+        sys.exit(1)
+
+    # extract path to a counter config file from options if possible
+    counter_config_file = opts.get('-k', opts.get('--counters'))
 
-    return input_file, output_dir, sort_columns_by_name, compact_file, webserver
+    # extract number of significant digits for csv values from options if possible
+    digits = opts.get('-g', opts.get('--digits'))
+    if digits is not None:
+        try:
+            digits = int(digits)
+            if digits < 1:
+                raise ValueError
+        except ValueError:
+            logging.error('Number of digits must be a positive integer, but is \'%s\'.', digits)
+            sys.exit(1)
+
+    # extract the web server's port from options if possible
+    port = opts.get('-p', opts.get('--port', str(constants.DEFAULT_PORT)))
+    try:
+        port = int(port)
+        if not 0 <= port <= 65535:
+            raise ValueError
+    except ValueError:
+        logging.error('Port must be a number between 0 and 65535, but is \'%s\'.', port)
+        sys.exit(1)
+
+    # extract the address, the web server listens on, from options if possible
+    bind_address = opts.get('-q', opts.get('--bind', constants.DEFAULT_BIND_ADDRESS))
+
+    return input_file, output_dir, sort_columns_by_name, compact_file, webserver, use_mmap, \
+        jobs, use_index, counter_config_file, stream_sysstat, export_counters, digits, binary, \
+        write_tables, gzip_html, port, bind_address, run_service, use_cache, watch, resume
 
 def ccma_check(filenames):
     """
@@ -330,22 +537,110 @@ def get_all_perfstats(folder):
     return output_files, perfstat_console_file
 
 
-def extract_zip(zip_folder):
+def get_zipped_perfstats(zip_folder):
     """
-    This function takes a zip folder, distracts it to a temporary directory and picks all .data
-    files from it, but it ignores all files in folders named host. Also picks a file named
-    console.log, if available.
+    Picks all .data and .out files from a zip folder, but it ignores all files in folders named
+    host. Also picks a file named console.log, if available. Nothing gets extracted; the files
+    are meant to be opened inside the archive with open_input_file.
     :param zip_folder: The path to a .zip file as String.
-    :return: A tuple of the temporary directory's path, a list of all .output file paths,
-    and the path to the console.log file (might be None).
+    :return: A tuple of a list of .data/.out file paths and the path to the console.log file
+    (might be None). The paths lead into the zip archive, as described in split_archive_path.
     """
-    temp_path = tempfile.mkdtemp()
+    output_files = []
+    perfstat_console_file = None
     with ZipFile(zip_folder, 'r') as zip_file:
-        zip_file.extractall(temp_path)
+        for member in zip_file.infolist():
+            if member.is_dir():
+                continue
+            folder, _, filename = member.filename.rpartition('/')
+            if 'host' in folder:
+                continue
+            file = os.path.join(zip_folder, *member.filename.split('/'))
+            if filename == 'console.log':
+                perfstat_console_file = file
+            elif data_type(filename) == 'data' or data_type(filename) == 'out':
+                output_files.append(file)
+    return output_files, perfstat_console_file
+
+class RecordBuffer(logging.handlers.BufferingHandler):
+    """
+    A logging handler, which collects log records instead of writing them out. It is for worker
+    processes: Their records are sent back to the main process, which writes them out in the right
+    order. Therefore, the records are prepared to be picklable.
+    """
+
+    def __init__(self):
+        super().__init__(capacity=0)
+
+    def shouldFlush(self, record):
+        return False
+
+    def emit(self, record):
+        # resolve message arguments and exception information into plain strings, because they
+        # might not be picklable
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.buffer.append(record)
+
+
+def run_with_buffered_logging(log_level, function, *args):
+    """
+    Calls a function while buffering all log records it emits. Meant to be executed inside a
+    worker process.
+    :param log_level: A constant from the logging module. Records below this level are dropped.
+    :param function: The function to call.
+    :param args: Arguments for function.
+    :return: A tuple of the function's result, the list of buffered log records and an exception
+    raised by the function (or None). Exceptions are returned instead of raised, so that the log
+    records belonging to them do not get lost.
+    """
+    root_logger = logging.getLogger()
+    original_handlers = root_logger.handlers[:]
+    original_level = root_logger.level
+
+    record_buffer = RecordBuffer()
+    for handler in original_handlers:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(record_buffer)
+    root_logger.setLevel(log_level)
+
+    result = None
+    exception = None
+    try:
+        result = function(*args)
+    except BaseException as error:
+        exception = error
+    finally:
+        root_logger.removeHandler(record_buffer)
+        for handler in original_handlers:
+            root_logger.addHandler(handler)
+        root_logger.setLevel(original_level)
+
+    return result, record_buffer.buffer, exception
+
+
+def emit_log_records(records):
+    """
+    Writes out log records, which have been buffered by a worker process.
+    :param records: A list of logging.LogRecord objects.
+    :return: None
+    """
+    root_logger = logging.getLogger()
+    for record in records:
+        root_logger.handle(record)
 
-    output_files, perfstat_console_file = get_all_perfstats(temp_path)
 
-    return temp_path, output_files, perfstat_console_file
+# Translations for timezone Strings, pytz doesn't accept:
+TZ_SWITCH = {
+    'CEST': 'CET'
+}
+
+# Maps all timezone Strings get_timezone has seen so far to their results:
+TIMEZONE_CACHE = {}
+
 
 def get_timezone(tz_string):
     """
@@ -353,26 +648,27 @@ def get_timezone(tz_string):
     Usually, the module pytz can handle such Strings by itself, but we face the problem that many
     files include the timezone string 'CEST' but pytz accepts only 'CET'; pytz wants to switch
     between summer time and winter time itself.
-    This function simply translates 'CEST' to 'CET'. By appending to the tz_switch dict,
+    This function simply translates 'CEST' to 'CET'. By appending to the TZ_SWITCH dict,
     translation could be done for other suspicious timezone strings as well.
+    As this function is called for each timestamp, it caches its results.
     :param tz_string: A timezone identifier as String.
     :return: A pytz.timezone object, or None, if pytz throws an exception.
     """
     if not pytz:
         return None
 
-    tz_switch = {
-        'CEST': pytz.timezone('CET')
-    }
-
-    if tz_string in tz_switch:
-        return tz_switch[tz_string]
+    try:
+        return TIMEZONE_CACHE[tz_string]
+    except KeyError:
+        pass
 
-    else:
-        try:
-            return pytz.timezone(tz_string)
-        except pytz.UnknownTimeZoneError:
-            logging.warning('Found unexpected timezone identifier: \'%s\'. '
-                            'PicDat is not able to harmonize timezones. Be aware of possible '
-                            'confusion with time values in charts.', tz_string)
-            return None
+    try:
+        timezone = pytz.timezone(TZ_SWITCH.get(tz_string, tz_string))
+    except pytz.UnknownTimeZoneError:
+        logging.warning('Found unexpected timezone identifier: \'%s\'. '
+                        'PicDat is not able to harmonize timezones. Be aware of possible '
+                        'confusion with time values in charts.', tz_string)
+        timezone = None
+
+    TIMEZONE_CACHE[tz_string] = timezone
+    return timezone